@@ -1,8 +1,27 @@
-import mysql.connector
 import streamlit as st
-import pandas as pd
 import datetime
-import pickle
+import importlib
+import logging
+import os
+import sys
+from pathlib import Path
+
+# Add the lib directory to the system path to import the serving helpers
+sys.path.append(str(Path(__file__).resolve().parent / 'lib'))
+
+# Only lightweight modules are imported here, so the login form is drawn right away.
+# numpy/pandas and the model code are imported on first use, normally by the
+# warm-up thread while the login form is shown (mysql.connector is imported by connect_mysql).
+from startup import APP_MODULES, StartupProfiler, warm_up
+from model_registry import ModelRegistry, load_pickle
+from db import connect_mysql
+from event_queue import WriteBehindQueue
+import metrics
+import repository
+import schema
+
+# Timings of this script run (reported when FEELMS_PROFILE_STARTUP=1)
+profiler = StartupProfiler()
 
 st.set_page_config(
     page_title="Feelms - Predicting by Emotion",
@@ -11,77 +30,247 @@ st.set_page_config(
     initial_sidebar_state="expanded",  # El sidebar estará expandido por defecto
 )
 
-db_host = st.secrets["database"]["DB_HOST"]
-db_user = st.secrets["database"]["DB_USER"]
-db_password = st.secrets["database"]["DB_PASSWORD"]
-db_name = st.secrets["database"]["DB_NAME"]
-db_port = st.secrets["database"]["DB_PORT"]
-
-# Connect to MySQL database using the loaded environment variables
-conn = mysql.connector.connect(
-    host=db_host,
-    user=db_user,
-    password=db_password,
-    database=db_name,
-    port=int(db_port),
-    auth_plugin='caching_sha2_password'
-)
-c = conn.cursor()
-
-# Load pre-trained models from pickle files
-with open('model/svd_model.pkl', 'rb') as file:
-    svd_model = pickle.load(file)
-
-with open('model/rf_model.pkl', 'rb') as file:
-    rf_model = pickle.load(file)
-
-# Function to predict movie rating using the SVD model
-def predict_rating(user_id, movie_id):
-    # Generate the prediction using the SVD model
-    try:
-        pred = svd_model.predict(user_id, movie_id)
-        return pred.est  # Return the predicted rating
-    except:
-        return 5  # Default value if no prediction is available
-
-def predict_favorite(features):
-    # Convierte las características a un DataFrame
-    features_df = pd.DataFrame([features], columns=['duration', 'rating'])
-    # Use the RandomForest model to predict whether the movie will be marked as favorite
-    prediction = rf_model.predict(features_df)
-    return prediction[0]
+# Latency metrics of this session and of this script run (stages and DB queries)
+if 'metrics' not in st.session_state:
+    st.session_state['metrics'] = metrics.MetricsRegistry()
+rerun_metrics = metrics.begin_rerun(st.session_state['metrics'])
+
+# Process-wide metrics endpoint: /metrics (Prometheus text) and /metrics.json on FEELMS_METRICS_PORT
+@st.cache_resource
+def start_metrics_server():
+    port = os.environ.get('FEELMS_METRICS_PORT')
+    return metrics.start_http_server(int(port)) if port else None
+
+start_metrics_server()
+
+# Pool of MySQL connections shared by all sessions (one connection per call, returned afterwards).
+# Migrations are applied by the operator before deploying (python lib/schema.py migrate):
+# the app only checks the schema version and warns when it is behind.
+@st.cache_resource
+def get_database():
+    db = connect_mysql(
+        host=st.secrets["database"]["DB_HOST"],
+        user=st.secrets["database"]["DB_USER"],
+        password=st.secrets["database"]["DB_PASSWORD"],
+        database=st.secrets["database"]["DB_NAME"],
+        port=st.secrets["database"]["DB_PORT"],
+        pool_size=10,
+        auth_plugin='caching_sha2_password'
+    )
+    version = schema.current_version(db)
+    if version < schema.LATEST_VERSION:
+        logging.getLogger(__name__).warning(
+            "Database schema is at version %d, the app expects %d: run python lib/schema.py migrate", version, schema.LATEST_VERSION)
+    # Every statement is timed and counted in the metrics
+    db.on_query = metrics.observe_query
+    return db
+
+# Background writer for "shown" interactions: cards are logged with one buffered
+# append and written to the database in multi-row batches
+@st.cache_resource
+def get_interaction_queue():
+    queue = WriteBehindQueue(lambda rows: repository.save_interactions(get_database(), rows), batch_size=200, flush_interval=2.0, max_size=20000, name='interaction-writer')
+    metrics.PROCESS.register_gauges('interaction_queue', queue.metrics)
+    return queue
+
+# Function to load the movie catalog (indexed by movie_id, which the cards, the interactions
+# and the favorites use) and its emotion index
+def load_movie_catalog(path, csv_path='data/imdb_clean.csv'):
+    from catalog_store import load_or_build_catalog
+    catalog = load_or_build_catalog(path, csv_path)
+    return catalog.to_frame().set_index('movie_id', drop=False), catalog.emotion_index()
+
+# Function to load the SVD model as a batch scorer (bundle directory or pickle)
+def load_svd_model(path):
+    if Path(path).is_dir():
+        from model_bundle import load_svd_bundle
+        return load_svd_bundle(path)
+    from scoring import load_svd_scorer
+    return load_svd_scorer(path)
+
+# Function to load the RandomForest model (bundle directory or pickle).
+# FavoriteScorer only builds the (duration, rating) movie features: another model
+# (e.g. ml.train_random_forest_features) is refused, and a reload keeps the previous one.
+def load_rf_model(path):
+    if Path(path).is_dir():
+        from model_bundle import load_random_forest_bundle
+        model = load_random_forest_bundle(path)
+    else:
+        model = load_pickle(path)
+    from favorite_scoring import MOVIE_FEATURES
+    if model.n_features_in_ != len(MOVIE_FEATURES):
+        raise ValueError(f"{path}: the RandomForest has {model.n_features_in_} features, the app serves models on {MOVIE_FEATURES}")
+    return model
+
+# Process-wide registry of the pre-trained models and the movie catalog.
+# Each artifact is loaded once and shared by all sessions; dropping a retrained
+# model into model/ swaps it in without restarting the app.
+@st.cache_resource
+def get_model_registry():
+    registry = ModelRegistry(check_interval=5.0)
+    # Prefer the memory-mapped bundles exported by lib/ml.py (no surprise/sklearn needed),
+    # fall back to the pickles; a bundle exported later replaces the pickle on the next check.
+    # The SVD model is served through the batch scorer.
+    registry.register('svd', 'model/svd_bundle', load_svd_model, watch_path='model/svd_bundle/manifest.json', fallbacks=[('model/svd_model.pkl', None)])
+    registry.register('rf', 'model/rf_bundle', load_rf_model, watch_path='model/rf_bundle/manifest.json', fallbacks=[('model/rf_model.pkl', None)])
+    registry.register('catalog', 'data/catalog', load_movie_catalog, watch_path='data/catalog/manifest.json')
+    # Reloads, failures and load times of every artifact on the metrics endpoint
+    metrics.PROCESS.register_gauges('model_registry', registry.stats)
+    return registry
+
+# Started once per process on the first page view: imports the heavy modules and loads
+# the models and the catalog in the background, so they are ready when the user logs in
+@st.cache_resource
+def start_warm_up():
+    registry = get_model_registry()
+    tasks = [(module, lambda module=module: importlib.import_module(module)) for module in APP_MODULES]
+    tasks += [(name, lambda name=name: registry.get(name)) for name in ('catalog', 'svd', 'rf')]
+    return warm_up(tasks, name='app-warm-up')
+
+start_warm_up()
+
+# Favorite probabilities of the whole catalog, computed once per RandomForest and catalog version
+@st.cache_resource(max_entries=2)
+def get_favorite_scorer(rf_version, catalog_version):
+    from favorite_scoring import FavoriteScorer
+    return FavoriteScorer.from_model(model_registry.get('rf'), model_registry.get('catalog')[0])
+
+# SVD model updated online with the ratings received since it was trained, so new ratings
+# (and new users) affect recommendations right away. Rebuilt from the retrained model
+# when a new version is loaded: the ratings saved after the model file was written
+# (its modification time stands for the training time) are replayed into it.
+@st.cache_resource(max_entries=1)
+def get_online_svd(svd_version):
+    from online_svd import OnlineSVD
+    model = model_registry.entry('svd')
+    online_svd = OnlineSVD(model.value)
+    if model.mtime is not None:
+        online_svd.add_ratings(repository.get_ratings_since(get_database(), datetime.datetime.fromtimestamp(model.mtime)))
+    metrics.PROCESS.register_gauges('online_svd', online_svd.stats)
+    return online_svd
+
+# Recommendation candidates per emotion: the best predicted movies plus a random exploration sample
+CANDIDATE_POOL_SIZE = 50
+EXPLORATION_SAMPLE_SIZE = 20
+# Above this number of movies per emotion, candidates come from the approximate factor index
+APPROXIMATE_SEARCH_MIN_MOVIES = 50000
+# Movies already shown to the user are sampled less often than new ones
+SHOWN_MOVIE_WEIGHT = 0.25
+
+# Approximate top-K index over the SVD item factors (rebuilt when the model version changes)
+@st.cache_resource(max_entries=2)
+def get_factor_index(svd_version, catalog_version):
+    from retrieval import QuantizedFactorIndex
+    return QuantizedFactorIndex(get_online_svd(svd_version), model_registry.get('catalog')[1].movie_ids)
+
+# Ranked candidates per (user, emotion, model version), shared by all sessions
+@st.cache_resource
+def get_recommendation_cache():
+    from rec_cache import RecommendationCache
+    cache = RecommendationCache(max_entries=20000, ttl=900)
+    metrics.PROCESS.register_gauges('recommendation_cache', cache.stats)
+    return cache
+
+# Favorites pages per user, shared by all sessions
+@st.cache_resource
+def get_favorites_service():
+    from favorites_service import FavoritesService
+    service = FavoritesService(get_database(), max_users=10000, ttl=300)
+    metrics.PROCESS.register_gauges('favorites_cache', service.stats)
+    return service
+
+# Ratings of the users: served from memory, written with debounced upserts
+# (delete + insert while the ratings table has no unique (user_id, movie_id) key)
+@st.cache_resource
+def get_rating_store():
+    from rating_store import RatingStore
+    db = get_database()
+    upsert = schema.has_index(db, 'ratings', 'ratings_user_movie')
+    if not upsert:
+        logging.getLogger(__name__).warning("ratings has no unique (user_id, movie_id) key: ratings are written with delete + insert until python lib/schema.py migrate is run")
+    store = RatingStore(db, debounce=1.0, max_delay=5.0, max_users=10000, upsert=upsert)
+    metrics.PROCESS.register_gauges('rating_store', store.stats)
+    return store
+
+# movie_id -> row position index of the catalog (rebuilt when the catalog version changes)
+@st.cache_resource(max_entries=2)
+def get_movie_row_index(catalog_version):
+    from favorites_service import movie_row_index
+    return movie_row_index(model_registry.get('catalog')[0])
+
+FAVORITES_PAGE_SIZE = 12
+
+# Version of the recommendations: the SVD model and the catalog they were computed with
+def recommendation_version():
+    return f"{model_registry.version('svd')}:{model_registry.version('catalog')}"
+
+# Load the lists precomputed offline by lib/rec_cache.py (once per model version)
+@st.cache_resource(max_entries=2)
+def load_precomputed_recommendations(version, path='model/recommendations.npz'):
+    return recommendation_cache.load_precomputed(path, version) if Path(path).exists() else 0
+
+# Function to get the recommendation candidates (catalog rows, predicted ratings) of a user for an emotion,
+# leaving out the movies of user_state.excluded_ids() (favorites and viewed movies)
+@metrics.timed('recommend')
+def get_recommendations(user_id, emotion, user_state=None):
+    from retrieval import recommend_candidates
+    version = recommendation_version()
+    load_precomputed_recommendations(version)
+
+    def compute():
+        factor_index = None
+        if len(emotion_index.rows(emotion)) >= APPROXIMATE_SEARCH_MIN_MOVIES:
+            factor_index = get_factor_index(model_registry.version('svd'), model_registry.version('catalog'))
+        exclude_ids = user_state.excluded_ids() if user_state is not None else None
+        return recommend_candidates(svd_scorer, emotion_index, user_id, emotion, CANDIDATE_POOL_SIZE, EXPLORATION_SAMPLE_SIZE, factor_index, exclude_ids)
+
+    rows, predicted = recommendation_cache.get_or_compute(user_id, emotion, version, compute)
+    if user_state is not None:
+        # Lists precomputed offline don't know the user's favorites and viewed movies
+        keep = ~user_state.excluded_mask(emotion_index.movie_ids[rows])
+        rows, predicted = rows[keep], predicted[keep]
+    return rows, predicted
+
+# Favorite predictions of catalog movies (precomputed lookup, no forest evaluation)
+@metrics.timed('favorite_lookup')
+def predict_favorite_movies(movie_ids):
+    return favorite_scorer.is_favorite(movie_ids)
 
 # Function to check if the user exists or create a new one
+@metrics.timed('db.get_or_create_user')
 def get_or_create_user(username, password):
-    query = "SELECT user_id FROM users WHERE username = %s"
-    c.execute(query, (username,))
-    result = c.fetchone()
-
-    if not result:
+    if repository.get_user_id(db, username) is None:
         # If the user doesn't exist, create a new one with the provided password
-        query = "INSERT INTO users (username, password) VALUES (%s, %s)"
-        c.execute(query, (username, password))
-        conn.commit()
+        user_id = repository.create_user(db, username, password)
         st.success(f"User {username} has been created.")
-        return c.lastrowid  # Return the new user's ID (user_id)
+        return user_id  # Return the new user's ID (user_id)
     else:
         # If the user exists, validate the password
-        query = "SELECT user_id FROM users WHERE username = %s AND password = %s"
-        c.execute(query, (username, password))
-        result = c.fetchone()
-        if result:
+        user_id = repository.authenticate_user(db, username, password)
+        if user_id:
             st.success(f"Welcome back, {username}!")
-            return result[0]  # Return the existing user's ID (user_id)
+            return user_id  # Return the existing user's ID (user_id)
         else:
             st.error("Incorrect password. Please try again.")
             return None
 
+# Days of interactions loaded at login (movies shown or viewed in that period aren't logged
+# as "shown" again and are sampled less often)
+RECENT_INTERACTION_DAYS = 180
+
+# Function to load the user's favorites, ratings and recent interactions in one go (at login)
+@metrics.timed('db.load_user_state')
+def load_user_state(user_id):
+    from user_state import UserState
+    return UserState.load(get_database(), user_id, days=RECENT_INTERACTION_DAYS, ratings=dict(get_rating_store().ratings(user_id)))
+
 # Function to handle user session state
 def login(username, password):
     user_id = get_or_create_user(username, password)
     if user_id:
         st.session_state['user_id'] = user_id
         st.session_state['username'] = username
+        st.session_state['user_state'] = load_user_state(user_id)
         st.session_state['logged_in'] = True
         st.rerun()
 
@@ -110,8 +299,29 @@ if not st.session_state['logged_in']:
     # Button to log in or register
     if st.button("Login / Register"):
         if username and password:
+            # The database pool is created on the first login, not when the form is drawn
+            with profiler.timed('database'):
+                db = get_database()
             login(username, password)
 else:
+    # Database, models and recommendation services. The models are normally already
+    # loaded by the warm-up thread; otherwise this waits for them.
+    with profiler.timed('database'):
+        db = get_database()
+        interaction_queue = get_interaction_queue()
+    with profiler.timed('models'):
+        model_registry = get_model_registry()
+        svd_scorer = get_online_svd(model_registry.version('svd'))
+    with profiler.timed('favorite scorer'):
+        favorite_scorer = get_favorite_scorer(model_registry.version('rf'), model_registry.version('catalog'))
+    recommendation_cache = get_recommendation_cache()
+    favorites_service = get_favorites_service()
+    rating_store = get_rating_store()
+    # Favorites, ratings and recent interactions of the user, loaded at login
+    if 'user_state' not in st.session_state:
+        st.session_state['user_state'] = load_user_state(st.session_state['user_id'])
+    user_state = st.session_state['user_state']
+
     st.write(f"Welcome, {st.session_state['username']}!")
 
     # Logout button
@@ -119,139 +329,119 @@ else:
         logout()
 
     # Save interactions in the database using the DataFrame index as movie_id
+    @metrics.timed('db.save_interaction')
     def save_interaction(user_id, movie_id, emotion, interaction_type):
-        query = "INSERT INTO interactions (user_id, movie_id, emotion, interaction_type, date) VALUES (%s, %s, %s, %s, %s)"
-        values = (user_id, movie_id, emotion, interaction_type, datetime.datetime.now())
-        c.execute(query, values)
-        conn.commit()
-
-    # Check if the movie has already been shown in the current session
-    def check_session_interaction(movie_id):
-        if 'shown_movies' not in st.session_state:
-            st.session_state['shown_movies'] = set()  # Use a set to avoid duplicates in the session
-        
-        # Check if the movie has already been shown in this session
-        return movie_id in st.session_state['shown_movies']
-    
-    # Register the movie as shown in the current session
-    def register_session_interaction(movie_id):        
-        st.session_state['shown_movies'].add(movie_id)
+        if interaction_type == "shown":
+            # "shown" is logged for every card: hand it to the write-behind queue
+            interaction_queue.put((user_id, movie_id, emotion, interaction_type, datetime.datetime.now()))
+        else:
+            repository.save_interaction(db, user_id, movie_id, emotion, interaction_type)
 
     # Function to update an existing interaction in the database
+    @metrics.timed('db.update_interaction')
     def update_interaction(user_id, movie_id, interaction_type):
-        query = """
-        UPDATE interactions 
-        SET interaction_type = %s, date = %s 
-        WHERE user_id = %s AND movie_id = %s AND interaction_type = 'shown'
-        """
-        values = (interaction_type, datetime.datetime.now(), user_id, movie_id)
-        c.execute(query, values)
-        conn.commit()
+        # The "shown" row to update may still be waiting in the queue: change it there,
+        # and update the rows already written
+        date = datetime.datetime.now()
+        interaction_queue.update_queued(
+            lambda row: row[0] == user_id and row[1] == movie_id and row[3] == 'shown',
+            lambda row: (user_id, movie_id, row[2], interaction_type, date),
+        )
+        repository.update_interaction(db, user_id, movie_id, interaction_type)
+        # The cached recommendations stay valid: viewed movies are masked out when they are served
+        user_state.mark_viewed(movie_id)
 
     # Function to save favorites
+    @metrics.timed('db.save_favorite')
     def save_favorite(user_id, movie_id):
-        query = "SELECT * FROM favorites WHERE user_id = %s AND movie_id = %s"
-        c.execute(query, (user_id, movie_id))
-        if c.fetchone():
-            st.warning(f"This movie is already in your favorites.")
-        else:
-            query = "INSERT INTO favorites (user_id, movie_id, date_added) VALUES (%s, %s, %s)"
-            values = (user_id, movie_id, datetime.datetime.now())
-            c.execute(query, values)
-            conn.commit()
+        if not user_state.is_favorite(movie_id) and repository.add_favorite(db, user_id, movie_id):
+            user_state.add_favorite(movie_id)
+            recommendation_cache.invalidate_user(user_id)
+            favorites_service.invalidate(user_id)
             st.success("Added to favorites!")
-
-    # Function to delete ratings when removing favorites
-    def delete_rating(user_id, movie_id):
-        query = "DELETE FROM ratings WHERE user_id = %s AND movie_id = %s"
-        c.execute(query, (user_id, movie_id))
-        conn.commit()
+        else:
+            st.warning(f"This movie is already in your favorites.")
 
     # Function to remove favorites
+    @metrics.timed('db.remove_favorite')
     def remove_favorite(user_id, movie_id):
-        # Remove associated rating
-        delete_rating(user_id, movie_id)
-        # Remove favorite
-        query = "DELETE FROM favorites WHERE user_id = %s AND movie_id = %s"
-        c.execute(query, (user_id, movie_id))
-        conn.commit()
+        # Remove the favorite and its associated rating in one transaction
+        # (after dropping any rating change still waiting to be written)
+        rating_store.forget(user_id, movie_id)
+        repository.remove_favorite(db, user_id, movie_id)
+        user_state.remove_favorite(movie_id)
+        svd_scorer.remove_rating(user_id, movie_id)
+        recommendation_cache.invalidate_user(user_id)
+        favorites_service.invalidate(user_id)
         st.success("Removed from favorites!")
         st.session_state['favorites_updated'] = True
 
     # Function to save or update movie ratings
+    # (slider changes are coalesced and written to the database after a short pause)
+    @metrics.timed('save_rating')
     def save_rating(user_id, movie_id, rating):
-        query = "SELECT rating_id FROM ratings WHERE user_id = %s AND movie_id = %s"
-        c.execute(query, (user_id, movie_id))
-        result = c.fetchone()
-
-        if result:
-            # If it exists, update the rating
-            query = "UPDATE ratings SET rating = %s, date = %s WHERE user_id = %s AND movie_id = %s"
-            values = (rating, datetime.datetime.now(), user_id, movie_id)
-        else:
-            # If it doesn't exist, insert a new rating
-            query = "INSERT INTO ratings (user_id, movie_id, rating, date) VALUES (%s, %s, %s, %s)"
-            values = (user_id, movie_id, rating, datetime.datetime.now())
-
-        c.execute(query, values)
-        conn.commit()
+        rating_store.set(user_id, movie_id, rating)
+        user_state.set_rating(movie_id, rating)
+        svd_scorer.add_rating(user_id, movie_id, rating)
+        recommendation_cache.invalidate_user(user_id)
 
     # Function to get the previous rating (if exists)
+    @metrics.timed('get_rating')
     def get_rating(user_id, movie_id):
-        query = "SELECT rating FROM ratings WHERE user_id = %s AND movie_id = %s"
-        c.execute(query, (user_id, movie_id))
-        result = c.fetchone()
-        if result:
-            return result[0]  # Return the existing rating
-        else:
-            return None  # If no previous rating, return None
+        return rating_store.get(user_id, movie_id)  # None if there is no previous rating
 
-    # Show the favorite movies history
+    # Show the favorite movies history, one page of the grid at a time
+    @metrics.timed('show_favorites')
     def show_favorites(user_id):
         st.subheader(f"Your Favorite Movies")
-        query = "SELECT movie_id FROM favorites WHERE user_id = %s"
-        c.execute(query, (user_id,))
-        favorites = c.fetchall()
+        # Favorites in one query (cached until the next favorite write)
+        num_pages = favorites_service.num_pages(user_id, FAVORITES_PAGE_SIZE)
+
+        if favorites_service.count(user_id):
+            page = 0
+            if num_pages > 1:
+                # Keep the selected page valid when favorites are removed
+                if st.session_state.get('favorites_page', 1) > num_pages:
+                    st.session_state['favorites_page'] = num_pages
+                page = st.number_input("Page", min_value=1, max_value=num_pages, step=1, key='favorites_page') - 1
+            movies, favorites = favorites_service.page(user_id, df, get_movie_row_index(model_registry.version('catalog')), page, FAVORITES_PAGE_SIZE)
 
-        if favorites:
             # Group favorites in rows of 3 columns
-            for i in range(0, len(favorites), 3):
+            for i in range(0, len(movies), 3):
                 cols_favorites = st.columns(3)
                 
-                for col, fav in zip(cols_favorites, favorites[i:i+3]):
-                    movie = df.loc[df.index == fav[0]].iloc[0]
+                for col, (movie_id, _), (_, movie) in zip(cols_favorites, favorites[i:i+3], movies.iloc[i:i+3].iterrows()):
                     short_title = movie['title'] if len(movie['title']) <= 20 else movie['title'][:20] + '...'
                     with col:
                         st.image(movie['poster'], width=150)
                         st.write(f"**{short_title}** ({movie['year']})")
                         st.write(f"Duration: {movie['duration']} min")
 
-                        # Show rating slider only in favorites
-                        previous_rating = get_rating(user_id, fav[0])
+                        # Show rating slider only in favorites. The rating comes from the rating
+                        # store, which also has the changes that are not written yet.
+                        previous_rating = get_rating(user_id, movie_id)
                         if previous_rating is None:
-                            rating = st.slider(f"Rate", 1, 10, step=1, key=f"rate_fav_{fav[0]}")
-                            if st.button(f"Submit Rating", key=f"submit_rating_fav_{fav[0]}"):
-                                save_rating(user_id, fav[0], rating)
+                            rating = st.slider(f"Rate", 1, 10, step=1, key=f"rate_fav_{movie_id}")
+                            if st.button(f"Submit Rating", key=f"submit_rating_fav_{movie_id}"):
+                                save_rating(user_id, movie_id, rating)
                         else:
                             st.write(f"Your rating for this movie: {previous_rating}")
-                            rating = st.slider(f"Update rating", 1, 10, step=1, value=previous_rating, key=f"update_rating_fav_{fav[0]}")
+                            rating = st.slider(f"Update rating", 1, 10, step=1, value=previous_rating, key=f"update_rating_fav_{movie_id}")
                             if rating != previous_rating:
-                                save_rating(user_id, fav[0], rating)
+                                save_rating(user_id, movie_id, rating)
 
                         # Button to remove from favorites and delete rating
-                        if st.button(f"❌ Remove favorite", key=f"remove_fav_{fav[0]}"):
-                            remove_favorite(user_id, fav[0])
+                        if st.button(f"❌ Remove favorite", key=f"remove_fav_{movie_id}"):
+                            remove_favorite(user_id, movie_id)
 
                 # Add a continuous line only if it's not the last group
-                if i + 3 < len(favorites):
+                if i + 3 < len(movies):
                     st.markdown("<hr>", unsafe_allow_html=True)
         else:
             st.write("No favorites found.")
 
-    # Load the movie dataset (adjust the path to your dataset if necessary)
-    df = pd.read_csv('data/imdb_clean.csv')
-
-    df['movie_id'] = df.index
+    # Load the movie catalog (built from data/imdb_clean.csv on first use)
+    df, emotion_index = model_registry.get('catalog')
 
     # Dictionary of emotions with emojis
     emotions_dict = {
@@ -279,7 +469,7 @@ else:
     # Save the selected emotion in st.session_state so it doesn't get lost
     if selected_emotion:
         st.session_state['selected_emotion'] = selected_emotion
-        st.session_state['shown_movies'] = set()  # Reset shown movies when the emotion changes
+        st.session_state['displayed_movies'] = []  # Reset the cards when the emotion changes
 
     # If there's already a selected emotion in session_state, use it
     if 'selected_emotion' in st.session_state:
@@ -289,32 +479,42 @@ else:
     if selected_emotion:
         st.write(f"You selected: {emotions_dict[selected_emotion]} {selected_emotion}")
 
-        # Filter movies based on the selected emotion
-        filtered_movies = df[df['emotions'].apply(lambda x: selected_emotion in x)].copy()
-
-        # Add predicted ratings for each filtered movie
-        filtered_movies.loc[:, 'predicted_rating'] = filtered_movies['movie_id'].apply(lambda x: predict_rating(st.session_state['user_id'], x))
+        # Recommendation candidates for this user and emotion (served from the cache when possible)
+        user_id = st.session_state['user_id']
+        candidate_rows, predicted = get_recommendations(user_id, selected_emotion, user_state)
 
-        # Sort movies by predicted rating
-        filtered_movies = filtered_movies.sort_values(by='predicted_rating', ascending=False)
+        # Candidate movies with their predicted ratings (best first, then exploration)
+        with metrics.timer('candidate_frame'):
+            filtered_movies = df.iloc[candidate_rows].copy()
+            filtered_movies.loc[:, 'predicted_rating'] = predicted
 
         # Limit the number of movies to display (between 6 and 12, with a default value of 6)
         num_movies_to_display = st.slider("Number of movies to display", min_value=6, max_value=12, value=6)
 
-        # Initialize the list of shown movies if it doesn't exist in the session
-        if 'shown_movies' not in st.session_state or not st.session_state['shown_movies']:
-            # Randomly select the first movies
-            initial_movies = filtered_movies.sample(n=num_movies_to_display).index.tolist()
-            st.session_state['shown_movies'] = initial_movies
-        else:
-            # If the user increases the number of movies to display, add new movies
-            if len(st.session_state['shown_movies']) < num_movies_to_display:
-                # Get additional movies without repeating those already shown
-                new_movies = filtered_movies[~filtered_movies.index.isin(st.session_state['shown_movies'])].sample(n=num_movies_to_display - len(st.session_state['shown_movies'])).index.tolist()
-                st.session_state['shown_movies'].extend(new_movies)
-
-        # Get the shown movies based on the stored indices
-        shown_movies = filtered_movies.loc[st.session_state['shown_movies']]
+        # Cards to show, sampled from the candidates
+        with metrics.timer('sample'):
+            # Initialize the list of displayed movies if it doesn't exist in the session
+            # (movies shown to the user before are less likely to be picked)
+            if 'displayed_movies' not in st.session_state or not st.session_state['displayed_movies']:
+                # Randomly select the first movies
+                weights = user_state.sample_weights(filtered_movies.index, SHOWN_MOVIE_WEIGHT)
+                initial_movies = filtered_movies.sample(n=min(num_movies_to_display, len(filtered_movies)), weights=weights).index.tolist()
+                st.session_state['displayed_movies'] = initial_movies
+            else:
+                # If the user increases the number of movies to display, add new movies
+                if len(st.session_state['displayed_movies']) < num_movies_to_display:
+                    # Get additional movies without repeating those already displayed
+                    remaining_movies = filtered_movies[~filtered_movies.index.isin(st.session_state['displayed_movies'])]
+                    weights = user_state.sample_weights(remaining_movies.index, SHOWN_MOVIE_WEIGHT)
+                    new_movies = remaining_movies.sample(n=min(num_movies_to_display - len(st.session_state['displayed_movies']), len(remaining_movies)), weights=weights).index.tolist()
+                    st.session_state['displayed_movies'].extend(new_movies)
+
+            # Get the displayed movies based on the stored indices (from the catalog, as the
+            # candidate list may change when a new model version is loaded)
+            shown_movies = df.loc[st.session_state['displayed_movies']]
+
+        # Favorite predictions of the shown movies, in one lookup
+        favorite_predictions = dict(zip(shown_movies.index, predict_favorite_movies(shown_movies['movie_id'].to_numpy())))
 
         # Display the movies in a grid format (3 columns)
         for i in range(0, len(shown_movies), 3):
@@ -330,12 +530,12 @@ else:
                     st.write(f"Duration: {movie['duration']} min")
                     st.write(f"Rating: {movie['rating']}")
 
-                    is_favorite_pred = predict_favorite([movie['duration'], movie['rating']])
+                    is_favorite_pred = favorite_predictions[index]
 
-                    # Register "shown" only if the movie hasn't been shown in this session
-                    if not check_session_interaction(index):
+                    # Register "shown" only the first time the movie is shown to the user
+                    # (in this session or a previous one)
+                    if user_state.mark_shown(index):
                         save_interaction(st.session_state['user_id'], index, selected_emotion, "shown")
-                        register_session_interaction(index)
 
                     # Expand description without the "Show more details" button
                     with st.expander("Description", expanded=False):
@@ -354,4 +554,33 @@ else:
         st.write("")
 
     # Show the favorites history
-    show_favorites(st.session_state['user_id'])
\ No newline at end of file
+    show_favorites(st.session_state['user_id'])
+
+# Startup profile of this script run (FEELMS_PROFILE_STARTUP=1)
+if profiler.enabled:
+    profiler.print_report()
+    with st.sidebar.expander("Startup profile"):
+        st.code(profiler.report())
+
+# Performance panel: timings of this rerun and of the session (FEELMS_DEBUG_PANEL=1 or ?debug=1)
+if os.environ.get('FEELMS_DEBUG_PANEL') == '1' or st.query_params.get('debug') == '1':
+    summary = rerun_metrics.summary()
+    with st.sidebar.expander("Performance", expanded=True):
+        st.write(f"This rerun: {summary['elapsed_ms']:.0f} ms, {summary['db_queries']} DB queries ({summary['db_ms']:.0f} ms)")
+        st.table([{'stage': name, 'calls': stage['calls'], 'ms': round(stage['ms'], 2)} for name, stage in summary['stages'].items()])
+        st.caption("Models")
+        st.table([
+            {'artifact': name, 'version': artifact['version'], 'path': artifact['path'], 'reloads': artifact['reloads'], 'failures': artifact['failures'], 'last_error': artifact['last_error']}
+            for name, artifact in get_model_registry().stats().items()
+        ])
+        st.caption("Session (ms)")
+        st.table([
+            {
+                'metric': histogram['labels'].get('stage') or histogram['labels'].get('statement'),
+                'count': histogram['count'],
+                'p50': round(histogram['p50'] * 1000, 2),
+                'p95': round(histogram['p95'] * 1000, 2),
+                'p99': round(histogram['p99'] * 1000, 2),
+            }
+            for histogram in st.session_state['metrics'].snapshot()['histograms']
+        ])
@@ -0,0 +1,184 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from streaming_preprocess import PairLookup, iter_chunks
+
+# Aggregates of the interaction log for the EDA notebooks and the monthly report.
+#
+# The log is read once, in chunks (a DataFrame, a CSV path or an iterable of DataFrames),
+# with emotion and interaction_type as categoricals. Every aggregate is updated from each
+# chunk, so memory depends on the number of users, movies and favorite/rated pairs, not on
+# the size of the log. Favorites and ratings are small tables, looked up by their
+# (user_id, movie_id) key: the emotion of a favorite or a rating is the emotion of the
+# last interaction with that pair (no many-to-many merge on movie_id). Movie attributes
+# (title, director, year) are only joined to the per-movie totals.
+#
+# Results are plain DataFrames; plotting is in data_analysis.py.
+
+CATEGORICAL_COLUMNS = ['emotion', 'interaction_type']
+
+# Running aggregates of the interaction log, updated chunk by chunk
+class LogAggregator:
+    def __init__(self, df_favorites=None, df_ratings=None):
+        empty = pd.DataFrame({'user_id': [], 'movie_id': [], 'rating': []})
+        self.favorites = PairLookup(df_favorites if df_favorites is not None else empty)
+        self.ratings = PairLookup(df_ratings if df_ratings is not None else empty, ['rating'])
+        self.rows = 0
+        self.views = 0
+        self.views_with_favorites = 0
+        self.counts = {}
+        # Emotion of the last interaction of every favorite / rated pair, and when it happened
+        self.pair_emotions = {name: (np.full(len(lookup), None, dtype=object), np.full(len(lookup), np.iinfo(np.int64).min))
+                              for name, lookup in (('favorite', self.favorites), ('rating', self.ratings))}
+
+    def _count(self, name, counts):
+        counts = counts[counts > 0]
+        total = self.counts.get(name)
+        self.counts[name] = counts.astype('int64') if total is None else total.add(counts, fill_value=0).astype('int64')
+
+    # Keep the emotion of the latest interaction of every pair found in the chunk
+    def _update_pair_emotions(self, name, positions, emotions, order):
+        found = positions >= 0
+        if not found.any():
+            return
+        slot_emotions, slot_order = self.pair_emotions[name]
+        latest = pd.DataFrame({'position': positions[found], 'order': order[found], 'emotion': emotions[found]})
+        latest = latest.sort_values('order', kind='stable').drop_duplicates('position', keep='last')
+        rows, newer_order = latest['position'].to_numpy(), latest['order'].to_numpy()
+        newer = newer_order >= slot_order[rows]
+        slot_order[rows[newer]] = newer_order[newer]
+        slot_emotions[rows[newer]] = latest['emotion'].to_numpy()[newer]
+
+    def update(self, chunk):
+        chunk = chunk.astype({column: 'category' for column in CATEGORICAL_COLUMNS if column in chunk.columns})
+        start = self.rows
+        self.rows += len(chunk)
+
+        self._count('interaction_type', chunk['interaction_type'].value_counts())
+        self._count('emotion', chunk['emotion'].value_counts())
+        if 'date' in chunk.columns:
+            dates = pd.to_datetime(chunk['date'])
+            self._count('month', dates.dt.to_period('M').value_counts())
+            order = dates.to_numpy().astype('datetime64[ns]').astype(np.int64)
+        else:
+            # Without dates, the log order says which interaction is the latest
+            order = np.arange(start, self.rows, dtype=np.int64)
+
+        is_shown = (chunk['interaction_type'] == 'shown').to_numpy()
+        is_view = (chunk['interaction_type'] == 'view').to_numpy()
+        self._count('user_interactions', chunk['user_id'].value_counts())
+        self._count('user_views', chunk.loc[is_view, 'user_id'].value_counts())
+        self._count('movie_interactions', chunk['movie_id'].value_counts())
+        self._count('movie_shown', chunk.loc[is_shown, 'movie_id'].value_counts())
+
+        user_ids, movie_ids = chunk['user_id'].to_numpy(), chunk['movie_id'].to_numpy()
+        emotions = chunk['emotion'].to_numpy(dtype=object)
+        favorite_positions = self.favorites.positions(user_ids, movie_ids)
+        self.views += int(is_view.sum())
+        self.views_with_favorites += int((is_view & (favorite_positions >= 0)).sum())
+        self._update_pair_emotions('favorite', favorite_positions, emotions, order)
+        self._update_pair_emotions('rating', self.ratings.positions(user_ids, movie_ids), emotions, order)
+
+    # Counts of an aggregate as a DataFrame (key, value_name), most frequent first unless sort_index
+    def _table(self, name, key, value_name='count', sort_index=False):
+        counts = self.counts.get(name, pd.Series(dtype='int64'))
+        counts = counts.sort_index() if sort_index else counts.sort_values(ascending=False, kind='stable')
+        return counts.rename(value_name).rename_axis(key).reset_index()
+
+    # Emotion of every rated pair with its rating (pairs without interactions are left out)
+    def rated_emotions(self):
+        emotions = self.pair_emotions['rating'][0]
+        known = pd.notna(emotions)
+        return pd.DataFrame({
+            'emotion': pd.Categorical(emotions[known]),
+            'rating': self.ratings.values['rating'][known],
+        })
+
+    # Every aggregate as DataFrames. With df_movies (indexed by movie_id),
+    # also the most shown movies and the interactions per director and per year.
+    def result(self, df_movies=None, top=10):
+        users = pd.DataFrame({
+            'interactions': self.counts.get('user_interactions', pd.Series(dtype='int64')),
+            'views': self.counts.get('user_views', pd.Series(dtype='int64')),
+        }).fillna(0).astype('int64').rename_axis('user_id').reset_index()
+        movies = pd.DataFrame({
+            'interactions': self.counts.get('movie_interactions', pd.Series(dtype='int64')),
+            'shown': self.counts.get('movie_shown', pd.Series(dtype='int64')),
+        }).fillna(0).astype('int64').rename_axis('movie_id').reset_index()
+
+        favorite_emotions = pd.Series(self.pair_emotions['favorite'][0]).dropna().astype('category').value_counts()
+        rated_emotions = self.rated_emotions()
+        results = {
+            'interaction_types': self._table('interaction_type', 'interaction_type'),
+            'emotions': self._table('emotion', 'emotion'),
+            'monthly': self._table('month', 'month', sort_index=True),
+            'users': users,
+            'movies': movies,
+            'favorite_emotions': favorite_emotions[favorite_emotions > 0].rename('count').rename_axis('emotion').reset_index(),
+            'rated_emotions': rated_emotions,
+            'rating_stats_by_emotion': rated_emotions.groupby('emotion', observed=True)['rating'].describe(),
+            'views_to_favorites': pd.DataFrame([{
+                'views': self.views,
+                'views_with_favorites': self.views_with_favorites,
+                'proportion': self.views_with_favorites / self.views if self.views else 0.0,
+            }]),
+        }
+
+        if df_movies is not None:
+            # Movies that are not in df_movies are left out (as an inner join)
+            movies = movies[df_movies.index.get_indexer(movies['movie_id'].to_numpy()) >= 0]
+            attributes = df_movies.loc[movies['movie_id'].to_numpy(), ['title', 'director', 'year']]
+            movies = movies.assign(**{column: attributes[column].to_numpy() for column in attributes.columns})
+            results['top_shown'] = movies[movies['shown'] > 0].nlargest(top, 'shown', keep='first')[['movie_id', 'shown', 'title']].rename(columns={'shown': 'count'}).reset_index(drop=True)
+            # Interactions per director/year: per-movie totals summed over the movie attribute
+            results['directors'] = movies.groupby('director')['interactions'].sum().sort_values(ascending=False, kind='stable').head(top).reset_index()
+            results['years'] = movies.groupby('year')['interactions'].sum().sort_index().reset_index()
+        return results
+
+# Function to get the favorites per user (from the favorites table)
+def favorites_per_user(df_favorites):
+    return df_favorites['user_id'].value_counts().rename('favorites').rename_axis('user_id').reset_index()
+
+# Function to get the distribution of the ratings (from the ratings table)
+def rating_distribution(df_ratings):
+    return df_ratings['rating'].value_counts().sort_index().rename('count').rename_axis('rating').reset_index()
+
+# Function to compute every aggregate in one pass over the interactions
+# (a DataFrame, a CSV path or an iterable of DataFrames, read chunk_size rows at a time)
+def compute_analytics(interactions, df_favorites=None, df_ratings=None, df_movies=None, chunk_size=1_000_000, top=10):
+    aggregator = LogAggregator(df_favorites, df_ratings)
+    for chunk in iter_chunks(interactions, chunk_size):
+        aggregator.update(chunk)
+    results = aggregator.result(df_movies, top)
+    if df_favorites is not None:
+        results['favorites_per_user'] = favorites_per_user(df_favorites)
+    if df_ratings is not None:
+        results['ratings'] = rating_distribution(df_ratings)
+    return results
+
+# Monthly report: python lib/analytics.py --interactions data/interactions.csv --out reports/2024-08
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compute the interaction analytics and save them as CSV files")
+    parser.add_argument('--interactions', default='data/interactions.csv')
+    parser.add_argument('--favorites', default='data/favorites.csv')
+    parser.add_argument('--ratings', default='data/ratings.csv')
+    parser.add_argument('--movies', default='data/imdb_clean.csv')
+    parser.add_argument('--out', default='reports/analytics')
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    results = compute_analytics(
+        args.interactions,
+        pd.read_csv(args.favorites, usecols=['user_id', 'movie_id']),
+        pd.read_csv(args.ratings, usecols=['user_id', 'movie_id', 'rating']),
+        # movie_id is the row position in imdb_clean.csv
+        pd.read_csv(args.movies, usecols=['title', 'director', 'year']),
+        chunk_size=args.chunk_size,
+        top=args.top,
+    )
+    os.makedirs(args.out, exist_ok=True)
+    for name, table in results.items():
+        table.to_csv(os.path.join(args.out, f'{name}.csv'), index=name == 'rating_stats_by_emotion')
+    print(f"Saved {len(results)} tables to {args.out}")
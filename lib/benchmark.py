@@ -0,0 +1,288 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import repository
+from db import connect_sqlite
+from schema import migrate
+from event_queue import WriteBehindQueue
+from catalog_store import load_catalog, write_catalog
+from scoring import SVDScorer
+from online_svd import OnlineSVD
+from model_registry import load_pickle
+from retrieval import recommend_candidates
+from favorite_scoring import FavoriteScorer
+
+# Benchmark of the recommendation hot path of app.py.
+#
+# Each iteration is one rerun of the recommendations page for a random user and emotion:
+# candidate retrieval, candidate frame, sampling of the cards, favorite predictions and
+# "shown" logging. The database is replaced by a local SQLite file, seeded with users,
+# interactions, favorites and ratings from data_generation. As in the app, the ratings are
+# replayed into the SVD model (known users are updated, new users folded in), and the
+# requesting users are drawn from the interactions, so active users make more requests
+# and users without ratings take the unknown-user path. With --legacy, the
+# original per-row implementation (emotion filter with apply, one svd.predict per movie,
+# full sort, one rf.predict and one INSERT per card) is measured too, for comparison.
+#
+# python lib/benchmark.py --csv data/imdb_clean.csv --movies 100000 --users 10000 --interactions 500000
+# python lib/benchmark.py --compare benchmark_results/a.json benchmark_results/b.json
+
+EMOTIONS = ['Happy', 'Down', 'Excited', 'Relaxed', 'Sweet', 'Scared', 'Inspired']
+
+# Latency samples per stage
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+        self.items = {}
+
+    # Time one execution of a stage; items is the number of units it processed (e.g. cards)
+    @contextmanager
+    def stage(self, name, items=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - start)
+            self.items[name] = self.items.get(name, 0) + items
+
+    # p50/p95/p99 latency (ms) and throughput (items per second) of every stage
+    def summary(self):
+        summary = {}
+        for name, samples in self.samples.items():
+            samples = np.array(samples)
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+            summary[name] = {
+                'count': len(samples),
+                'mean_ms': float(samples.mean() * 1000),
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+                'throughput_per_s': float(self.items[name] / samples.sum()) if samples.sum() > 0 else None,
+            }
+        return summary
+
+# Function to get the current git commit (and whether the tree has local changes)
+def git_revision():
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=repo_dir).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, cwd=repo_dir).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+# Function to load the movies CSV (optionally scaled to num_movies synthetic rows)
+def load_movies(csv_path, num_movies=None, seed=42):
+    df = pd.read_csv(csv_path)
+    if num_movies is not None and num_movies != len(df):
+        from data_generation import generate_movies
+        df = generate_movies(df, num_movies, seed=seed)
+    return df.reset_index(drop=True)
+
+# Function to generate the users and their interactions, favorites and ratings with
+# data_generation and load them into the database. Returns the generated frames.
+def seed_database(db, df_movies, emotion_index, num_users, num_interactions, seed=42):
+    from data_generation import (generate_users, classify_users, generate_interactions_vectorized, generate_favorites_vectorized,
+                                 generate_ratings_vectorized, insert_users, insert_interactions, insert_favorites, insert_ratings)
+    df_users = generate_users(num_users)
+    active_users, less_active_users = classify_users(df_users, seed=seed)
+    df_interactions = generate_interactions_vectorized(num_interactions, df_movies, active_users, less_active_users, seed=seed, emotion_index=emotion_index)
+    df_favorites = generate_favorites_vectorized(df_interactions, seed=seed)
+    df_ratings = generate_ratings_vectorized(df_favorites, df_interactions, seed=seed)
+
+    with db.pool.connection() as conn:
+        cursor = conn.cursor()
+        placeholder = '?' if db.dialect == 'sqlite' else '%s'
+        for insert, frame in ((insert_users, df_users), (insert_interactions, df_interactions), (insert_favorites, df_favorites), (insert_ratings, df_ratings)):
+            insert(frame, conn, cursor, placeholder=placeholder, verbose=False)
+    return {'users': df_users, 'interactions': df_interactions, 'favorites': df_favorites, 'ratings': df_ratings}
+
+# Function to run the benchmark and return the results as a dict
+def run_benchmark(csv_path='data/imdb_clean.csv', svd_path='model/svd_model.pkl', rf_path='model/rf_model.pkl',
+                  num_movies=None, num_users=1000, num_interactions=None, iterations=200, cards=6, legacy=False,
+                  legacy_iterations=10, seed=42, work_dir=None):
+    rng = np.random.default_rng(seed)
+    timer = StageTimer()
+    work_dir = work_dir or tempfile.mkdtemp(prefix='feelms-benchmark-')
+
+    # Setup stages (once per run): data and models, as at app start
+    with timer.stage('csv_load'):
+        df_csv = load_movies(csv_path, num_movies, seed)
+    catalog_path = os.path.join(work_dir, 'catalog')
+    with timer.stage('catalog_build'):
+        write_catalog(df_csv, catalog_path)
+    with timer.stage('catalog_load'):
+        catalog = load_catalog(catalog_path)
+        df = catalog.to_frame().set_index('movie_id', drop=False)
+        emotion_index = catalog.emotion_index()
+    with timer.stage('rf_load'):
+        rf_model = load_pickle(rf_path)
+    with timer.stage('favorite_precompute', items=len(df)):
+        favorite_scorer = FavoriteScorer.from_model(rf_model, df)
+
+    # Local database stand-in, seeded with the generated user base
+    db = connect_sqlite(os.path.join(work_dir, 'benchmark.db'), pool_size=4)
+    migrate(db)
+    num_interactions = num_interactions or num_users * 20
+    with timer.stage('seed_database', items=num_interactions):
+        generated = seed_database(db, df, emotion_index, num_users, num_interactions, seed)
+
+    # SVD model with the saved ratings replayed into it, as get_online_svd does in the app
+    with timer.stage('svd_load'):
+        svd_model = load_pickle(svd_path)
+        scorer = OnlineSVD(SVDScorer.from_model(svd_model))
+    with timer.stage('ratings_replay', items=len(generated['ratings'])):
+        scorer.add_ratings(repository.get_ratings_since(db, datetime.datetime.min))
+
+    interaction_queue = WriteBehindQueue(lambda rows: repository.save_interactions(db, rows), batch_size=200, flush_interval=2.0, name='benchmark-writer')
+
+    # Requests follow the traffic of the generated interactions (active users come back more often)
+    request_users = generated['interactions']['user_id'].to_numpy()
+    user_ids = request_users[rng.integers(0, len(request_users), iterations)]
+    emotions = rng.choice(EMOTIONS, iterations)
+    known_requests = sum(scorer.user_factors(user_id) is not None for user_id in user_ids.tolist())
+
+    # Current implementation, one iteration per rerun
+    for user_id, emotion in zip(user_ids.tolist(), emotions.tolist()):
+        with timer.stage('rerun_total'):
+            with timer.stage('recommend'):
+                rows, predicted = recommend_candidates(scorer, emotion_index, user_id, emotion)
+            with timer.stage('candidate_frame'):
+                filtered_movies = df.iloc[rows].copy()
+                filtered_movies.loc[:, 'predicted_rating'] = predicted
+            with timer.stage('sample'):
+                shown = filtered_movies.sample(n=min(cards, len(filtered_movies)), random_state=rng.integers(1 << 31))
+            with timer.stage('favorite_lookup', items=len(shown)):
+                favorite_scorer.is_favorite(shown['movie_id'].to_numpy())
+            with timer.stage('log_shown', items=len(shown)):
+                now = datetime.datetime.now()
+                for movie_id in shown.index.tolist():
+                    interaction_queue.put((user_id, movie_id, emotion, 'shown', now))
+
+    with timer.stage('queue_flush'):
+        interaction_queue.close()
+
+    # Original implementation (slow: run a few iterations only)
+    if legacy:
+        for user_id, emotion in zip(user_ids[:legacy_iterations].tolist(), emotions[:legacy_iterations].tolist()):
+            with timer.stage('legacy_rerun_total'):
+                with timer.stage('legacy_emotion_filter'):
+                    filtered_movies = df_csv[df_csv['emotions'].apply(lambda x: emotion in x)].copy()
+                with timer.stage('legacy_predict', items=len(filtered_movies)):
+                    filtered_movies.loc[:, 'predicted_rating'] = [svd_model.predict(user_id, movie_id).est for movie_id in filtered_movies.index]
+                with timer.stage('legacy_sort'):
+                    filtered_movies = filtered_movies.sort_values(by='predicted_rating', ascending=False)
+                shown = filtered_movies.sample(n=min(cards, len(filtered_movies)), random_state=rng.integers(1 << 31))
+                with timer.stage('legacy_predict_favorite', items=len(shown)):
+                    for _, movie in shown.iterrows():
+                        rf_model.predict(pd.DataFrame([[movie['duration'], movie['rating']]], columns=['duration', 'rating']))
+                with timer.stage('legacy_save_interaction', items=len(shown)):
+                    for movie_id in shown.index.tolist():
+                        repository.save_interaction(db, user_id, movie_id, emotion, 'shown')
+
+    db.close()
+    commit, dirty = git_revision()
+    return {
+        'git_commit': commit,
+        'git_dirty': dirty,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'csv_path': csv_path,
+            'svd_path': svd_path,
+            'rf_path': rf_path,
+            'iterations': iterations,
+            'cards': cards,
+            'legacy_iterations': legacy_iterations if legacy else 0,
+            'seed': seed,
+        },
+        'dataset': {
+            'num_movies': len(df),
+            'num_users': num_users,
+            'num_interactions': len(generated['interactions']),
+            'num_favorites': len(generated['favorites']),
+            'num_ratings': len(generated['ratings']),
+            'model_users': len(scorer.user_index),
+            'model_movies': len(scorer.movie_index),
+            'online_users': scorer.stats()['overridden_users'],
+            'known_user_requests': known_requests / iterations if iterations else None,
+        },
+        'stages': timer.summary(),
+    }
+
+# Function to save the results as JSON (named after the time and commit) and return the path
+def save_results(results, out_dir='benchmark_results'):
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = results['timestamp'].replace(':', '').replace('-', '')
+    path = os.path.join(out_dir, f"{stamp}-{results['git_commit']}.json")
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
+    return path
+
+# Function to format the stage table of a results dict
+def format_results(results):
+    table = pd.DataFrame(results['stages']).T[['count', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput_per_s']]
+    return table.to_string(float_format=lambda value: f'{value:.3f}')
+
+# Function to compare two saved runs: p50/p95 of every stage and the speedup of the second one
+def compare_results(base_path, new_path):
+    with open(base_path) as file:
+        base = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+    rows = {}
+    for stage in sorted(set(base['stages']) & set(new['stages'])):
+        old_stats, new_stats = base['stages'][stage], new['stages'][stage]
+        rows[stage] = {
+            'base_p50_ms': old_stats['p50_ms'],
+            'new_p50_ms': new_stats['p50_ms'],
+            'p95_ratio': new_stats['p95_ms'] / old_stats['p95_ms'] if old_stats['p95_ms'] else None,
+            'speedup_p50': old_stats['p50_ms'] / new_stats['p50_ms'] if new_stats['p50_ms'] else None,
+        }
+    return pd.DataFrame(rows).T
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation hot path")
+    parser.add_argument('--csv', default='data/imdb_clean.csv')
+    parser.add_argument('--svd', default='model/svd_model.pkl')
+    parser.add_argument('--rf', default='model/rf_model.pkl')
+    parser.add_argument('--movies', type=int, default=None, help="scale the catalog to this many movies")
+    parser.add_argument('--users', type=int, default=1000, help="number of generated users making requests")
+    parser.add_argument('--interactions', type=int, default=None, help="number of generated interactions (default: 20 per user)")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--cards', type=int, default=6)
+    parser.add_argument('--legacy', action='store_true', help="also measure the original per-row implementation")
+    parser.add_argument('--legacy-iterations', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default='benchmark_results')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="compare two saved result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        print(f"base: {args.compare[0]}\nnew:  {args.compare[1]}")
+        print(compare_results(*args.compare).to_string(float_format=lambda value: f'{value:.3f}'))
+    else:
+        results = run_benchmark(
+            csv_path=args.csv,
+            svd_path=args.svd,
+            rf_path=args.rf,
+            num_movies=args.movies,
+            num_users=args.users,
+            num_interactions=args.interactions,
+            iterations=args.iterations,
+            cards=args.cards,
+            legacy=args.legacy,
+            legacy_iterations=args.legacy_iterations,
+            seed=args.seed,
+        )
+        print(format_results(results))
+        print(f"Saved to {save_results(results, args.out)}")
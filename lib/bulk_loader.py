@@ -0,0 +1,198 @@
+import csv
+import hashlib
+import json
+import os
+import tempfile
+import time
+import pandas as pd
+
+# Bulk loader for the generated datasets.
+# A DataFrame is streamed into a table in chunks, committing after each chunk:
+#   - method='executemany': cursor.executemany (mysql-connector sends one multi-row INSERT)
+#   - method='values': an explicit multi-row INSERT ... VALUES (...), (...) per chunk
+#   - method='infile': LOAD DATA LOCAL INFILE from a temporary CSV per chunk
+#     (the connection needs allow_local_infile=True)
+# With checkpoint_path, the number of committed rows is recorded after every chunk
+# and a rerun of the same data (same table, rows and content hash) resumes from the
+# last committed chunk. A finished load is marked complete: running it again reports
+# "already loaded" and inserts nothing (delete the checkpoint to load the data again).
+# With disable_indexes (MySQL), the non-unique secondary indexes are dropped before the
+# load and created again at the end. InnoDB ignores ALTER TABLE ... DISABLE KEYS, so this
+# is what saves the per-row index maintenance. Unique indexes are kept, and checked during
+# the load: they guard the data (the rating upsert relies on them).
+
+# Function to turn a chunk into a list of tuples of plain Python values (NaN -> NULL)
+def chunk_rows(chunk):
+    columns = []
+    for column in chunk.columns:
+        series = chunk[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            # Send pandas Timestamps as datetime.datetime, which every driver understands
+            values = [None if pd.isna(value) else value.to_pydatetime() for value in series]
+        else:
+            values = series.astype(object).where(series.notna(), None).tolist()
+        columns.append(values)
+    return list(zip(*columns))
+
+# Function to hash the content of the rows to load (columns, values and order)
+def data_sha256(frame):
+    digest = hashlib.sha256(json.dumps(list(map(str, frame.columns))).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+# Function to read a checkpoint of this table and data ({} if there is none)
+def read_checkpoint(checkpoint_path, table, total_rows, data_hash):
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return {}
+    with open(checkpoint_path) as file:
+        checkpoint = json.load(file)
+    if (checkpoint.get('table'), checkpoint.get('total_rows'), checkpoint.get('data_sha256')) != (table, total_rows, data_hash):
+        # The checkpoint belongs to another load: start from scratch
+        return {}
+    return checkpoint
+
+# Function to record the rows committed so far (and the indexes to create again at the end)
+def write_checkpoint(checkpoint_path, table, total_rows, data_hash, rows_loaded, dropped_indexes=(), complete=False):
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump({'table': table, 'total_rows': total_rows, 'data_sha256': data_hash, 'rows_loaded': rows_loaded,
+                   'dropped_indexes': list(dropped_indexes), 'complete': complete}, file)
+    os.replace(tmp_path, checkpoint_path)
+
+# Function to drop the non-unique secondary indexes of a table before the load (MySQL).
+# Returns their [name, columns] so they can be created again.
+def drop_secondary_indexes(cursor, table):
+    cursor.execute(
+        "SELECT index_name, column_name, sub_part FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND index_name <> 'PRIMARY' AND non_unique = 1 "
+        "ORDER BY index_name, seq_in_index",
+        (table,),
+    )
+    indexes = {}
+    for name, column, sub_part in cursor.fetchall():
+        indexes.setdefault(name, []).append(column if sub_part is None else f"{column}({sub_part})")
+    for name in indexes:
+        cursor.execute(f"DROP INDEX {name} ON {table}")
+    return [[name, columns] for name, columns in indexes.items()]
+
+# Function to create the dropped indexes again after the load (MySQL)
+def create_secondary_indexes(cursor, table, indexes):
+    for name, columns in indexes:
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+
+# Function to disable index maintenance during the load (MySQL).
+# unique_checks stay on, so duplicated keys are still rejected.
+def disable_keys(cursor, table):
+    cursor.execute("SET foreign_key_checks = 0")
+    return drop_secondary_indexes(cursor, table)
+
+# Function to re-enable index maintenance after the load (MySQL)
+def enable_keys(cursor, table, indexes):
+    create_secondary_indexes(cursor, table, indexes)
+    cursor.execute("SET foreign_key_checks = 1")
+
+def _insert_executemany(cursor, table, columns, rows, placeholder):
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([placeholder] * len(columns))})"
+    cursor.executemany(query, rows)
+
+def _insert_values(cursor, table, columns, rows, placeholder):
+    row_placeholders = f"({', '.join([placeholder] * len(columns))})"
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([row_placeholders] * len(rows))}"
+    cursor.execute(query, [value for row in rows for value in row])
+
+def _insert_infile(cursor, table, columns, rows, placeholder):
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as file:
+        writer = csv.writer(file)
+        # MySQL reads \N as NULL
+        writer.writerows([['\\N' if value is None else value for value in row] for row in rows])
+        path = file.name
+    try:
+        query = f"""
+        LOAD DATA LOCAL INFILE '{path}' INTO TABLE {table}
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '\\r\\n'
+        ({', '.join(columns)})
+        """
+        cursor.execute(query)
+    finally:
+        os.remove(path)
+
+LOAD_METHODS = {
+    'executemany': _insert_executemany,
+    'values': _insert_values,
+    'infile': _insert_infile,
+}
+
+# Function to load a DataFrame into a table in chunks and report the throughput
+def bulk_load(df, table, columns, conn, cursor=None, chunk_size=5000, method='executemany',
+              disable_indexes=False, checkpoint_path=None, placeholder='%s', verbose=True):
+    if method not in LOAD_METHODS:
+        raise ValueError(f"Unknown load method '{method}', expected one of {list(LOAD_METHODS)}")
+    insert = LOAD_METHODS[method]
+    cursor = cursor or conn.cursor()
+
+    frame = df[columns]
+    total_rows = len(frame)
+    data_hash = data_sha256(frame) if checkpoint_path else None
+    checkpoint = read_checkpoint(checkpoint_path, table, total_rows, data_hash)
+    if checkpoint.get('complete'):
+        if verbose:
+            print(f"{table}: already loaded ({total_rows} rows, see {checkpoint_path})")
+        return {'table': table, 'rows': 0, 'resumed_from': total_rows, 'chunks': 0, 'seconds': 0.0,
+                'rows_per_sec': float('nan'), 'already_loaded': True}
+    start_row = checkpoint.get('rows_loaded', 0)
+    if verbose and start_row:
+        print(f"{table}: resuming after {start_row} committed rows")
+
+    start = time.perf_counter()
+    rows_loaded = start_row
+    chunks = 0
+
+    # Indexes dropped by an interrupted run are already gone: create them again at the end too
+    dropped_indexes = checkpoint.get('dropped_indexes', [])
+    if disable_indexes:
+        dropped_indexes = dropped_indexes + disable_keys(cursor, table)
+        if checkpoint_path:
+            write_checkpoint(checkpoint_path, table, total_rows, data_hash, rows_loaded, dropped_indexes)
+    try:
+        for chunk_start in range(start_row, total_rows, chunk_size):
+            chunk = frame.iloc[chunk_start:chunk_start + chunk_size]
+            insert(cursor, table, columns, chunk_rows(chunk), placeholder)
+            conn.commit()
+
+            rows_loaded = chunk_start + len(chunk)
+            chunks += 1
+            if checkpoint_path:
+                write_checkpoint(checkpoint_path, table, total_rows, data_hash, rows_loaded, dropped_indexes)
+            if verbose:
+                elapsed = time.perf_counter() - start
+                print(f"{table}: {rows_loaded}/{total_rows} rows ({(rows_loaded - start_row) / max(elapsed, 1e-9):,.0f} rows/sec)")
+    finally:
+        if disable_indexes or dropped_indexes:
+            enable_keys(cursor, table, dropped_indexes)
+            conn.commit()
+            if checkpoint_path:
+                write_checkpoint(checkpoint_path, table, total_rows, data_hash, rows_loaded)
+    if checkpoint_path:
+        write_checkpoint(checkpoint_path, table, total_rows, data_hash, rows_loaded, complete=True)
+
+    seconds = time.perf_counter() - start
+    return {
+        'table': table,
+        'rows': rows_loaded - start_row,
+        'resumed_from': start_row,
+        'chunks': chunks,
+        'seconds': seconds,
+        'rows_per_sec': (rows_loaded - start_row) / seconds if seconds > 0 else float('inf'),
+        'already_loaded': False,
+    }
+
+# Function to load several tables in order, e.g. {'users': (df_users, [...]), ...}
+def bulk_load_tables(tables, conn, checkpoint_dir=None, **kwargs):
+    reports = []
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    for table, (df, columns) in tables.items():
+        checkpoint_path = os.path.join(checkpoint_dir, f'{table}.checkpoint.json') if checkpoint_dir else None
+        reports.append(bulk_load(df, table, columns, conn, checkpoint_path=checkpoint_path, **kwargs))
+    return pd.DataFrame(reports)
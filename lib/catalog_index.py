@@ -0,0 +1,75 @@
+import ast
+import numpy as np
+
+# Function to turn an 'emotions' (or 'genre') value into a list.
+# imdb_clean.csv stores the lists as strings like "['Happy', 'Excited']".
+def parse_list(value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('['):
+            return list(ast.literal_eval(value))
+        return [item.strip() for item in value.split(',') if item.strip()]
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return []
+    return list(value)
+
+# Inverted index over the movie catalog: emotion -> movies.
+# Built once when the catalog is loaded so filtering by emotion is a lookup
+# instead of a per-row scan of the 'emotions' column.
+class EmotionIndex:
+    def __init__(self, emotions, movie_ids, bitmap):
+        self.emotions = list(emotions)
+        self.movie_ids = np.asarray(movie_ids)
+        # Boolean emotion x movie matrix (rows follow self.emotions, columns the catalog rows)
+        self.bitmap = bitmap
+        self._emotion_pos = {emotion: i for i, emotion in enumerate(self.emotions)}
+
+        # Contiguous arrays of catalog row positions and movie ids per emotion
+        self._rows = {emotion: np.flatnonzero(bitmap[i]) for i, emotion in enumerate(self.emotions)}
+        self._ids = {emotion: np.ascontiguousarray(self.movie_ids[rows]) for emotion, rows in self._rows.items()}
+
+    # Catalog row positions (usable with df.iloc) of the movies tagged with an emotion
+    def rows(self, emotion):
+        return self._rows.get(emotion, np.empty(0, dtype=np.intp))
+
+    # Movie ids tagged with an emotion
+    def ids(self, emotion):
+        return self._ids.get(emotion, np.empty(0, dtype=self.movie_ids.dtype))
+
+    # Boolean mask over the catalog rows for a list of emotions
+    def mask(self, emotions, match='any'):
+        positions = [self._emotion_pos[emotion] for emotion in emotions if emotion in self._emotion_pos]
+        # No known emotion, or an unknown one when all are required, matches nothing
+        if not positions or (match == 'all' and len(positions) < len(emotions)):
+            return np.zeros(len(self.movie_ids), dtype=bool)
+        rows = self.bitmap[positions]
+        return rows.all(axis=0) if match == 'all' else rows.any(axis=0)
+
+    # Movie ids tagged with any (or all) of the given emotions
+    def ids_for(self, emotions, match='any'):
+        return self.movie_ids[self.mask(emotions, match)]
+
+    # Number of movies per emotion
+    def counts(self):
+        return {emotion: len(rows) for emotion, rows in self._rows.items()}
+
+# Function to build the emotion index from a movie DataFrame.
+# movie_ids defaults to the DataFrame index, which is what the app and the
+# data generator use as movie_id.
+def build_emotion_index(df_movies, emotions=None, movie_ids=None, column='emotions'):
+    movie_emotions = [parse_list(value) for value in df_movies[column]]
+
+    if emotions is None:
+        emotions = sorted({emotion for emotion_list in movie_emotions for emotion in emotion_list})
+
+    emotion_pos = {emotion: i for i, emotion in enumerate(emotions)}
+    bitmap = np.zeros((len(emotions), len(df_movies)), dtype=bool)
+    for row, emotion_list in enumerate(movie_emotions):
+        for emotion in emotion_list:
+            if emotion in emotion_pos:
+                bitmap[emotion_pos[emotion], row] = True
+
+    if movie_ids is None:
+        movie_ids = df_movies.index.to_numpy()
+
+    return EmotionIndex(emotions, movie_ids, bitmap)
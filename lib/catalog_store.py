@@ -0,0 +1,194 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from catalog_index import EmotionIndex, parse_list
+from model_registry import file_sha256
+
+# Typed, columnar storage for the movie catalog.
+#
+# A catalog is a directory with a manifest.json and one .npy file per array:
+#   - numeric columns (movie_id, year, duration, rating) as plain arrays, loaded with mmap
+#   - text columns (poster, title, director, description) as utf-8 bytes + offsets
+#   - list columns (genre, cast, emotions) as integer codes + offsets, with the
+#     vocabulary stored as a text column
+# Several app processes loading the same catalog share the mapped pages.
+# The manifest records the sha256 of every array and of the CSV the catalog was built
+# from, so a new catalog always changes the manifest (the app versions it by its hash).
+
+CATALOG_VERSION = 1
+
+NUMERIC_COLUMNS = {
+    'movie_id': 'int64',
+    'year': 'int32',
+    'duration': 'int32',
+    'rating': 'float32',
+}
+TEXT_COLUMNS = ['poster', 'title', 'director', 'description']
+LIST_COLUMNS = ['genre', 'cast', 'emotions']
+
+# Function to encode a list of strings as (offsets, utf-8 bytes)
+def encode_strings(values):
+    encoded = [str(value).encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return offsets, data
+
+# Function to decode (offsets, utf-8 bytes) back into a list of strings
+def decode_strings(offsets, data):
+    raw = data.tobytes()
+    return [raw[start:end].decode('utf-8') for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+# Function to encode a column of lists as (offsets, codes, vocabulary)
+def encode_lists(values):
+    lists = [parse_list(value) for value in values]
+    vocab = sorted({item for items in lists for item in items})
+    code_of = {item: code for code, item in enumerate(vocab)}
+
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(items) for items in lists], out=offsets[1:])
+    dtype = np.int16 if len(vocab) < np.iinfo(np.int16).max else np.int32
+    codes = np.fromiter((code_of[item] for items in lists for item in items), dtype=dtype, count=offsets[-1])
+    return offsets, codes, vocab
+
+# Function to write a movie DataFrame as a columnar catalog
+# (source_sha256: hash of the CSV the frame was read from, kept in the manifest)
+def write_catalog(df, out_dir, source_sha256=None):
+    os.makedirs(out_dir, exist_ok=True)
+    df = df.reset_index(drop=True)
+
+    manifest = {'version': CATALOG_VERSION, 'num_movies': len(df), 'source_sha256': source_sha256,
+                'numeric': {}, 'text': [], 'lists': {}, 'sha256': {}}
+
+    def save(name, array):
+        # New file + rename: running apps may have the previous file memory-mapped
+        tmp_path = os.path.join(out_dir, f'{name}.npy.tmp')
+        with open(tmp_path, 'wb') as file:
+            np.save(file, np.ascontiguousarray(array))
+        manifest['sha256'][name] = file_sha256(tmp_path)
+        os.replace(tmp_path, os.path.join(out_dir, f'{name}.npy'))
+
+    # The app uses the row position as movie_id unless the frame already carries one
+    movie_ids = df['movie_id'] if 'movie_id' in df.columns else pd.Series(df.index)
+    for column, dtype in NUMERIC_COLUMNS.items():
+        values = movie_ids if column == 'movie_id' else df[column]
+        save(column, values.to_numpy().astype(dtype))
+        manifest['numeric'][column] = dtype
+
+    for column in TEXT_COLUMNS:
+        offsets, data = encode_strings(df[column])
+        save(f'{column}.offsets', offsets)
+        save(f'{column}.data', data)
+        manifest['text'].append(column)
+
+    for column in LIST_COLUMNS:
+        offsets, codes, vocab = encode_lists(df[column])
+        vocab_offsets, vocab_data = encode_strings(vocab)
+        save(f'{column}.offsets', offsets)
+        save(f'{column}.codes', codes)
+        save(f'{column}.vocab_offsets', vocab_offsets)
+        save(f'{column}.vocab_data', vocab_data)
+        manifest['lists'][column] = {'dtype': str(codes.dtype), 'vocab_size': len(vocab)}
+
+    # Write the manifest last so a partially written catalog is never loaded
+    tmp_path = os.path.join(out_dir, 'manifest.json.tmp')
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, 'manifest.json'))
+
+    return manifest
+
+# Read-only view over a catalog directory
+class MovieCatalog:
+    def __init__(self, path, mmap=True):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as file:
+            self.manifest = json.load(file)
+        if self.manifest['version'] != CATALOG_VERSION:
+            raise ValueError(f"Unsupported catalog version {self.manifest['version']} in {path}")
+
+        self._mmap_mode = 'r' if mmap else None
+        self._vocab = {}
+
+    def __len__(self):
+        return self.manifest['num_movies']
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode=self._mmap_mode)
+
+    # Numeric column as a (memory-mapped) array
+    def numeric(self, column):
+        return self._load(column)
+
+    # Text column decoded to a list of strings
+    def text(self, column):
+        return decode_strings(self._load(f'{column}.offsets'), self._load(f'{column}.data'))
+
+    # List column as (offsets, codes): the items of row i are codes[offsets[i]:offsets[i + 1]]
+    def list_codes(self, column):
+        return self._load(f'{column}.offsets'), self._load(f'{column}.codes')
+
+    # Vocabulary of a list column (code -> value)
+    def vocab(self, column):
+        if column not in self._vocab:
+            self._vocab[column] = decode_strings(self._load(f'{column}.vocab_offsets'), self._load(f'{column}.vocab_data'))
+        return self._vocab[column]
+
+    # List column decoded to a list of Python lists
+    def lists(self, column):
+        offsets, codes = self.list_codes(column)
+        vocab = np.asarray(self.vocab(column), dtype=object)
+        items = vocab[np.asarray(codes)].tolist()
+        return [items[start:end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    # Emotion index built straight from the integer codes (no string parsing)
+    def emotion_index(self, emotions=None, column='emotions'):
+        offsets, codes = self.list_codes(column)
+        vocab = self.vocab(column)
+        if emotions is None:
+            emotions = vocab
+
+        # Map vocabulary codes to rows of the bitmap (-1 for emotions not requested)
+        emotion_pos = {emotion: i for i, emotion in enumerate(emotions)}
+        code_to_row = np.array([emotion_pos.get(emotion, -1) for emotion in vocab], dtype=np.intp)
+
+        movie_rows = np.repeat(np.arange(len(self)), np.diff(offsets))
+        bitmap_rows = code_to_row[np.asarray(codes)] if len(vocab) else np.empty(0, dtype=np.intp)
+        keep = bitmap_rows >= 0
+
+        bitmap = np.zeros((len(emotions), len(self)), dtype=bool)
+        bitmap[bitmap_rows[keep], movie_rows[keep]] = True
+        return EmotionIndex(emotions, np.asarray(self.numeric('movie_id')), bitmap)
+
+    # Materialize the catalog as a DataFrame (list columns as Python lists)
+    def to_frame(self):
+        data = {}
+        for column in self.manifest['numeric']:
+            data[column] = np.asarray(self.numeric(column))
+        for column in self.manifest['text']:
+            data[column] = self.text(column)
+        for column in self.manifest['lists']:
+            data[column] = self.lists(column)
+        return pd.DataFrame(data)
+
+# Function to load a catalog directory
+def load_catalog(path, mmap=True):
+    return MovieCatalog(path, mmap=mmap)
+
+# Function to load the catalog, building it from the cleaned CSV if it doesn't exist yet
+# or if the CSV changed since the catalog was built
+def load_or_build_catalog(path, csv_path, mmap=True):
+    manifest_path = os.path.join(path, 'manifest.json')
+    if not os.path.exists(csv_path):
+        # Deployed without the CSV: serve the catalog as it is
+        return load_catalog(path, mmap=mmap)
+
+    source_sha256 = file_sha256(csv_path)
+    built_from = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            built_from = json.load(file).get('source_sha256')
+    if built_from != source_sha256:
+        write_catalog(pd.read_csv(csv_path), path, source_sha256=source_sha256)
+    return load_catalog(path, mmap=mmap)
@@ -1,10 +1,20 @@
 import matplotlib.pyplot as plt
 import seaborn as sns
-import pandas as pd
+import analytics
+
+# Plots of the EDA. The aggregates come from analytics.py: every function can be given the
+# results of analytics.compute_analytics() (one pass over the interaction log for all of
+# them); otherwise it computes them from the DataFrames it receives.
+
+# Function to get the analytics results (computed only if they weren't passed in)
+def _results(results, df_interactions, df_favorites=None, df_ratings=None, df_movies=None):
+    if results is not None:
+        return results
+    return analytics.compute_analytics(df_interactions, df_favorites, df_ratings, df_movies)
 
 # Function: Interaction type distribution
-def interaction_type_distribution(df_interactions):
-    interaction_counts = df_interactions['interaction_type'].value_counts()
+def interaction_type_distribution(df_interactions, results=None):
+    interaction_counts = _results(results, df_interactions)['interaction_types'].set_index('interaction_type')['count']
     print("Interaction type distribution:\n", interaction_counts)
     
     plt.figure(figsize=(10, 6))  # Set a bigger size for the plot
@@ -17,8 +27,8 @@ def interaction_type_distribution(df_interactions):
     plt.show()
 
 # Function: Emotion distribution in interactions
-def emotion_distribution_in_interactions(df_interactions):
-    emotion_counts = df_interactions['emotion'].value_counts()
+def emotion_distribution_in_interactions(df_interactions, results=None):
+    emotion_counts = _results(results, df_interactions)['emotions'].set_index('emotion')['count']
     print("Emotion distribution in interactions:\n", emotion_counts)
     
     plt.figure(figsize=(10, 6))
@@ -31,11 +41,9 @@ def emotion_distribution_in_interactions(df_interactions):
     plt.show()
 
 # Function: Interactions over time with monthly print
-def interaction_over_time(df_interactions):
-    df_interactions['date'] = pd.to_datetime(df_interactions['date'])
-    
-    # Group by month and count the number of interactions
-    interactions_per_month = df_interactions.groupby(df_interactions['date'].dt.to_period('M')).size()
+def interaction_over_time(df_interactions, results=None):
+    # Number of interactions per month
+    interactions_per_month = _results(results, df_interactions)['monthly'].set_index('month')['count']
     
     # Print the monthly interactions
     print("Number of interactions per month:\n", interactions_per_month)
@@ -51,7 +59,7 @@ def interaction_over_time(df_interactions):
 
 # Function: Favorites per user
 def favorites_per_user(df_favorites):
-    user_favorites = df_favorites['user_id'].value_counts()
+    user_favorites = analytics.favorites_per_user(df_favorites).set_index('user_id')['favorites']
     print("Favorites per user (Top 10):\n", user_favorites.head(10))
     
     # Plot the histogram with separated bars
@@ -65,9 +73,9 @@ def favorites_per_user(df_favorites):
     plt.show()
 
 # Function: Favorite emotion distribution
-def favorite_emotion_distribution(df_favorites, df_interactions):
-    df_merged = pd.merge(df_favorites, df_interactions[['movie_id', 'emotion']], on='movie_id')
-    emotion_counts = df_merged['emotion'].value_counts()
+# (emotion of the user's last interaction with each favorite movie)
+def favorite_emotion_distribution(df_favorites, df_interactions, results=None):
+    emotion_counts = _results(results, df_interactions, df_favorites=df_favorites)['favorite_emotions'].set_index('emotion')['count']
     print("Emotion distribution in favorite movies:\n", emotion_counts)
     
     plt.figure(figsize=(10, 6))
@@ -94,12 +102,13 @@ def rating_distribution(df_ratings):
     plt.show()
 
 # Function: Ratings by emotion
-def ratings_by_emotion(df_ratings, df_interactions):
-    # Merge the ratings with the corresponding emotions
-    df_merged = pd.merge(df_ratings, df_interactions[['movie_id', 'emotion']], on='movie_id')
+def ratings_by_emotion(df_ratings, df_interactions, results=None):
+    # Ratings with the emotion of the user's last interaction with the movie
+    results = _results(results, df_interactions, df_ratings=df_ratings)
+    df_merged = results['rated_emotions']
     
     # Print statistical summary of ratings grouped by emotion
-    emotion_stats = df_merged.groupby('emotion')['rating'].describe()
+    emotion_stats = results['rating_stats_by_emotion']
     print("Rating statistics by emotion:\n", emotion_stats)
     
     # Plot the boxplot of ratings by emotion
@@ -110,12 +119,11 @@ def ratings_by_emotion(df_ratings, df_interactions):
     plt.show()
 
 # Function: Interactions per user type (active vs less active)
-def interactions_per_user(df_interactions, active_users, less_active_users):
-    df_active = df_interactions[df_interactions['user_id'].isin(active_users)]
-    df_less_active = df_interactions[df_interactions['user_id'].isin(less_active_users)]
+def interactions_per_user(df_interactions, active_users, less_active_users, results=None):
+    user_interactions = _results(results, df_interactions)['users'].set_index('user_id')['interactions']
 
-    active_interactions = df_active['user_id'].value_counts()
-    less_active_interactions = df_less_active['user_id'].value_counts()
+    active_interactions = user_interactions[user_interactions.index.isin(active_users)].sort_values(ascending=False)
+    less_active_interactions = user_interactions[user_interactions.index.isin(less_active_users)].sort_values(ascending=False)
 
     # Print summary of interactions
     print("Active Users - Interaction Stats:")
@@ -135,19 +143,12 @@ def interactions_per_user(df_interactions, active_users, less_active_users):
     plt.show()
 
 # Function: Analyze favorites from views
-def analyze_favorites_from_views(df_interactions, df_favorites):
-    # Filter interactions of type 'view'
-    df_views = df_interactions[df_interactions['interaction_type'] == 'view']
-
-    # Merge with favorites to see which 'view' interactions are also in favorites
-    df_merged = pd.merge(df_views[['user_id', 'movie_id']], df_favorites, on=['user_id', 'movie_id'], how='left', indicator=True)
-
-    # Count how many 'view' interactions were also marked as favorites
-    views_with_favorites = df_merged[df_merged['_merge'] == 'both'].shape[0]
-    total_views = df_views.shape[0]
-
-    # Calculate the proportion of views that became favorites
-    favorite_proportion = views_with_favorites / total_views if total_views > 0 else 0
+def analyze_favorites_from_views(df_interactions, df_favorites, results=None):
+    # 'view' interactions, how many of them were also marked as favorites and the proportion
+    views = _results(results, df_interactions, df_favorites=df_favorites)['views_to_favorites'].iloc[0]
+    total_views = int(views['views'])
+    views_with_favorites = int(views['views_with_favorites'])
+    favorite_proportion = views['proportion']
 
     # Print the results
     print(f"Total 'view' interactions: {total_views}")
@@ -165,11 +166,12 @@ def analyze_favorites_from_views(df_interactions, df_favorites):
     return favorite_proportion
 
 # Function: Violin plot of Ratings by Emotion with print of statistics
-def violin_ratings_by_emotion(df_ratings, df_interactions):
-    df_merged = pd.merge(df_ratings, df_interactions[['movie_id', 'emotion']], on='movie_id')
+def violin_ratings_by_emotion(df_ratings, df_interactions, results=None):
+    results = _results(results, df_interactions, df_ratings=df_ratings)
+    df_merged = results['rated_emotions']
 
     # Print the statistical summary
-    stats = df_merged.groupby('emotion')['rating'].describe()
+    stats = results['rating_stats_by_emotion']
     print("Rating Statistics by Emotion:\n", stats)
 
     # Violin plot
@@ -180,18 +182,9 @@ def violin_ratings_by_emotion(df_ratings, df_interactions):
     plt.show()
 
 # Function: Most recommended movies (shown)
-def most_recommended_movies(df_interactions, df_movies):
-    # Filter interactions where the movie was 'shown'
-    shown_interactions = df_interactions[df_interactions['interaction_type'] == 'shown']
-    
-    # Count how many times each movie_id has been shown
-    most_shown = shown_interactions['movie_id'].value_counts().head(10)
-    
-    # Reset index for the count dataframe, keeping 'movie_id' instead of 'index'
-    most_shown = most_shown.rename('count').reset_index().rename(columns={'index': 'movie_id'})
-    
-    # Merge the counts with the movie titles on 'movie_id'
-    most_shown_movies = pd.merge(most_shown, df_movies[['title']], left_on='movie_id', right_index=True)
+def most_recommended_movies(df_interactions, df_movies, results=None):
+    # The 10 movies 'shown' most often, with their titles
+    most_shown_movies = _results(results, df_interactions, df_movies=df_movies)['top_shown']
     
     # Print the result
     print("Top 10 Most Recommended Movies (shown):")
@@ -207,15 +200,11 @@ def most_recommended_movies(df_interactions, df_movies):
     plt.show()
 
 # Function: Favorite directors, years, and correlations
-def analyze_directors_years(df_interactions, df_movies):
-    # Merge interactions with movies data to get director and year information
-    df_merged = pd.merge(df_interactions, df_movies[['title', 'director', 'year']], left_on='movie_id', right_index=True, how='inner')
-
-    # Group by director and count the number of interactions for each director
-    director_counts = df_merged['director'].value_counts().head(10)
-    
-    # Group by year and count the number of interactions for each year
-    year_counts = df_merged['year'].value_counts().sort_index()
+def analyze_directors_years(df_interactions, df_movies, results=None):
+    # Number of interactions per director (top 10) and per year, from the per-movie totals
+    results = _results(results, df_interactions, df_movies=df_movies)
+    director_counts = results['directors'].set_index('director')['interactions']
+    year_counts = results['years'].set_index('year')['interactions']
 
     # Print top 10 favorite directors
     print("Top 10 Favorite Directors (by number of interactions):")
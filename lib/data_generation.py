@@ -1,7 +1,39 @@
 import random
+import numpy as np
 import pandas as pd
 import datetime
 import mysql.connector
+from catalog_index import build_emotion_index
+from bulk_loader import bulk_load
+
+# Define weights for the emotions (higher weight = more frequent)
+EMOTION_WEIGHTS = {
+    'Happy': 15,     # more frequent
+    'Excited': 12,   # more frequent
+    'Relaxed': 10,   
+    'Sweet': 9,      
+    'Inspired': 7,   
+    'Down': 6,       # less frequent
+    'Scared': 5      # less frequent
+}
+
+# Proportion: 1 out of 6 interactions will be 'view', the rest 'shown'
+VIEW_RATIO = 1 / 6
+
+# Share of interactions that come from active users
+ACTIVE_USER_RATIO = 0.7
+
+# Define stronger emotion-based rating weights
+EMOTION_RATING_WEIGHTS = {
+    'Happy': [1, 1, 1, 1, 1, 2, 3, 5, 7, 10],     # Much higher chance of high ratings
+    'Excited': [1, 1, 1, 2, 3, 3, 5, 6, 8, 10],
+    'Relaxed': [1, 2, 2, 3, 3, 4, 5, 6, 7, 9], 
+    'Sweet': [1, 1, 2, 2, 3, 4, 5, 6, 8, 10],
+    'Inspired': [1, 2, 2, 3, 3, 5, 6, 7, 8, 9],
+    'Down': [1, 2, 3, 3, 4, 5, 5, 6, 7, 7],     # Balanced, but slightly lower ratings
+    'Scared': [1, 1, 2, 3, 3, 4, 5, 6, 7, 7]    # Tendency towards mid to lower ratings
+}
+DEFAULT_RATING_WEIGHTS = [1, 1, 1, 2, 3, 3, 4, 5, 6, 7]
 
 # Step 1: Generate Users
 def generate_users(num_users):
@@ -13,38 +45,34 @@ def generate_users(num_users):
     return pd.DataFrame(users, columns=['user_id', 'username', 'password'])
 
 # Function to classify users as active and less active
-def classify_users(df_users):
-    active_users = df_users.sample(frac=0.2).user_id.tolist()  # 20% active users
+def classify_users(df_users, seed=None):
+    active_users = df_users.sample(frac=0.2, random_state=seed).user_id.tolist()  # 20% active users
     less_active_users = df_users[~df_users['user_id'].isin(active_users)].user_id.tolist()  # 80% less active users
     return active_users, less_active_users
 
 # Function to generate interactions with weighted emotion selection
-def generate_interactions(num_interactions, df_movies, df_users, active_users, less_active_users, emotions):
+def generate_interactions(num_interactions, df_movies, df_users, active_users, less_active_users, emotions, emotion_index=None):
     interactions = []
     interaction_history = {}
 
-    # Define weights for the emotions (higher weight = more frequent)
-    emotion_weights = {
-        'Happy': 15,     # more frequent
-        'Excited': 12,   # more frequent
-        'Relaxed': 10,   
-        'Sweet': 9,      
-        'Inspired': 7,   
-        'Down': 6,       # less frequent
-        'Scared': 5      # less frequent
-    }
+    # Weights for the emotions (higher weight = more frequent)
+    emotion_weights = EMOTION_WEIGHTS
 
     # Generate a list of emotions based on their weights
     weighted_emotions = list(emotion_weights.keys())
     weights = list(emotion_weights.values())
 
     # Proportion: 1 out of 6 interactions will be 'view', the rest 'shown'
-    view_ratio = 1 / 6
-    shown_ratio = 5 / 6
+    view_ratio = VIEW_RATIO
+    shown_ratio = 1 - VIEW_RATIO
+
+    # Build the emotion -> movies index once instead of scanning df_movies per interaction
+    if emotion_index is None:
+        emotion_index = build_emotion_index(df_movies, weighted_emotions)
 
     for _ in range(num_interactions):
         # Select either an active or less active user
-        if random.random() > 0.3:
+        if random.random() > 1 - ACTIVE_USER_RATIO:
             user_id = random.choice(active_users)
         else:
             user_id = random.choice(less_active_users)
@@ -52,13 +80,13 @@ def generate_interactions(num_interactions, df_movies, df_users, active_users, l
         # Select a weighted random emotion
         emotion = random.choices(weighted_emotions, weights=weights, k=1)[0]
 
-        # Filter movies based on the selected emotion
-        filtered_movies = df_movies[df_movies['emotions'].apply(lambda x: emotion in x)]
+        # Look up the movies matching the selected emotion
+        filtered_movie_ids = emotion_index.ids(emotion)
 
         # Continue only if there are movies matching the selected emotion
-        if not filtered_movies.empty:
+        if len(filtered_movie_ids) > 0:
             # Select a random movie
-            movie_id = filtered_movies.sample(1).index[0]
+            movie_id = filtered_movie_ids[random.randrange(len(filtered_movie_ids))]
 
             # Initialize interaction history for the user if it doesn't exist
             if user_id not in interaction_history:
@@ -115,16 +143,8 @@ def generate_favorites(df_interactions):
 def generate_ratings(df_favorites, df_interactions):
     ratings = []
 
-    # Define stronger emotion-based rating weights
-    emotion_rating_weights = {
-        'Happy': [1, 1, 1, 1, 1, 2, 3, 5, 7, 10],     # Much higher chance of high ratings
-        'Excited': [1, 1, 1, 2, 3, 3, 5, 6, 8, 10],
-        'Relaxed': [1, 2, 2, 3, 3, 4, 5, 6, 7, 9], 
-        'Sweet': [1, 1, 2, 2, 3, 4, 5, 6, 8, 10],
-        'Inspired': [1, 2, 2, 3, 3, 5, 6, 7, 8, 9],
-        'Down': [1, 2, 3, 3, 4, 5, 5, 6, 7, 7],     # Balanced, but slightly lower ratings
-        'Scared': [1, 1, 2, 3, 3, 4, 5, 6, 7, 7]    # Tendency towards mid to lower ratings
-    }
+    # Emotion-based rating weights
+    emotion_rating_weights = EMOTION_RATING_WEIGHTS
 
     # Select 50% of the favorite movies to be rated
     num_ratings = int(len(df_favorites) * 0.5)
@@ -144,64 +164,163 @@ def generate_ratings(df_favorites, df_interactions):
         date_rated = favorite_date + datetime.timedelta(days=days_after)
 
         # Use emotion-based weights to assign ratings
-        rating = random.choices(range(1, 11), weights=emotion_rating_weights.get(emotion, [1, 1, 1, 2, 3, 3, 4, 5, 6, 7]), k=1)[0]
+        rating = random.choices(range(1, 11), weights=emotion_rating_weights.get(emotion, DEFAULT_RATING_WEIGHTS), k=1)[0]
 
         ratings.append([user_id, movie_id, rating, date_rated])
 
     return pd.DataFrame(ratings, columns=['user_id', 'movie_id', 'rating', 'date'])
 
+# Vectorized generators.
+# Same distributions as the functions above, but every draw is made in NumPy blocks
+# with a seeded Generator, so millions of interactions take seconds instead of hours.
+
+# Function to generate interactions in vectorized blocks
+def generate_interactions_vectorized(num_interactions, df_movies, active_users, less_active_users, seed=None,
+                                     emotion_index=None, block_size=1_000_000):
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(datetime.datetime.now())
+
+    emotions = list(EMOTION_WEIGHTS.keys())
+    probabilities = np.array(list(EMOTION_WEIGHTS.values()), dtype=float)
+    probabilities /= probabilities.sum()
+
+    if emotion_index is None:
+        emotion_index = build_emotion_index(df_movies, emotions)
+    buckets = [emotion_index.ids(emotion) for emotion in emotions]
+
+    active_users = np.asarray(active_users)
+    less_active_users = np.asarray(less_active_users)
+
+    blocks = []
+    for block_start in range(0, num_interactions, block_size):
+        n = min(block_size, num_interactions - block_start)
+
+        # Select either an active or less active user
+        is_active = rng.random(n) > 1 - ACTIVE_USER_RATIO
+        user_ids = np.where(
+            is_active,
+            active_users[rng.integers(0, len(active_users), n)],
+            less_active_users[rng.integers(0, len(less_active_users), n)],
+        )
+
+        # Select a weighted random emotion, then a random movie with that emotion
+        emotion_codes = rng.choice(len(emotions), size=n, p=probabilities)
+        movie_ids = np.full(n, -1, dtype=np.int64)
+        for code, bucket in enumerate(buckets):
+            mask = emotion_codes == code
+            if len(bucket) > 0:
+                movie_ids[mask] = bucket[rng.integers(0, len(bucket), mask.sum())]
+
+        is_view = rng.random(n) < VIEW_RATIO
+        days_ago = rng.integers(0, 366, n)
+        blocks.append((user_ids, movie_ids, emotion_codes, is_view, days_ago))
+
+    user_ids, movie_ids, emotion_codes, is_view, days_ago = (np.concatenate(columns) for columns in zip(*blocks))
+
+    # Skip draws for emotions without movies, then keep only the first interaction
+    # of every (user, movie) pair, in draw order
+    valid = np.flatnonzero(movie_ids >= 0)
+    keys = user_ids[valid].astype(np.int64) * (int(movie_ids.max()) + 1) + movie_ids[valid]
+    _, first = np.unique(keys, return_index=True)
+    keep = valid[np.sort(first)]
+
+    return pd.DataFrame({
+        'user_id': user_ids[keep],
+        'movie_id': movie_ids[keep],
+        'emotion': pd.Categorical.from_codes(emotion_codes[keep], categories=emotions),
+        'interaction_type': np.where(is_view[keep], 'view', 'shown'),
+        'date': now - pd.to_timedelta(days_ago[keep], unit='D'),
+    })
+
+# Function to draw a date between each date and now (inclusive, in whole days)
+def _random_dates_after(rng, dates, now):
+    days_available = (now - dates).dt.days.to_numpy()
+    return dates + pd.to_timedelta(rng.integers(0, days_available + 1), unit='D')
+
+# Function to generate favorites from 30% of the 'view' interactions (vectorized)
+def generate_favorites_vectorized(df_interactions, seed=None):
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(datetime.datetime.now())
+
+    viewed_interactions = df_interactions[df_interactions['interaction_type'] == 'view']
+    num_favorites = int(len(viewed_interactions) * 0.3)
+    selected = viewed_interactions.iloc[rng.choice(len(viewed_interactions), num_favorites, replace=False)]
+
+    view_dates = pd.to_datetime(selected['date']).reset_index(drop=True)
+    return pd.DataFrame({
+        'user_id': selected['user_id'].to_numpy(),
+        'movie_id': selected['movie_id'].to_numpy(),
+        'date_added': _random_dates_after(rng, view_dates, now),
+    })
+
+# Function to generate ratings for 50% of the favorites (vectorized).
+# Like generate_ratings, the emotion of a movie is the one of its first interaction.
+def generate_ratings_vectorized(df_favorites, df_interactions, seed=None):
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(datetime.datetime.now())
+
+    num_ratings = int(len(df_favorites) * 0.5)
+    selected = df_favorites.iloc[rng.choice(len(df_favorites), num_ratings, replace=False)]
+
+    # Join the emotion of each movie in one merge
+    movie_emotions = df_interactions.drop_duplicates('movie_id')[['movie_id', 'emotion']]
+    selected = selected.merge(movie_emotions, on='movie_id', how='left')
+    emotions = selected['emotion'].astype(object).to_numpy()
+
+    ratings = np.empty(len(selected), dtype=np.int64)
+    assigned = np.zeros(len(selected), dtype=bool)
+    for emotion, weights in EMOTION_RATING_WEIGHTS.items():
+        mask = emotions == emotion
+        ratings[mask] = rng.choice(np.arange(1, 11), size=mask.sum(), p=np.array(weights) / sum(weights))
+        assigned |= mask
+    # Movies without a known emotion use the default weights
+    ratings[~assigned] = rng.choice(np.arange(1, 11), size=(~assigned).sum(), p=np.array(DEFAULT_RATING_WEIGHTS) / sum(DEFAULT_RATING_WEIGHTS))
+
+    return pd.DataFrame({
+        'user_id': selected['user_id'].to_numpy(),
+        'movie_id': selected['movie_id'].to_numpy(),
+        'rating': ratings,
+        'date': _random_dates_after(rng, pd.to_datetime(selected['date_added']), now),
+    })
+
+# Function to scale the movie catalog to num_movies rows (e.g. for benchmarks):
+# existing movies are resampled with jittered duration/rating and new row positions
+def generate_movies(df_movies, num_movies, seed=None):
+    rng = np.random.default_rng(seed)
+    df = df_movies.iloc[rng.integers(0, len(df_movies), num_movies)].reset_index(drop=True)
+    df['duration'] = np.clip(df['duration'].to_numpy() + rng.integers(-10, 11, num_movies), 1, None)
+    df['rating'] = np.clip(np.round(df['rating'].to_numpy() + rng.normal(0, 0.3, num_movies), 1), 1, 10)
+    if 'movie_id' in df.columns:
+        df['movie_id'] = np.arange(num_movies)
+    return df
+
 # Function to ensure that df_movies has a 'movie_id' column
 def add_movie_id(df_movies):
     df_movies['movie_id'] = df_movies.index + 1  # Add 1 to ensure index starts from 1
     return df_movies
 
-# Function to insert data into MySQL
-def insert_users(df_users, conn, cursor):
-    for _, row in df_users.iterrows():
-        query = """
-        INSERT INTO users (user_id, username, password) 
-        VALUES (%s, %s, %s)
-        """
-        values = (row['user_id'], row['username'], row['password'])
-        cursor.execute(query, values)
-    conn.commit()
-
-def insert_interactions(df_interactions, conn, cursor):
-    for _, row in df_interactions.iterrows():
-        query = """
-        INSERT INTO interactions (user_id, movie_id, emotion, interaction_type, date) 
-        VALUES (%s, %s, %s, %s, %s)
-        """
-        values = (row['user_id'], row['movie_id'], row['emotion'], row['interaction_type'], row['date'])
-        cursor.execute(query, values)
-    conn.commit()
-
-def insert_favorites(df_favorites, conn, cursor):
-    for _, row in df_favorites.iterrows():
-        query = """
-        INSERT INTO favorites (user_id, movie_id, date_added) 
-        VALUES (%s, %s, %s)
-        """
-        values = (row['user_id'], row['movie_id'], row['date_added'])
-        cursor.execute(query, values)
-    conn.commit()
-
-def insert_ratings(df_ratings, conn, cursor):
-    for _, row in df_ratings.iterrows():
-        query = """
-        INSERT INTO ratings (user_id, movie_id, rating, date) 
-        VALUES (%s, %s, %s, %s)
-        """
-        values = (row['user_id'], row['movie_id'], row['rating'], row['date'])
-        cursor.execute(query, values)
-    conn.commit()
+# Functions to insert data into MySQL.
+# Rows are sent in chunks by the bulk loader (see bulk_loader.bulk_load for the
+# options: chunk_size, method, disable_indexes, checkpoint_path).
+def insert_users(df_users, conn, cursor, **load_options):
+    return bulk_load(df_users, 'users', ['user_id', 'username', 'password'], conn, cursor, **load_options)
+
+def insert_interactions(df_interactions, conn, cursor, **load_options):
+    return bulk_load(df_interactions, 'interactions', ['user_id', 'movie_id', 'emotion', 'interaction_type', 'date'], conn, cursor, **load_options)
+
+def insert_favorites(df_favorites, conn, cursor, **load_options):
+    return bulk_load(df_favorites, 'favorites', ['user_id', 'movie_id', 'date_added'], conn, cursor, **load_options)
+
+def insert_ratings(df_ratings, conn, cursor, **load_options):
+    return bulk_load(df_ratings, 'ratings', ['user_id', 'movie_id', 'rating', 'date'], conn, cursor, **load_options)
 
 # Function to connect to MySQL
-def connect_to_mysql():
+def connect_to_mysql(allow_local_infile=False):
     conn = mysql.connector.connect(
         host="localhost",
         user="root",
         password="123456",
-        database="movie_recommendations"
+        database="movie_recommendations",
+        allow_local_infile=allow_local_infile  # Needed for bulk loads with method='infile'
     )
     return conn, conn.cursor()
\ No newline at end of file
@@ -0,0 +1,220 @@
+import itertools
+import queue
+import sqlite3
+import time
+from contextlib import contextmanager
+
+_memory_db_ids = itertools.count()
+
+# Connection pool with checkout/return.
+# connect is a zero-argument callable returning a new DB-API connection;
+# validate(conn) returns False for connections that were dropped by the server.
+class ConnectionPool:
+    def __init__(self, connect, size=5, validate=None, timeout=30.0):
+        self._connect = connect
+        self._validate = validate
+        self._timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        # Each slot is either an idle connection or None (not opened yet)
+        for _ in range(size):
+            self._idle.put(None)
+        self.size = size
+
+    # Take a connection from the pool, opening or replacing it if needed
+    def checkout(self):
+        try:
+            conn = self._idle.get(timeout=self._timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection available after {self._timeout}s (pool size {self.size})")
+
+        try:
+            if conn is not None and self._validate is not None and not self._validate(conn):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            # Give the slot back so a failing connect doesn't shrink the pool
+            self._idle.put(None)
+            raise
+        return conn
+
+    # Return a connection to the pool (discard it if it is broken)
+    def release(self, conn, discard=False):
+        if discard:
+            self._close(conn)
+            conn = None
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.checkout()
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # Close every idle connection
+    def close(self):
+        for _ in range(self.size):
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if conn is not None:
+                self._close(conn)
+            self._idle.put(None)
+
+# Thread-safe data access on top of a ConnectionPool.
+# Queries are written with %s placeholders (MySQL style) and translated for
+# SQLite, so the same code runs against RDS and a local stand-in.
+# on_query(query, seconds) is called after every statement (e.g. metrics.observe_query).
+class Database:
+    def __init__(self, pool, paramstyle='format', retry_errors=(), retries=2, retry_delay=0.1, on_query=None):
+        self.pool = pool
+        self.paramstyle = paramstyle
+        self.retry_errors = tuple(retry_errors)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.on_query = on_query
+
+    @property
+    def dialect(self):
+        return 'sqlite' if self.paramstyle == 'qmark' else 'mysql'
+
+    def _sql(self, query):
+        return query.replace('%s', '?') if self.paramstyle == 'qmark' else query
+
+    # Transaction scoped to one logical operation: commit on success, rollback on error
+    @contextmanager
+    def transaction(self):
+        with self.pool.connection() as conn:
+            cursor = _Cursor(conn.cursor(), self._sql, self.on_query)
+            try:
+                yield cursor
+                conn.commit()
+            except Exception:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                raise
+            finally:
+                cursor.close()
+
+    # Run fn(cursor) in a transaction, retrying on dropped connections
+    def run(self, fn):
+        for attempt in range(self.retries + 1):
+            try:
+                with self.transaction() as cursor:
+                    return fn(cursor)
+            except self.retry_errors:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.retry_delay * (attempt + 1))
+
+    # Execute a single statement and return the cursor's lastrowid
+    def execute(self, query, params=()):
+        def op(cursor):
+            cursor.execute(query, params)
+            return cursor.lastrowid
+        return self.run(op)
+
+    # Execute a statement for many parameter rows and return the row count
+    def executemany(self, query, rows):
+        def op(cursor):
+            cursor.executemany(query, rows)
+            return cursor.rowcount
+        return self.run(op)
+
+    def fetchone(self, query, params=()):
+        def op(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchone()
+        return self.run(op)
+
+    def fetchall(self, query, params=()):
+        def op(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        return self.run(op)
+
+    def close(self):
+        self.pool.close()
+
+# Per-call cursor that translates the placeholders of every statement
+# (and reports its duration to on_query, if set)
+class _Cursor:
+    def __init__(self, cursor, translate, on_query=None):
+        self._cursor = cursor
+        self._translate = translate
+        self._on_query = on_query
+
+    def _timed(self, method, query, args):
+        if self._on_query is None:
+            return method(self._translate(query), args)
+        start = time.perf_counter()
+        try:
+            return method(self._translate(query), args)
+        finally:
+            self._on_query(query, time.perf_counter() - start)
+
+    def execute(self, query, params=()):
+        return self._timed(self._cursor.execute, query, params)
+
+    def executemany(self, query, rows):
+        return self._timed(self._cursor.executemany, query, rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+# Function to create a pooled MySQL database
+def connect_mysql(host, user, password, database, port=3306, pool_size=5, **kwargs):
+    import mysql.connector
+
+    def connect():
+        return mysql.connector.connect(
+            host=host,
+            user=user,
+            password=password,
+            database=database,
+            port=int(port),
+            **kwargs
+        )
+
+    def validate(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    pool = ConnectionPool(connect, size=pool_size, validate=validate)
+    retry_errors = (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError)
+    return Database(pool, paramstyle='format', retry_errors=retry_errors)
+
+# Function to create a pooled SQLite database (local stand-in for tests and benchmarks)
+def connect_sqlite(path=':memory:', pool_size=5):
+    if path == ':memory:':
+        # Every connection must see the same in-memory database. Shared-cache tables
+        # lock instead of waiting, so in-memory databases use a single connection.
+        path = f'file:feelms_{next(_memory_db_ids)}?mode=memory&cache=shared'
+        pool_size = 1
+
+    def connect():
+        return sqlite3.connect(path, uri=path.startswith('file:'), check_same_thread=False, timeout=30)
+
+    pool = ConnectionPool(connect, size=pool_size)
+    # Keep one connection open so a shared in-memory database isn't dropped between calls
+    pool.keepalive = connect()
+    return Database(pool, paramstyle='qmark')
@@ -0,0 +1,155 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Write-behind queue: the request path appends rows to an in-memory buffer and a
+# background worker writes them with flush_fn(rows) in batches, when batch_size
+# rows are waiting or flush_interval seconds have passed. The buffer is bounded:
+# put() waits up to put_timeout for space and then drops the row (counted in metrics).
+# Rows still queued can be changed in place with update_queued().
+class WriteBehindQueue:
+    def __init__(self, flush_fn, batch_size=100, flush_interval=1.0, max_size=10000, put_timeout=0.05, name='write-behind'):
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.put_timeout = put_timeout
+        self.name = name
+
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._metrics = {
+            'enqueued': 0,
+            'flushed': 0,
+            'dropped': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'blocked_puts': 0,
+            'blocked_seconds': 0.0,
+            'max_depth': 0,
+            'last_flush_seconds': None,
+            'last_error': None,
+        }
+
+        self._worker = threading.Thread(target=self._run, daemon=True, name=name)
+        self._worker.start()
+        # Guarantee a final flush when the process exits
+        atexit.register(self.close)
+
+    # Hand a row to the queue. Returns False if it had to be dropped.
+    def put(self, row):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Queue is closed")
+
+            if len(self._buffer) >= self.max_size:
+                # Backpressure: wait a little for the worker to make room
+                self._metrics['blocked_puts'] += 1
+                start = time.perf_counter()
+                self._cond.wait_for(lambda: len(self._buffer) < self.max_size, timeout=self.put_timeout)
+                self._metrics['blocked_seconds'] += time.perf_counter() - start
+                if len(self._buffer) >= self.max_size:
+                    self._metrics['dropped'] += 1
+                    return False
+
+            self._buffer.append(row)
+            self._metrics['enqueued'] += 1
+            self._metrics['max_depth'] = max(self._metrics['max_depth'], len(self._buffer))
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    # Replace the queued rows for which match(row) is true with update(row).
+    # Returns the number of rows changed. Waits for a batch being written, which may hold a matching row.
+    def update_queued(self, match, update):
+        with self._flush_lock, self._cond:
+            changed = 0
+            rows = deque()
+            for row in self._buffer:
+                if match(row):
+                    row = update(row)
+                    changed += 1
+                rows.append(row)
+            self._buffer = rows
+        return changed
+
+    # Write everything queued so far (synchronously, in the calling thread).
+    # Returns False if a batch failed and was put back in the queue.
+    def flush(self):
+        while True:
+            result = self._flush_batch()
+            if result is not True:
+                return result is not None
+
+    def _take_batch(self):
+        with self._cond:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            # Wake up producers waiting for space
+            self._cond.notify_all()
+        return batch
+
+    def _flush_batch(self):
+        with self._flush_lock:
+            batch = self._take_batch()
+            if not batch:
+                return False
+
+            start = time.perf_counter()
+            try:
+                self.flush_fn(batch)
+            except Exception as error:
+                # Put the rows back (in order) so the next flush retries them. Rows queued
+                # meanwhile may have filled the buffer: the oldest rows that don't fit are dropped.
+                with self._cond:
+                    room = max(self.max_size - len(self._buffer), 0)
+                    dropped = len(batch) - min(room, len(batch))
+                    self._buffer.extendleft(reversed(batch[dropped:]))
+                    self._metrics['failed_batches'] += 1
+                    self._metrics['dropped'] += dropped
+                    self._metrics['last_error'] = repr(error)
+                if dropped:
+                    logger.warning("%s: dropped %d rows of a failed batch, the queue is full (%r)", self.name, dropped, error)
+                return None
+
+            with self._cond:
+                self._metrics['flushed'] += len(batch)
+                self._metrics['batches'] += 1
+                self._metrics['last_flush_seconds'] = time.perf_counter() - start
+            return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._buffer) >= self.batch_size, timeout=self.flush_interval)
+                if self._closed:
+                    return
+            if not self.flush():
+                # Don't hammer a failing database: wait before retrying
+                time.sleep(self.flush_interval)
+
+    # Stop the worker and flush the remaining rows
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+        if not self.flush():
+            with self._cond:
+                dropped = len(self._buffer)
+                self._buffer.clear()
+                self._metrics['dropped'] += dropped
+                error = self._metrics['last_error']
+            logger.error("%s: dropped %d rows that could not be written at close (%s)", self.name, dropped, error)
+
+    # Queue depth and throughput counters, for monitoring
+    def metrics(self):
+        with self._cond:
+            return dict(self._metrics, depth=len(self._buffer), max_size=self.max_size)
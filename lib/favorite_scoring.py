@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+# Favorite predictions for the whole catalog.
+# The RandomForest only uses movie features (duration, rating), so the favorite
+# probability of every movie is computed once per model version with one batched
+# predict_proba call and served as an array lookup indexed by movie_id.
+
+# Catalog columns the served RandomForest is trained on
+MOVIE_FEATURES = ('duration', 'rating')
+
+class FavoriteScorer:
+    def __init__(self, model, probabilities, feature_columns=MOVIE_FEATURES):
+        self.model = model
+        self.feature_columns = list(feature_columns)
+        # probabilities[movie_id] = P(favorite), NaN for ids that are not in the catalog
+        self.probabilities = probabilities
+
+    # Build the lookup table from a fitted classifier and the movie catalog
+    @classmethod
+    def from_model(cls, model, df_movies, feature_columns=MOVIE_FEATURES, movie_id_column='movie_id'):
+        scorer = cls(model, None, feature_columns)
+        movie_ids = df_movies[movie_id_column].to_numpy()
+
+        probabilities = np.full(int(movie_ids.max()) + 1 if len(movie_ids) else 0, np.nan)
+        probabilities[movie_ids] = scorer.predict_proba(df_movies[scorer.feature_columns])
+        scorer.probabilities = probabilities
+        return scorer
+
+    # Batched P(favorite) for a feature matrix (one forest evaluation for all rows)
+    def predict_proba(self, features):
+        if not isinstance(features, pd.DataFrame):
+            features = pd.DataFrame(np.asarray(features, dtype=float).reshape(-1, len(self.feature_columns)), columns=self.feature_columns)
+        positive = list(self.model.classes_).index(True)
+        return self.model.predict_proba(features)[:, positive]
+
+    # Batched favorite predictions for a feature matrix (same decision as model.predict)
+    def predict(self, features):
+        return self.predict_proba(features) > 0.5
+
+    # P(favorite) of catalog movies
+    def probability(self, movie_ids):
+        return self.probabilities[np.asarray(movie_ids)]
+
+    # Favorite prediction of catalog movies
+    def is_favorite(self, movie_ids):
+        return self.probability(movie_ids) > 0.5
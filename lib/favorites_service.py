@@ -0,0 +1,74 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+import repository
+
+# Favorites page of a user: the favorites and their ratings come from one joined query,
+# movie rows are resolved through a positional index of the catalog (no per-favorite
+# lookups) and the grid is served page by page.
+# Results are cached per user (least-recently-used beyond max_users, expiring after ttl
+# seconds) and dropped with invalidate() whenever the user writes a favorite or a rating.
+
+# Function to build the movie_id -> row position index of a catalog frame (indexed by movie_id)
+def movie_row_index(df_movies):
+    return pd.Index(df_movies.index)
+
+class FavoritesService:
+    def __init__(self, db, max_users=10000, ttl=300):
+        self.db = db
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    # (movie_id, rating or None) of every favorite of a user, oldest first
+    def favorites(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] >= time.monotonic():
+                self._entries.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+
+        # One row per favorite; a pair rated more than once keeps its last non-empty rating
+        ratings = {}
+        for movie_id, rating in repository.get_favorites_with_ratings(self.db, user_id):
+            if movie_id not in ratings or rating is not None:
+                ratings[movie_id] = rating
+        favorites = list(ratings.items())
+
+        with self._lock:
+            self._entries[user_id] = (favorites, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+        return favorites
+
+    def count(self, user_id):
+        return len(self.favorites(user_id))
+
+    def num_pages(self, user_id, page_size=12):
+        return max(1, math.ceil(self.count(user_id) / page_size))
+
+    # Movies of one page of the grid (page starts at 0) and the (movie_id, rating) of each one.
+    # Favorites that are no longer in the catalog are skipped.
+    def page(self, user_id, df_movies, row_index, page=0, page_size=12):
+        favorites = self.favorites(user_id)[page * page_size:(page + 1) * page_size]
+        rows = row_index.get_indexer([movie_id for movie_id, _ in favorites])
+        found = rows >= 0
+        return df_movies.iloc[rows[found]], [favorite for favorite, keep in zip(favorites, found) if keep]
+
+    # Drop the cached favorites of a user (after a favorite or rating write)
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, users=len(self._entries))
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from catalog_store import encode_lists
+
+# Feature matrix for the favorite classifier (one row per user-movie interaction):
+#   - numeric: duration, movie_rating (the movie's IMDb rating; the user's own rating is
+#     left out: only favorites can be rated, so it gives the target away)
+#   - user aggregates: interactions, views, favorite rate, mean rating
+#   - movie aggregates: interactions, views, favorite rate, mean rating
+#   - multi-hot genres and emotions of the movie
+# Aggregates come from the InteractionStore. The favorite rate and mean rating leave
+# out the row's own favorite/rating, so the target doesn't leak into its features.
+# The matrix is sparse (CSR) and cached on disk by a hash of the inputs.
+
+NUMERIC_FEATURES = ['duration', 'movie_rating']
+AGGREGATE_FEATURES = ['interactions', 'views', 'favorite_rate', 'mean_rating']
+
+# Function to multi-hot encode a column of lists (or stringified lists) as a CSR matrix
+def multi_hot(values, prefix=''):
+    offsets, codes, vocab = encode_lists(values)
+    matrix = sp.csr_matrix((np.ones(len(codes), dtype=np.float32), codes.astype(np.int32), offsets), shape=(len(offsets) - 1, len(vocab)))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix, [f'{prefix}{item}' for item in vocab]
+
+# Function to encode the genres and emotions of every movie (rows follow df_movies)
+def movie_features(df_movies, columns=('genre', 'emotions')):
+    matrices, names = [], []
+    for column in columns:
+        matrix, column_names = multi_hot(df_movies[column], prefix=f'{column}=')
+        matrices.append(matrix)
+        names += column_names
+    return sp.hstack(matrices, format='csr'), names
+
+# Function to compute per-user and per-movie totals from the interaction store.
+# Returns {'user': {...}, 'movie': {...}} with arrays aligned with store.users / store.movies.
+def interaction_totals(store):
+    totals = {}
+    for axis, name in ((1, 'user'), (0, 'movie')):
+        def total(channel, values=False):
+            matrix = store.csr(channel)
+            return np.asarray(matrix.sum(axis=axis) if values else (matrix != 0).sum(axis=axis)).ravel().astype(float)
+
+        totals[name] = {
+            'interactions': total('shown', values=True) + total('view', values=True),
+            'views': total('view', values=True),
+            'favorites': total('favorite'),
+            'ratings': total('rating'),
+            'rating_sum': total('rating', values=True),
+        }
+    return totals
+
+# Aggregate features of every row for one side (user or movie), leaving out the row's own target
+def _aggregates(totals, positions, is_favorite, own_rating, global_mean_rating):
+    known = positions >= 0
+    safe = np.where(known, positions, 0)
+
+    def gather(name):
+        return np.where(known, totals[name][safe], 0.0)
+
+    interactions = gather('interactions')
+    favorites = gather('favorites') - is_favorite
+    has_rating = ~np.isnan(own_rating)
+    ratings = gather('ratings') - has_rating
+    rating_sum = gather('rating_sum') - np.where(has_rating, own_rating, 0.0)
+
+    favorite_rate = np.clip(favorites, 0, None) / np.maximum(interactions - 1, 1)
+    mean_rating = np.where(ratings > 0, rating_sum / np.maximum(ratings, 1), global_mean_rating)
+    return np.column_stack([interactions, gather('views'), favorite_rate, mean_rating])
+
+# Function to hash the inputs of the feature matrix (cache key)
+def feature_hash(df_user_movie, df_movies, store):
+    digest = hashlib.sha256()
+    columns = ['user_id', 'movie_id', 'duration', 'rating', 'is_favorite']
+    digest.update(pd.util.hash_pandas_object(df_user_movie[columns], index=False).to_numpy().tobytes())
+    movie_columns = ['genre', 'emotions', 'movie_rating' if 'movie_rating' in df_movies.columns else 'rating']
+    digest.update(json.dumps(NUMERIC_FEATURES).encode())
+    digest.update(pd.util.hash_pandas_object(df_movies[movie_columns].astype(str)).to_numpy().tobytes())
+    for channel in ('shown', 'view', 'favorite', 'rating'):
+        matrix = store.csr(channel)
+        for array in (matrix.indptr, matrix.indices, matrix.data):
+            digest.update(np.ascontiguousarray(array).tobytes())
+    digest.update(np.ascontiguousarray(store.users.ids).tobytes())
+    digest.update(np.ascontiguousarray(store.movies.ids).tobytes())
+    return digest.hexdigest()
+
+# Function to build the feature matrix (X, y, feature names) of the interaction rows.
+# df_user_movie is the output of ml.preprocess_data (or streaming_preprocess.load_shards),
+# df_movies is indexed by movie_id (IMDb rating as movie_rating, or rating as in the catalog).
+def build_features(df_user_movie, df_movies, store):
+    user_ids = df_user_movie['user_id'].to_numpy()
+    movie_ids = df_user_movie['movie_id'].to_numpy()
+    is_favorite = df_user_movie['is_favorite'].to_numpy(dtype=float)
+    own_rating = df_user_movie['rating'].to_numpy(dtype=float)
+
+    totals = interaction_totals(store)
+    rating_count = totals['user']['ratings'].sum()
+    global_mean_rating = totals['user']['rating_sum'].sum() / rating_count if rating_count else 0.0
+
+    movie_rows = pd.Index(df_movies.index).get_indexer(movie_ids)
+    if (movie_rows < 0).any():
+        raise ValueError("df_user_movie has movie ids that are not in df_movies")
+    movie_rating = df_movies['movie_rating' if 'movie_rating' in df_movies.columns else 'rating'].to_numpy(dtype=float)[movie_rows]
+
+    # The own rating is only used to leave the row out of the aggregates
+    numeric = np.column_stack([
+        df_user_movie['duration'].to_numpy(dtype=float),
+        np.nan_to_num(movie_rating, nan=0.0),
+        _aggregates(totals['user'], store.users.encode(user_ids), is_favorite, own_rating, global_mean_rating),
+        _aggregates(totals['movie'], store.movies.encode(movie_ids), is_favorite, own_rating, global_mean_rating),
+    ])
+
+    # Genres and emotions: encoded once per movie, then gathered per row
+    movie_matrix, movie_names = movie_features(df_movies)
+
+    X = sp.hstack([sp.csr_matrix(numeric.astype(np.float32)), movie_matrix[movie_rows]], format='csr')
+    names = NUMERIC_FEATURES + [f'user_{name}' for name in AGGREGATE_FEATURES] + [f'movie_{name}' for name in AGGREGATE_FEATURES] + movie_names
+    return X, df_user_movie['is_favorite'].to_numpy(dtype=bool), names
+
+# Function to build the feature matrix, or load it from cache_dir if the inputs haven't changed
+def load_or_build_features(df_user_movie, df_movies, store, cache_dir='model/features'):
+    key = feature_hash(df_user_movie, df_movies, store)[:16]
+    matrix_path = os.path.join(cache_dir, f'{key}.npz')
+    meta_path = os.path.join(cache_dir, f'{key}.json')
+    if os.path.exists(matrix_path) and os.path.exists(meta_path):
+        with open(meta_path) as file:
+            meta = json.load(file)
+        with np.load(os.path.join(cache_dir, f'{key}.target.npz')) as data:
+            y = data['y']
+        return sp.load_npz(matrix_path), y, meta['feature_names']
+
+    X, y, names = build_features(df_user_movie, df_movies, store)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Metadata last: an entry without it is incomplete and gets rebuilt
+    np.savez(os.path.join(cache_dir, f'{key}.target.npz'), y=y)
+    sp.save_npz(matrix_path, X)
+    tmp_path = f'{meta_path}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump({'feature_names': names, 'shape': list(X.shape)}, file)
+    os.replace(tmp_path, meta_path)
+    return X, y, names
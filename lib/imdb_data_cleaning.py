@@ -1,5 +1,6 @@
 # data_cleaning.py
 import pandas as pd
+from catalog_store import write_catalog
 
 # Function to clean the dataframe
 def clean_movie_data(file_path):
@@ -54,6 +55,10 @@ def map_genres_to_emotions(df, genre_to_emotion):
     df['emotions'] = df['genre'].apply(map_genres)
     return df
 
+# Function to write the cleaned movies as the typed, columnar catalog loaded by the app
+def build_movie_catalog(df, out_dir):
+    return write_catalog(df, out_dir)
+
 # Function to extract unique emotions
 def extract_unique_emotions(df):
     return set([emotion for emotion_list in df['emotions'] for emotion in emotion_list])
\ No newline at end of file
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# Sparse user x movie interaction store, one matrix per channel:
+#   shown, view  -> number of events (duplicates are summed)
+#   favorite     -> 1 if the movie is a favorite
+#   rating       -> last rating given
+# Users and movies are mapped to compact integer indices (rows/columns). Rows are
+# sliced from the CSR matrix, columns from the CSC copy. New events are appended to a
+# buffer and merged into the matrices by compact() (called on read).
+#
+# Stored as a directory with a manifest.json and .npy arrays, like the movie catalog.
+
+STORE_VERSION = 1
+
+# How duplicated (user, movie) entries of a channel are combined
+CHANNELS = {
+    'shown': 'sum',
+    'view': 'sum',
+    'favorite': 'last',
+    'rating': 'last',
+}
+
+# Raw id <-> compact index mapping that can grow
+class IdMap:
+    def __init__(self, ids=()):
+        self.index = pd.Index(np.asarray(ids, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def ids(self):
+        return self.index.to_numpy()
+
+    # Compact indices of raw ids (-1 for unknown ids unless add=True)
+    def encode(self, ids, add=False):
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = self.index.get_indexer(ids)
+        if add and (positions < 0).any():
+            new_ids = pd.unique(ids[positions < 0])
+            self.index = self.index.append(pd.Index(new_ids))
+            positions = self.index.get_indexer(ids)
+        return positions
+
+    def decode(self, positions):
+        return self.ids[np.asarray(positions)]
+
+class InteractionStore:
+    def __init__(self, user_ids=(), movie_ids=(), matrices=None):
+        self.users = IdMap(user_ids)
+        self.movies = IdMap(movie_ids)
+        self._matrices = {}
+        self._csc = {}
+        self._pending = {channel: [] for channel in CHANNELS}
+        self._lock = threading.RLock()
+        for channel in CHANNELS:
+            matrix = (matrices or {}).get(channel)
+            self._matrices[channel] = sp.csr_matrix(matrix) if matrix is not None else sp.csr_matrix(self.shape, dtype=np.float32)
+
+    @property
+    def shape(self):
+        return len(self.users), len(self.movies)
+
+    # Buffer new events of a channel (values default to 1, e.g. one "shown" event).
+    # A value of 0 removes a favorite or a rating.
+    def append(self, channel, user_ids, movie_ids, values=None):
+        if channel not in CHANNELS:
+            raise ValueError(f"Unknown channel '{channel}' (expected one of {list(CHANNELS)})")
+        with self._lock:
+            rows = self.users.encode(user_ids, add=True)
+            cols = self.movies.encode(movie_ids, add=True)
+            values = np.ones(len(rows), dtype=np.float32) if values is None else np.asarray(values, dtype=np.float32)
+            self._pending[channel].append((rows, cols, values))
+
+    # Merge the buffered events into the matrices
+    def compact(self):
+        with self._lock:
+            shape = self.shape
+            for channel, how in CHANNELS.items():
+                matrix = self._matrices[channel]
+                if matrix.shape != shape:
+                    matrix = self._resize(matrix, shape)
+                if self._pending[channel]:
+                    matrix = self._merge(matrix, self._pending[channel], how, shape)
+                    self._pending[channel] = []
+                    self._csc.pop(channel, None)
+                elif matrix is not self._matrices[channel]:
+                    self._csc.pop(channel, None)
+                self._matrices[channel] = matrix
+
+    @staticmethod
+    def _resize(matrix, shape):
+        matrix = matrix.tocsr(copy=True)
+        matrix.resize(shape)
+        return matrix
+
+    @staticmethod
+    def _merge(matrix, pending, how, shape):
+        existing = matrix.tocoo()
+        rows = np.concatenate([existing.row] + [batch[0] for batch in pending])
+        cols = np.concatenate([existing.col] + [batch[1] for batch in pending])
+        values = np.concatenate([existing.data.astype(np.float32)] + [batch[2] for batch in pending])
+
+        if how == 'last':
+            # Keep the last value of every (row, col): the first one in reverse order
+            keys = rows.astype(np.int64) * shape[1] + cols
+            _, last = np.unique(keys[::-1], return_index=True)
+            keep = len(keys) - 1 - last
+            rows, cols, values = rows[keep], cols[keep], values[keep]
+
+        merged = sp.csr_matrix((values, (rows, cols)), shape=shape, dtype=np.float32)
+        merged.sum_duplicates()
+        merged.eliminate_zeros()
+        return merged
+
+    # CSR matrix of a channel (rows = users)
+    def csr(self, channel):
+        self.compact()
+        return self._matrices[channel]
+
+    # CSC matrix of a channel (columns = movies), built on first use
+    def csc(self, channel):
+        self.compact()
+        with self._lock:
+            if channel not in self._csc:
+                self._csc[channel] = self._matrices[channel].tocsc()
+            return self._csc[channel]
+
+    # (movie_ids, values) of a user in a channel
+    def user_row(self, channel, user_id):
+        row = self.users.encode([user_id])[0]
+        if row < 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        matrix = self.csr(channel)
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        return self.movies.decode(matrix.indices[start:end]), matrix.data[start:end]
+
+    # (user_ids, values) of a movie in a channel
+    def movie_column(self, channel, movie_id):
+        col = self.movies.encode([movie_id])[0]
+        if col < 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        matrix = self.csc(channel)
+        start, end = matrix.indptr[col], matrix.indptr[col + 1]
+        return self.users.decode(matrix.indices[start:end]), matrix.data[start:end]
+
+    # Movie ids a user has in any of the channels (e.g. to exclude them from recommendations)
+    def user_items(self, user_id, channels=('favorite',)):
+        items = [self.user_row(channel, user_id)[0] for channel in channels]
+        return np.unique(np.concatenate(items)) if items else np.empty(0, dtype=np.int64)
+
+    # Number of entries per user (axis=1) or per movie (axis=0) of a channel, by raw id
+    def counts(self, channel, axis=1):
+        matrix = self.csr(channel)
+        counts = np.diff(matrix.indptr) if axis == 1 else np.bincount(matrix.indices, minlength=matrix.shape[1])
+        ids = self.users.ids if axis == 1 else self.movies.ids
+        return pd.Series(counts, index=ids, name=f'{channel}_count')
+
+    # Channel as a long DataFrame (user_id, movie_id, <channel>), e.g. the ratings to train the SVD model
+    def to_frame(self, channel):
+        coo = self.csr(channel).tocoo()
+        return pd.DataFrame({
+            'user_id': self.users.decode(coo.row),
+            'movie_id': self.movies.decode(coo.col),
+            channel: coo.data,
+        })
+
+    # Write the store as a directory of .npy arrays plus a manifest
+    def save(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+
+        def save(name, array):
+            tmp_path = os.path.join(out_dir, f'{name}.npy.tmp')
+            with open(tmp_path, 'wb') as file:
+                np.save(file, np.ascontiguousarray(array))
+            os.replace(tmp_path, os.path.join(out_dir, f'{name}.npy'))
+
+        with self._lock:
+            self.compact()
+            save('user_ids', self.users.ids)
+            save('movie_ids', self.movies.ids)
+            manifest = {'version': STORE_VERSION, 'shape': list(self.shape), 'channels': {}}
+            for channel, matrix in self._matrices.items():
+                save(f'{channel}.indptr', matrix.indptr)
+                save(f'{channel}.indices', matrix.indices)
+                save(f'{channel}.data', matrix.data)
+                manifest['channels'][channel] = {'nnz': int(matrix.nnz)}
+
+        tmp_path = os.path.join(out_dir, 'manifest.json.tmp')
+        with open(tmp_path, 'w') as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(tmp_path, os.path.join(out_dir, 'manifest.json'))
+        return manifest
+
+# Function to load a store saved with InteractionStore.save()
+def load_interaction_store(path, mmap=True):
+    with open(os.path.join(path, 'manifest.json')) as file:
+        manifest = json.load(file)
+    if manifest['version'] != STORE_VERSION:
+        raise ValueError(f"Unsupported interaction store version {manifest['version']} in {path}")
+
+    def load(name):
+        return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+
+    shape = tuple(manifest['shape'])
+    matrices = {
+        channel: sp.csr_matrix((load(f'{channel}.data'), load(f'{channel}.indices'), load(f'{channel}.indptr')), shape=shape)
+        for channel in manifest['channels']
+    }
+    return InteractionStore(load('user_ids'), load('movie_ids'), matrices)
+
+# Function to build the store from the interactions, favorites and ratings tables
+def build_interaction_store(df_interactions, df_favorites=None, df_ratings=None):
+    store = InteractionStore()
+    # Interactions are either "shown" or "view" (a shown row updated to view)
+    for channel in ('shown', 'view'):
+        rows = df_interactions[df_interactions['interaction_type'] == channel]
+        store.append(channel, rows['user_id'].to_numpy(), rows['movie_id'].to_numpy())
+    if df_favorites is not None:
+        store.append('favorite', df_favorites['user_id'].to_numpy(), df_favorites['movie_id'].to_numpy())
+    if df_ratings is not None:
+        # Oldest first, so the last rating of a pair wins
+        if 'date' in df_ratings.columns:
+            df_ratings = df_ratings.sort_values('date', kind='stable')
+        store.append('rating', df_ratings['user_id'].to_numpy(), df_ratings['movie_id'].to_numpy(), df_ratings['rating'].to_numpy())
+    store.compact()
+    return store
+
+# Build the store from the CSV exports: python lib/interaction_store.py --out data/interaction_store
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the sparse interaction store")
+    parser.add_argument('--interactions', default='data/interactions.csv')
+    parser.add_argument('--favorites', default='data/favorites.csv')
+    parser.add_argument('--ratings', default='data/ratings.csv')
+    parser.add_argument('--out', default='data/interaction_store')
+    args = parser.parse_args()
+
+    store = build_interaction_store(
+        pd.read_csv(args.interactions, usecols=['user_id', 'movie_id', 'interaction_type']),
+        pd.read_csv(args.favorites, usecols=['user_id', 'movie_id']),
+        pd.read_csv(args.ratings, usecols=['user_id', 'movie_id', 'rating', 'date']),
+    )
+    manifest = store.save(args.out)
+    print(f"{store.shape[0]} users x {store.shape[1]} movies: {manifest['channels']}")
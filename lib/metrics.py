@@ -0,0 +1,261 @@
+import bisect
+import contextvars
+import functools
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Lightweight latency instrumentation for the app.
+#
+# Timings are recorded in fixed-bucket histograms, in up to three places at once:
+#   - PROCESS: process-wide, exposed by the HTTP endpoint (Prometheus text or JSON)
+#   - the session registry set by begin_rerun() (one per Streamlit session)
+#   - the RerunStats of the current script run (stage totals and DB query counts)
+# The session and rerun are context variables, so timings from background threads
+# (write-behind queue, warm-up) only go to the process registry.
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.count += 1
+            self.sum += value
+
+    # Estimated quantile: linear interpolation inside the bucket that holds it
+    def quantile(self, q):
+        with self._lock:
+            counts, count = list(self.counts), self.count
+        if count == 0:
+            return None
+        target = q * count
+        cumulative = 0
+        for position, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= target and bucket_count > 0:
+                lower = self.buckets[position - 1] if position > 0 else 0.0
+                upper = self.buckets[position] if position < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (target - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+# Histograms and counters keyed by (name, labels)
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    # Register a callable returning {name: number}, read when the metrics are exported
+    # (e.g. cache or queue statistics)
+    def register_gauges(self, prefix, collect):
+        self.gauges[prefix] = collect
+
+    def _gauge_values(self):
+        values = {}
+        for prefix, collect in list(self.gauges.items()):
+            try:
+                for name, value in collect().items():
+                    # One level of nesting, e.g. per-artifact stats: {prefix}_{name}_{key}
+                    items = [(f'{name}_{key}', item) for key, item in value.items()] if isinstance(value, dict) else [(name, value)]
+                    for name, value in items:
+                        if isinstance(value, (int, float)) and not isinstance(value, bool):
+                            values[f'{prefix}_{name}'] = value
+            except Exception:
+                continue
+        return values
+
+    # JSON-friendly snapshot
+    def snapshot(self):
+        return {
+            'histograms': [dict(name=name, labels=dict(labels), **histogram.summary()) for (name, labels), histogram in list(self.histograms.items())],
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in list(self.counters.items())],
+            'gauges': self._gauge_values(),
+        }
+
+    # Prometheus text exposition format
+    def prometheus_text(self, prefix='feelms_'):
+        lines = []
+        typed = set()
+
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}' if pairs else ''
+
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            metric = prefix + name
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} histogram')
+                typed.add(metric)
+            with histogram._lock:
+                counts, count, total = list(histogram.counts), histogram.count, histogram.sum
+            cumulative = 0
+            for bound, bucket_count in zip(list(histogram.buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{label_text(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{metric}_sum{label_text(labels)} {total}')
+            lines.append(f'{metric}_count{label_text(labels)} {count}')
+
+        for (name, labels), value in sorted(self.counters.items()):
+            metric = f'{prefix}{name}_total'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} counter')
+                typed.add(metric)
+            lines.append(f'{metric}{label_text(labels)} {value}')
+
+        for name, value in sorted(self._gauge_values().items()):
+            lines.append(f'# TYPE {prefix}{name} gauge')
+            lines.append(f'{prefix}{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+# Totals of one script run: time per stage and database queries
+class RerunStats:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def add(self, name, seconds):
+        count, total = self.stages.get(name, (0, 0.0))
+        self.stages[name] = (count + 1, total + seconds)
+
+    def summary(self):
+        return {
+            'elapsed_ms': (time.perf_counter() - self.started_at) * 1000,
+            'db_queries': self.queries,
+            'db_ms': self.query_seconds * 1000,
+            'stages': {name: {'calls': count, 'ms': total * 1000} for name, (count, total) in self.stages.items()},
+        }
+
+PROCESS = MetricsRegistry()
+_session = contextvars.ContextVar('feelms_session_metrics', default=None)
+_rerun = contextvars.ContextVar('feelms_rerun_metrics', default=None)
+
+# Start a script run: timings of this thread also go to session_registry and the returned RerunStats
+def begin_rerun(session_registry=None):
+    rerun = RerunStats()
+    _session.set(session_registry)
+    _rerun.set(rerun)
+    return rerun
+
+# Record a stage duration everywhere it belongs
+def observe(name, seconds):
+    PROCESS.observe('stage_seconds', seconds, stage=name)
+    session = _session.get()
+    if session is not None:
+        session.observe('stage_seconds', seconds, stage=name)
+    rerun = _rerun.get()
+    if rerun is not None:
+        rerun.add(name, seconds)
+
+# Time a block of code: with metrics.timer('recommend'): ...
+@contextmanager
+def timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+# Time every call of a function: @metrics.timed('save_rating')
+def timed(name=None):
+    def decorator(fn):
+        stage = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def inc(name, value=1, **labels):
+    PROCESS.inc(name, value, **labels)
+    session = _session.get()
+    if session is not None:
+        session.inc(name, value, **labels)
+
+_STATEMENT_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+`?(\w+)', re.IGNORECASE)
+
+# Short label of a SQL statement: verb and table, e.g. "select_ratings"
+def statement_label(query):
+    words = query.split(None, 1)
+    verb = words[0].lower() if words else 'unknown'
+    match = _STATEMENT_TABLE.search(query)
+    return f'{verb}_{match.group(1).lower()}' if match else verb
+
+# Database.on_query hook: query latency histogram and per-rerun query count
+def observe_query(query, seconds):
+    label = statement_label(query)
+    PROCESS.observe('db_query_seconds', seconds, statement=label)
+    session = _session.get()
+    if session is not None:
+        session.observe('db_query_seconds', seconds, statement=label)
+    rerun = _rerun.get()
+    if rerun is not None:
+        rerun.queries += 1
+        rerun.query_seconds += seconds
+
+# Serve a registry over HTTP: /metrics (Prometheus text) and /metrics.json
+def start_http_server(port, registry=PROCESS, host='0.0.0.0'):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith('/metrics.json'):
+                body, content_type = json.dumps(registry.snapshot()).encode(), 'application/json'
+            elif self.path.startswith('/metrics'):
+                body, content_type = registry.prometheus_text().encode(), 'text/plain; version=0.0.4'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics-http').start()
+    return server
@@ -1,3 +1,7 @@
+import json
+import os
+import pickle
+import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
@@ -6,8 +10,14 @@ from sklearn.ensemble import RandomForestClassifier
 from surprise import SVD, Dataset, Reader
 from surprise.model_selection import cross_validate
 from sklearn.impute import SimpleImputer
+from features import load_or_build_features
+from model_registry import file_sha256
+
+# Version of the model bundle format written by export_svd_bundle/export_random_forest_bundle
+BUNDLE_FORMAT_VERSION = 1
 
 # 1. Preprocess the data: Merge, scale, and normalize
+# (lib/streaming_preprocess.py does the same join in chunks, for logs larger than memory)
 def preprocess_data(df_interactions, df_ratings, df_favorites, df_movies):
     # Merge interactions with movie data
     df_merged = pd.merge(df_interactions, df_movies, left_on='movie_id', right_index=True, how='inner')
@@ -29,24 +39,25 @@ def preprocess_data(df_interactions, df_ratings, df_favorites, df_movies):
     
     return df_merged
 
+# Default SVD hyperparameters (override with the best ones found by lib/svd_tuning.py)
+SVD_DEFAULT_PARAMS = {'n_factors': 100, 'lr_all': 0.005, 'reg_bi': 0.1, 'reg_bu': 0.1}
+
 # 2. Train SVD collaborative filtering model with manual hyperparameter adjustment
-def train_svd_model(df_user_movie):
+def train_svd_model(df_user_movie, svd_params=None, cv=5, n_jobs=1):
     # Prepare the data for Surprise's SVD
     reader = Reader(rating_scale=(1, 10))
     data = Dataset.load_from_df(df_user_movie[['user_id', 'movie_id', 'rating']].dropna(), reader)
     
-    # Manually adjust hyperparameters for SVD
-    svd_model = SVD(n_factors=100, lr_all=0.005, reg_bi=0.1, reg_bu=0.1)  # Customize hyperparameters
+    # Hyperparameters for SVD (e.g. svd_tuning.best_params(report))
+    svd_model = SVD(**(svd_params if svd_params is not None else SVD_DEFAULT_PARAMS))
 
-    # Cross-validation to evaluate the model
-    results = cross_validate(svd_model, data, measures=['RMSE', 'MAE'], cv=5, verbose=True)
+    # Cross-validation to evaluate the model (folds in parallel with n_jobs)
+    results = cross_validate(svd_model, data, measures=['RMSE', 'MAE'], cv=cv, n_jobs=n_jobs, verbose=True)
     
     return svd_model, results
 
 # 3. Train RandomForest for classification with custom hyperparameters
-def train_random_forest(df_user_movie):
-    df_user_movie = pd.get_dummies(df_user_movie, columns=['genre', 'emotions'])
-
+def train_random_forest(df_user_movie, n_jobs=None):
     # Prepare the features (X) and target (y)
     X = df_user_movie[['duration', 'rating']].fillna(0)  # Add more features as needed
     y = df_user_movie['is_favorite']
@@ -54,7 +65,7 @@ def train_random_forest(df_user_movie):
     # Split data into training and test sets
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-    rf = RandomForestClassifier(max_depth=15, random_state=42)
+    rf = RandomForestClassifier(max_depth=15, random_state=42, n_jobs=n_jobs)
 
     # Train the RandomForest classifier
     rf.fit(X_train, y_train)
@@ -70,6 +81,31 @@ def train_random_forest(df_user_movie):
     
     return rf, accuracy, precision, recall, f1, X_test, y_test  # Return X_test, y_test for later use
 
+# Where to save the RandomForest trained on the engineered features. The app serves
+# model/rf_model.pkl (and model/rf_bundle) through FavoriteScorer, which only builds the
+# (duration, rating) movie features, so this model must not be saved there.
+RF_FEATURES_MODEL_PATH = 'model/rf_features_model.pkl'
+
+# 3.1. Train RandomForest on the engineered features (genres, emotions, user and movie
+# aggregates from the interaction store; see lib/features.py). Trees are built in parallel.
+# Save it with save_model(rf, RF_FEATURES_MODEL_PATH) and export it with
+# export_random_forest_bundle(rf, out_dir, feature_names=rf.feature_names).
+def train_random_forest_features(df_user_movie, df_movies, store, n_jobs=-1, cache_dir='model/features'):
+    X, y, feature_names = load_or_build_features(df_user_movie, df_movies, store, cache_dir)
+    # With a few dozen columns sklearn's dense splitter is several times faster than the sparse one
+    X = X.toarray().astype(np.float32)
+
+    # Split data into training and test sets
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    rf = RandomForestClassifier(max_depth=15, random_state=42, n_jobs=n_jobs)
+    rf.fit(X_train, y_train)
+    # Feature names for inspection (the sparse matrix has no column names)
+    rf.feature_names = feature_names
+
+    accuracy, precision, recall, f1 = evaluate_classification_model(y_test, rf.predict(X_test))
+    return rf, accuracy, precision, recall, f1, X_test, y_test
+
 # 4. Evaluate classification model (e.g., RandomForest) and return the evaluation metrics
 def evaluate_classification_model(y_test, y_pred):
     accuracy = accuracy_score(y_test, y_pred)
@@ -81,4 +117,105 @@ def evaluate_classification_model(y_test, y_pred):
 # 5. Confusion matrix for classification
 def evaluate_classification(y_test, y_pred):
     cm = confusion_matrix(y_test, y_pred)
-    return cm
\ No newline at end of file
+    return cm
+
+# 6. Save a trained model for the app: write to a temporary file and rename it,
+# so the running app never picks up a half-written pickle when it hot-reloads model/
+def save_model(model, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as file:
+        pickle.dump(model, file)
+    os.replace(tmp_path, path)
+
+# 7. Export the SVD model as a memory-mappable bundle (.npy arrays + manifest.json),
+# so the app can load it without surprise and without unpickling
+def export_svd_bundle(svd_model, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    trainset = svd_model.trainset
+
+    # Raw ids ordered by inner id, so row i of pu/qi belongs to user_ids[i]/movie_ids[i]
+    arrays = {
+        'pu': svd_model.pu,
+        'qi': svd_model.qi,
+        'bu': svd_model.bu,
+        'bi': svd_model.bi,
+        'user_ids': np.array(sorted(trainset._raw2inner_id_users, key=trainset._raw2inner_id_users.get)),
+        'movie_ids': np.array(sorted(trainset._raw2inner_id_items, key=trainset._raw2inner_id_items.get)),
+    }
+    hashes = {name: _save_array(out_dir, name, array) for name, array in arrays.items()}
+
+    manifest = {
+        'type': 'svd',
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'global_mean': float(trainset.global_mean),
+        'rating_scale': list(trainset.rating_scale),
+        'biased': bool(svd_model.biased),
+        'n_factors': int(svd_model.n_factors),
+        'arrays': list(arrays),
+        # Content of every array: the app versions the bundle by the manifest hash
+        'sha256': hashes,
+    }
+    _write_manifest(out_dir, manifest)
+    return manifest
+
+# 8. Export the RandomForest as flattened node arrays (feature, threshold, children, value)
+# evaluated with NumPy at serve time (see model_bundle.FlatForest)
+# (feature_names default to the column names the model was fitted with)
+def export_random_forest_bundle(rf, out_dir, feature_names=None):
+    os.makedirs(out_dir, exist_ok=True)
+    trees = [estimator.tree_ for estimator in rf.estimators_]
+    if feature_names is None:
+        feature_names = getattr(rf, 'feature_names_in_', range(rf.n_features_in_))
+    if len(feature_names) != rf.n_features_in_:
+        raise ValueError(f"{len(feature_names)} feature names for a model with {rf.n_features_in_} features")
+
+    # Node ids are made global by offsetting each tree; leaves keep -1 as children
+    offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+    def children(tree_children, offset):
+        return np.where(tree_children >= 0, tree_children + offset, -1)
+
+    # Leaf values as class probabilities (each tree's predict_proba normalizes them)
+    values = np.concatenate([tree.value[:, 0, :] for tree in trees])
+    values = values / np.maximum(values.sum(axis=1, keepdims=True), np.finfo(float).tiny)
+
+    arrays = {
+        'roots': offsets[:-1].astype(np.int64),
+        'feature': np.concatenate([tree.feature for tree in trees]).astype(np.int32),
+        'threshold': np.concatenate([tree.threshold for tree in trees]).astype(np.float64),
+        'children_left': np.concatenate([children(tree.children_left, offset) for tree, offset in zip(trees, offsets)]).astype(np.int64),
+        'children_right': np.concatenate([children(tree.children_right, offset) for tree, offset in zip(trees, offsets)]).astype(np.int64),
+        'value': values.astype(np.float64),
+    }
+    hashes = {name: _save_array(out_dir, name, array) for name, array in arrays.items()}
+
+    manifest = {
+        'type': 'random_forest',
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'classes': [item.item() if hasattr(item, 'item') else item for item in rf.classes_],
+        'feature_names': [str(name) for name in feature_names],
+        'n_trees': len(trees),
+        'max_depth': int(max(tree.max_depth for tree in trees)),
+        'arrays': list(arrays),
+        # Content of every array: the app versions the bundle by the manifest hash
+        'sha256': hashes,
+    }
+    _write_manifest(out_dir, manifest)
+    return manifest
+
+# Write an array to a new file and rename it: the app may have the previous file
+# memory-mapped, and overwriting it in place would corrupt the running version.
+# Returns the sha256 of the file, recorded in the manifest.
+def _save_array(out_dir, name, array):
+    tmp_path = os.path.join(out_dir, f'{name}.npy.tmp')
+    with open(tmp_path, 'wb') as file:
+        np.save(file, np.ascontiguousarray(array))
+    sha256 = file_sha256(tmp_path)
+    os.replace(tmp_path, os.path.join(out_dir, f'{name}.npy'))
+    return sha256
+
+# Write the manifest last (atomically): the app watches it to hot-reload bundles
+def _write_manifest(out_dir, manifest):
+    tmp_path = os.path.join(out_dir, 'manifest.json.tmp')
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, 'manifest.json'))
@@ -0,0 +1,100 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from scoring import SVDScorer
+
+# Serve-time loaders for the model bundles written by ml.export_svd_bundle and
+# ml.export_random_forest_bundle. Arrays are memory-mapped, so several app processes
+# share the same pages, and neither surprise nor sklearn is imported.
+
+BUNDLE_FORMAT_VERSION = 1
+
+# Function to read a bundle manifest and check its type and format version
+def read_manifest(path, expected_type):
+    with open(os.path.join(path, 'manifest.json')) as file:
+        manifest = json.load(file)
+    if manifest.get('type') != expected_type:
+        raise ValueError(f"{path} is a '{manifest.get('type')}' bundle, expected '{expected_type}'")
+    if manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format version {manifest.get('format_version')} in {path}")
+    return manifest
+
+def _load_arrays(path, names, mmap):
+    return {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None) for name in names}
+
+# Function to load an SVD bundle as a batch scorer
+def load_svd_bundle(path, mmap=True):
+    manifest = read_manifest(path, 'svd')
+    arrays = _load_arrays(path, manifest['arrays'], mmap)
+    return SVDScorer(
+        pu=arrays['pu'],
+        qi=arrays['qi'],
+        bu=arrays['bu'],
+        bi=arrays['bi'],
+        global_mean=manifest['global_mean'],
+        user_ids=arrays['user_ids'],
+        movie_ids=arrays['movie_ids'],
+        rating_scale=tuple(manifest['rating_scale']),
+        biased=manifest['biased'],
+    )
+
+# RandomForest flattened into node arrays, evaluated for a whole batch at once:
+# every (sample, tree) pair that hasn't reached a leaf walks down one level per iteration.
+class FlatForest:
+    def __init__(self, manifest, arrays):
+        self.classes_ = np.array(manifest['classes'])
+        self.feature_names_in_ = np.array(manifest['feature_names'], dtype=object)
+        self.n_features_in_ = len(self.feature_names_in_)
+        self.max_depth = manifest['max_depth']
+        self.roots = arrays['roots']
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.children_left = arrays['children_left']
+        self.children_right = arrays['children_right']
+        self.value = arrays['value']
+
+    def _features(self, X):
+        if isinstance(X, pd.DataFrame):
+            X = X[list(self.feature_names_in_)]
+        # sklearn compares float32 features against the thresholds
+        return np.asarray(X, dtype=np.float32).astype(np.float64).reshape(-1, self.n_features_in_)
+
+    # Leaf node reached by every (sample, tree) pair
+    def apply(self, X):
+        X = self._features(X)
+        n_samples, n_trees = len(X), len(self.roots)
+        flat_X = X.ravel()
+
+        # One entry per (sample, tree) pair; only the pairs still on internal nodes are advanced
+        nodes = np.tile(np.asarray(self.roots), n_samples)
+        feature_offsets = np.repeat(np.arange(n_samples) * self.n_features_in_, n_trees)
+        active = np.arange(len(nodes))
+
+        for _ in range(self.max_depth + 1):
+            current = nodes[active]
+            left = self.children_left[current]
+            internal = left >= 0
+            if not internal.all():
+                active, current, left = active[internal], current[internal], left[internal]
+            if len(active) == 0:
+                break
+            values = flat_X[feature_offsets[active] + self.feature[current]]
+            nodes[active] = np.where(values <= self.threshold[current], left, self.children_right[current])
+        return nodes.reshape(n_samples, n_trees)
+
+    # Class probabilities: mean of the leaf class probabilities over the trees
+    def predict_proba(self, X):
+        return self.value[self.apply(X)].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+# Function to load a RandomForest bundle
+def load_random_forest_bundle(path, mmap=True):
+    manifest = read_manifest(path, 'random_forest')
+    return FlatForest(manifest, _load_arrays(path, manifest['arrays'], mmap))
+
+# Function to check whether a directory holds a bundle
+def has_bundle(path):
+    return os.path.exists(os.path.join(path, 'manifest.json'))
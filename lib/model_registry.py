@@ -0,0 +1,176 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import namedtuple
+
+# One loaded version of an artifact (model, catalog, ...)
+LoadedArtifact = namedtuple('LoadedArtifact', ['name', 'value', 'version', 'sha256', 'mtime', 'loaded_at', 'load_seconds'])
+
+# Function to load a pickled object (default loader)
+def load_pickle(path):
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+# Function to compute the sha256 of a file
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class _Entry:
+    def __init__(self, name, sources, loader):
+        self.name = name
+        # (path, watch_path) candidates, preferred first
+        self.sources = sources
+        self.path, self.watch_path = sources[0]
+        self.loader = loader
+        self.current = None
+        self.last_check = 0.0
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.reload_lock = threading.Lock()
+
+    # First source whose watched file exists (the last one if none does)
+    def source(self):
+        for path, watch_path in self.sources:
+            if os.path.exists(watch_path):
+                return path, watch_path
+        return self.sources[-1]
+
+# Process-wide registry of read-only artifacts shared by every session.
+# Each artifact is loaded once; get() only does a cheap mtime check (at most every
+# check_interval seconds). When the file changes and its content hash differs,
+# the new version is loaded in a background thread and swapped in atomically,
+# while requests keep being served with the previous version.
+# An artifact can have fallbacks (e.g. a pickle behind a bundle directory): the first
+# source whose watched file exists is loaded, and a preferred source that appears later
+# (a bundle exported after startup) is picked up by the same check.
+class ModelRegistry:
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    # Register an artifact. watch_path is the file whose changes trigger a reload
+    # (defaults to path; use e.g. a manifest file for directory artifacts).
+    # fallbacks are (path, watch_path) pairs used, in order, while watch_path doesn't exist.
+    def register(self, name, path, loader=load_pickle, watch_path=None, fallbacks=()):
+        with self._lock:
+            if name not in self._entries:
+                sources = [(path, watch_path or path)] + [(fallback_path, fallback_watch or fallback_path) for fallback_path, fallback_watch in fallbacks]
+                self._entries[name] = _Entry(name, sources, loader)
+        return self
+
+    # Current value of an artifact (loads it on first use)
+    def get(self, name):
+        return self.entry(name).value
+
+    # Current LoadedArtifact of an artifact (value plus version information)
+    def entry(self, name):
+        entry = self._entries[name]
+        if entry.current is None:
+            # First use: every caller has to wait for the initial load
+            with entry.reload_lock:
+                if entry.current is None:
+                    self._load(entry)
+        else:
+            self._check(entry)
+        return entry.current
+
+    # Version string of an artifact
+    def version(self, name):
+        return self.entry(name).version
+
+    def _stat(self, watch_path):
+        try:
+            return os.stat(watch_path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _load(self, entry, source=None, sha256=None):
+        path, watch_path = source or entry.source()
+        start = time.perf_counter()
+        value = entry.loader(path)
+        load_seconds = time.perf_counter() - start
+
+        mtime = self._stat(watch_path)
+        if sha256 is None and mtime is not None:
+            sha256 = file_sha256(watch_path)
+
+        # A single reference assignment: readers see either the old or the new version
+        entry.path, entry.watch_path = path, watch_path
+        entry.current = LoadedArtifact(
+            name=entry.name,
+            value=value,
+            version=sha256[:12] if sha256 else 'unknown',
+            sha256=sha256,
+            mtime=mtime,
+            loaded_at=time.time(),
+            load_seconds=load_seconds,
+        )
+        entry.last_check = time.monotonic()
+
+    def _check(self, entry):
+        now = time.monotonic()
+        if now - entry.last_check < self.check_interval:
+            return
+        entry.last_check = now
+
+        # Reload when the watched file changed or a preferred source appeared
+        if entry.source() == (entry.path, entry.watch_path):
+            mtime = self._stat(entry.watch_path)
+            if mtime is None or mtime == entry.current.mtime:
+                return
+
+        # Reload in the background unless another thread is already doing it
+        if entry.reload_lock.acquire(blocking=False):
+            threading.Thread(target=self._reload, args=(entry,), daemon=True, name=f'reload-{entry.name}').start()
+
+    def _reload(self, entry):
+        try:
+            source = entry.source()
+            sha256 = file_sha256(source[1])
+            if source == (entry.path, entry.watch_path) and sha256 == entry.current.sha256:
+                # Touched but unchanged: just remember the new mtime
+                entry.current = entry.current._replace(mtime=self._stat(entry.watch_path))
+                return
+            self._load(entry, source, sha256)
+            entry.reloads += 1
+            entry.last_error = None
+        except Exception as error:
+            # Keep serving the previous version if the new file can't be loaded
+            entry.failures += 1
+            entry.last_error = repr(error)
+        finally:
+            entry.reload_lock.release()
+
+    # Force a synchronous check and reload of every loaded artifact (e.g. after training)
+    def refresh(self):
+        for entry in list(self._entries.values()):
+            if entry.current is None:
+                continue
+            if entry.reload_lock.acquire():
+                self._reload(entry)
+
+    # Load time and version of every artifact, for monitoring
+    def stats(self):
+        stats = {}
+        for name, entry in self._entries.items():
+            current = entry.current
+            stats[name] = {
+                'path': entry.path,
+                'loaded': current is not None,
+                'version': current.version if current else None,
+                'mtime': current.mtime if current else None,
+                'loaded_at': current.loaded_at if current else None,
+                'load_seconds': current.load_seconds if current else None,
+                'reloads': entry.reloads,
+                'failures': entry.failures,
+                'last_error': entry.last_error,
+            }
+        return stats
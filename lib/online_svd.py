@@ -0,0 +1,167 @@
+import threading
+import numpy as np
+from scoring import SVDScorer
+
+# Online updates of a trained SVD model from new ratings, without retraining.
+#
+# - A rating of a user the model knows applies n_steps SGD steps to that user's
+#   factors and bias (and to the movie's, if update_items), with the same update rule
+#   as Surprise's SVD.fit().
+# - A user the model has never seen is folded in: their factors and bias are the ridge
+#   regression solution over the movie factors of the movies they rated online, re-solved
+#   on every new rating, so they get personalized predictions from their first ratings.
+#
+# Movies that are not in the model are not learned online. The periodic full retrain
+# (ml.train_svd_model) replaces the online state and reconciles any drift.
+#
+# The trained factors are never written: they stay shared, read-only (memory-mapped when
+# loaded from a bundle). Users and movies changed online get their own copy of their
+# factors (the overrides), which take precedence over the trained ones. The app replays
+# the ratings saved since the model was trained with add_ratings() when it loads a model.
+class OnlineSVD(SVDScorer):
+    def __init__(self, scorer, lr=0.005, reg=0.02, n_steps=3, fold_in_reg=0.1, update_items=True):
+        super().__init__(
+            pu=scorer.pu,
+            qi=scorer.qi,
+            bu=scorer.bu,
+            bi=scorer.bi,
+            global_mean=scorer.global_mean,
+            user_ids=scorer.user_index,
+            movie_ids=scorer.movie_index,
+            rating_scale=scorer.rating_scale,
+            biased=scorer.biased,
+        )
+        self.lr = lr
+        self.reg = reg
+        self.n_steps = n_steps
+        self.fold_in_reg = fold_in_reg
+        self.update_items = update_items
+
+        # User overrides: user_id -> (pu, bu), for trained users updated online and folded-in users
+        self.user_overrides = {}
+        # Movie overrides: row item_slot[inner_i] of override_qi / override_bi (-1 if not overridden)
+        self.item_slot = np.full(len(self.movie_index), -1, dtype=np.int64)
+        self.override_qi = np.empty((0, self.qi.shape[1]))
+        self.override_bi = np.empty(0)
+
+        # Ratings received online: user_id -> {movie_id: rating}
+        self.ratings = {}
+        self._lock = threading.Lock()
+        self._stats = {'updates': 0, 'folded_in_users': 0, 'unknown_movies': 0}
+
+    def user_factors(self, user_id):
+        override = self.user_overrides.get(user_id)
+        return override if override is not None else super().user_factors(user_id)
+
+    def item_factors(self, inner_i):
+        qi, bi = super().item_factors(inner_i)
+        slots = self.item_slot[inner_i]
+        overridden = slots >= 0
+        if overridden.any():
+            qi, bi = qi.copy(), bi.copy()
+            qi[overridden] = self.override_qi[slots[overridden]]
+            bi[overridden] = self.override_bi[slots[overridden]]
+        return qi, bi
+
+    # Store new factors of a movie (grows the override arrays on its first update)
+    def _set_item(self, inner_i, qi, bi):
+        slot = self.item_slot[inner_i]
+        if slot >= 0:
+            self.override_qi[slot] = qi
+            self.override_bi[slot] = bi
+            return
+        # Grow the arrays before publishing the slot, so concurrent predict() calls
+        # never see a slot without factors
+        self.override_qi = np.vstack([self.override_qi, qi[np.newaxis, :]])
+        self.override_bi = np.append(self.override_bi, bi)
+        self.item_slot[inner_i] = len(self.override_bi) - 1
+
+    # Ridge fold-in: factors and bias of a user from their ratings, with the movie factors fixed
+    def fold_in(self, movie_ids, ratings):
+        inner_i = self.inner_movies(movie_ids)
+        known = inner_i >= 0
+        n_factors = self.qi.shape[1]
+        if not known.any():
+            return np.zeros(n_factors), 0.0
+
+        X, bi = self.item_factors(inner_i[known])
+        ratings = np.asarray(ratings, dtype=float)[known]
+        if self.biased:
+            # Solve for [pu, bu] against the residual of the global mean and the movie biases
+            X = np.hstack([X, np.ones((len(X), 1))])
+            y = ratings - self.global_mean - bi
+        else:
+            y = ratings
+        weights = np.linalg.solve(X.T @ X + self.fold_in_reg * np.eye(X.shape[1]), X.T @ y)
+        return (weights[:n_factors], float(weights[n_factors])) if self.biased else (weights, 0.0)
+
+    # Apply one new rating. Returns False if the movie is not in the model.
+    def add_rating(self, user_id, movie_id, rating):
+        with self._lock:
+            self.ratings.setdefault(user_id, {})[movie_id] = rating
+            inner_i = self.inner_movies([movie_id])[0]
+            if inner_i < 0:
+                self._stats['unknown_movies'] += 1
+                return False
+
+            if self.inner_user(user_id) >= 0:
+                for _ in range(self.n_steps):
+                    self._sgd_step(user_id, inner_i, rating, update_items=self.update_items)
+                self._stats['updates'] += 1
+                return True
+
+            # The folded-in user's factors are exact for the current movie factors;
+            # the movie still learns from the rating
+            self._fold_in_user(user_id)
+            if self.update_items:
+                for _ in range(self.n_steps):
+                    self._sgd_step(user_id, inner_i, rating, update_user=False)
+            self._stats['updates'] += 1
+            return True
+
+    # Apply a batch of (user_id, movie_id, rating) rows (e.g. ratings since the last training)
+    def add_ratings(self, rows):
+        return sum(self.add_rating(user_id, movie_id, rating) for user_id, movie_id, rating in rows)
+
+    # Forget an online rating (e.g. when a favorite and its rating are removed).
+    # Folded-in users are re-solved; SGD updates of known users can't be undone.
+    def remove_rating(self, user_id, movie_id):
+        with self._lock:
+            user_ratings = self.ratings.get(user_id, {})
+            if user_ratings.pop(movie_id, None) is None:
+                return False
+            if self.inner_user(user_id) < 0:
+                self._fold_in_user(user_id)
+            return True
+
+    # SGD step on one rating (same update rule as Surprise's SVD)
+    def _sgd_step(self, user_id, inner_i, rating, update_user=True, update_items=True):
+        pu, bu = self.user_factors(user_id)
+        qi, bi = self.item_factors(np.array([inner_i]))
+        qi, bi = qi[0], bi[0]
+        est = pu @ qi
+        if self.biased:
+            est += self.global_mean + bu + bi
+        err = rating - est
+
+        if update_user:
+            new_bu = bu + self.lr * (err - self.reg * bu) if self.biased else bu
+            # One assignment: readers see the old or the new factors
+            self.user_overrides[user_id] = (pu + self.lr * (err * qi - self.reg * pu), float(new_bu))
+        if update_items:
+            new_bi = bi + self.lr * (err - self.reg * bi) if self.biased else bi
+            self._set_item(inner_i, qi + self.lr * (err * pu - self.reg * qi), new_bi)
+
+    # (Re)compute a new user's factors from all their online ratings
+    def _fold_in_user(self, user_id):
+        user_ratings = self.ratings.get(user_id, {})
+        pu, bu = self.fold_in(list(user_ratings), list(user_ratings.values()))
+        if user_id not in self.user_overrides:
+            self._stats['folded_in_users'] += 1
+        self.user_overrides[user_id] = (pu, bu)
+
+    # Update counters, for monitoring
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, online_users=len(self.ratings), users=len(self.user_index),
+                        overridden_users=len(self.user_overrides), overridden_movies=len(self.override_bi))
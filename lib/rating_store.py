@@ -0,0 +1,159 @@
+import atexit
+import datetime
+import threading
+import time
+from collections import OrderedDict
+import repository
+
+# Ratings of the users, served from memory and written to the database in the background.
+#
+# Reads are read-through: the first read of a user loads all their ratings with one query
+# and later reads are served from memory (least-recently-used users beyond max_users are
+# dropped). Writes update memory right away and are buffered per (user_id, movie_id): a
+# burst of changes, e.g. dragging a rating slider, is coalesced into its last value and
+# written with one upsert once the pair hasn't changed for `debounce` seconds (or after
+# max_delay seconds of continuous changes). A background worker does the writes.
+# With upsert=False (no unique (user_id, movie_id) key on the ratings table), every
+# rating is written with a delete and an insert instead.
+class RatingStore:
+    def __init__(self, db, debounce=1.0, max_delay=5.0, max_users=10000, upsert=True, name='rating-writer'):
+        self.db = db
+        self.upsert = upsert
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_users = max_users
+
+        self._ratings = OrderedDict()
+        # (user_id, movie_id) -> (rating, date, first change, last change)
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'coalesced': 0, 'flushed': 0, 'batches': 0, 'failed_batches': 0, 'last_error': None}
+
+        self._worker = threading.Thread(target=self._run, daemon=True, name=name)
+        self._worker.start()
+        # Write the pending ratings when the process exits
+        atexit.register(self.close)
+
+    # Ratings of a user as {movie_id: rating}, loaded on first use
+    def ratings(self, user_id):
+        with self._cond:
+            ratings = self._ratings.get(user_id)
+            if ratings is not None:
+                self._ratings.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return ratings
+            self._stats['misses'] += 1
+
+        # No write runs during the read: every rating is either in what the database
+        # returns or still in _pending when they are merged
+        with self._flush_lock:
+            loaded = repository.get_ratings(self.db, user_id)
+            with self._cond:
+                # Changes not written yet win over what the database returned
+                for (pending_user, movie_id), (rating, *_) in self._pending.items():
+                    if pending_user == user_id:
+                        loaded[movie_id] = rating
+                ratings = self._ratings.setdefault(user_id, loaded)
+                self._ratings.move_to_end(user_id)
+                while len(self._ratings) > self.max_users:
+                    self._ratings.popitem(last=False)
+        return ratings
+
+    # A user's rating of a movie (None if not rated)
+    def get(self, user_id, movie_id):
+        return self.ratings(user_id).get(movie_id)
+
+    # Save a rating: visible to reads at once, written after the debounce window
+    def set(self, user_id, movie_id, rating):
+        now = time.monotonic()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Rating store is closed")
+            key = (user_id, movie_id)
+            previous = self._pending.get(key)
+            if previous is not None:
+                self._stats['coalesced'] += 1
+            first_change = previous[2] if previous is not None else now
+            self._pending[key] = (rating, datetime.datetime.now(), first_change, now)
+            if user_id in self._ratings:
+                self._ratings[user_id][movie_id] = rating
+            self._stats['writes'] += 1
+            self._cond.notify_all()
+
+    # Drop a rating from memory and from the pending writes. Call it before deleting the
+    # rating in the database, so a pending write can't bring it back.
+    def forget(self, user_id, movie_id):
+        # Wait for a write in progress, which may contain the rating
+        with self._flush_lock, self._cond:
+            self._pending.pop((user_id, movie_id), None)
+            if user_id in self._ratings:
+                self._ratings[user_id].pop(movie_id, None)
+
+    # Write the pending ratings whose window has passed (all of them with force=True).
+    # Returns False if the write failed; the ratings stay pending and are retried.
+    # Ratings stay in _pending until the write succeeds, so a user loaded from the database
+    # meanwhile still gets them.
+    def flush(self, force=False):
+        with self._flush_lock:
+            now = time.monotonic()
+            with self._cond:
+                due = {
+                    key: value for key, value in self._pending.items()
+                    if force or value[3] + self.debounce <= now or value[2] + self.max_delay <= now
+                }
+            if not due:
+                return True
+
+            rows = [(user_id, movie_id, rating, date) for (user_id, movie_id), (rating, date, _, _) in due.items()]
+            try:
+                repository.save_ratings(self.db, rows, upsert=self.upsert)
+            except Exception as error:
+                with self._cond:
+                    self._stats['failed_batches'] += 1
+                    self._stats['last_error'] = repr(error)
+                return False
+
+            with self._cond:
+                # Keep the ratings that changed during the write: they are written next
+                for key, value in due.items():
+                    if self._pending.get(key) is value:
+                        del self._pending[key]
+                self._stats['flushed'] += len(rows)
+                self._stats['batches'] += 1
+            return True
+
+    # Seconds until the next pending rating is due (None if nothing is pending)
+    def _next_due(self):
+        if not self._pending:
+            return None
+        now = time.monotonic()
+        due = min(min(last + self.debounce, first + self.max_delay) for _, _, first, last in self._pending.values())
+        return max(due - now, 0.0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Sleep until the next rating is due; set() wakes the worker up to recompute it
+                while not self._closed and self._next_due() != 0.0:
+                    self._cond.wait(timeout=self._next_due())
+                if self._closed:
+                    return
+            if not self.flush():
+                # Don't hammer a failing database: wait before retrying
+                time.sleep(self.max_delay)
+
+    # Stop the worker and write everything that is pending
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+        self.flush(force=True)
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, pending=len(self._pending), users=len(self._ratings))
@@ -0,0 +1,164 @@
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from retrieval import recommend_candidates
+
+# Cache of ranked recommendation candidates keyed by (user_id, emotion, model_version).
+# Entries are evicted least-recently-used beyond max_entries and expire after ttl seconds.
+# A user's entries are dropped with invalidate_user() whenever they rate or favorite a movie.
+class RecommendationCache:
+    def __init__(self, max_entries=10000, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, user_id, emotion, model_version):
+        key = (user_id, emotion, model_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    # ttl=None keeps the entry until it is evicted or invalidated (used for precomputed lists)
+    def put(self, user_id, emotion, model_version, value, ttl=-1):
+        key = (user_id, emotion, model_version)
+        ttl = self.ttl if ttl == -1 else ttl
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+            self._entries.move_to_end(key)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    # Return the cached value, computing and storing it on a miss
+    def get_or_compute(self, user_id, emotion, model_version, compute):
+        value = self.get(user_id, emotion, model_version)
+        if value is None:
+            value = compute()
+            self.put(user_id, emotion, model_version, value)
+        return value
+
+    # Drop every entry of a user (after a rating or favorite write)
+    def invalidate_user(self, user_id):
+        with self._lock:
+            keys = self._keys_by_user.pop(user_id, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            if keys:
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        user_keys = self._keys_by_user.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._keys_by_user[key[0]]
+
+    # Hit/miss counters and size, for monitoring
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+    # Fill the cache with lists precomputed by precompute_recommendations().
+    # Lists computed with another model version are skipped.
+    def load_precomputed(self, path, model_version):
+        with np.load(path, allow_pickle=False) as data:
+            if str(data['model_version']) != model_version:
+                return 0
+            user_ids = data['user_ids']
+            emotions = data['emotions']
+            offsets = data['offsets']
+            rows = data['rows']
+            predicted = data['predicted']
+
+        for i in range(len(user_ids)):
+            start, end = offsets[i], offsets[i + 1]
+            self.put(int(user_ids[i]), str(emotions[i]), model_version, (rows[start:end], predicted[start:end]), ttl=None)
+        return len(user_ids)
+
+# Function to precompute the recommendation candidates of every user and emotion
+# (offline, after each training run) and save them as an .npz file
+def precompute_recommendations(scorer, emotion_index, user_ids, model_version, out_path, k=50, n_explore=20):
+    keys_user, keys_emotion, lengths, all_rows, all_predicted = [], [], [], [], []
+    for user_id in user_ids:
+        for emotion in emotion_index.emotions:
+            rows, predicted = recommend_candidates(scorer, emotion_index, user_id, emotion, k=k, n_explore=n_explore)
+            keys_user.append(user_id)
+            keys_emotion.append(emotion)
+            lengths.append(len(rows))
+            all_rows.append(rows)
+            all_predicted.append(predicted)
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    np.savez(
+        out_path,
+        model_version=np.array(model_version),
+        user_ids=np.asarray(keys_user, dtype=np.int64),
+        emotions=np.asarray(keys_emotion),
+        offsets=offsets,
+        rows=np.concatenate(all_rows) if all_rows else np.empty(0, dtype=np.intp),
+        predicted=np.concatenate(all_predicted) if all_predicted else np.empty(0),
+    )
+    return len(keys_user)
+
+# Offline job: python lib/rec_cache.py --users data/users.csv --model model/svd_model.pkl
+# (--model can also be an SVD bundle directory such as model/svd_bundle)
+if __name__ == '__main__':
+    from catalog_store import load_or_build_catalog
+    from model_bundle import has_bundle, load_svd_bundle
+    from model_registry import file_sha256
+    from scoring import load_svd_scorer
+
+    parser = argparse.ArgumentParser(description="Precompute recommendation candidates for every user")
+    parser.add_argument('--users', default='data/users.csv')
+    parser.add_argument('--model', default='model/svd_model.pkl')
+    parser.add_argument('--catalog', default='data/catalog')
+    parser.add_argument('--csv', default='data/imdb_clean.csv')
+    parser.add_argument('--out', default='model/recommendations.npz')
+    parser.add_argument('--k', type=int, default=50)
+    parser.add_argument('--explore', type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    # The version must match the one the app computes: SVD model version and catalog version
+    catalog = load_or_build_catalog(args.catalog, args.csv)
+    if has_bundle(args.model):
+        scorer, model_file = load_svd_bundle(args.model), os.path.join(args.model, 'manifest.json')
+    else:
+        scorer, model_file = load_svd_scorer(args.model), args.model
+    model_version = f"{file_sha256(model_file)[:12]}:{file_sha256(os.path.join(args.catalog, 'manifest.json'))[:12]}"
+    count = precompute_recommendations(
+        scorer,
+        catalog.emotion_index(),
+        pd.read_csv(args.users)['user_id'].tolist(),
+        model_version,
+        args.out,
+        k=args.k,
+        n_explore=args.explore,
+    )
+    print(f"Precomputed {count} recommendation lists for model {model_version} in {time.perf_counter() - start:.1f}s")
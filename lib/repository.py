@@ -0,0 +1,125 @@
+import datetime
+
+# Queries used by the Streamlit app, on top of db.Database.
+# Each function is one logical operation and runs in its own transaction.
+
+# Function to get a user's id by username (None if the user doesn't exist)
+def get_user_id(db, username):
+    result = db.fetchone("SELECT user_id FROM users WHERE username = %s", (username,))
+    return result[0] if result else None
+
+# Function to check a user's password, returning the user_id if it matches
+def authenticate_user(db, username, password):
+    result = db.fetchone("SELECT user_id FROM users WHERE username = %s AND password = %s", (username, password))
+    return result[0] if result else None
+
+# Function to create a user and return its user_id
+def create_user(db, username, password):
+    return db.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, password))
+
+# Function to save an interaction
+def save_interaction(db, user_id, movie_id, emotion, interaction_type, date=None):
+    query = "INSERT INTO interactions (user_id, movie_id, emotion, interaction_type, date) VALUES (%s, %s, %s, %s, %s)"
+    db.execute(query, (user_id, movie_id, emotion, interaction_type, date or datetime.datetime.now()))
+
+# Function to turn the 'shown' interaction of a movie into another type (e.g. 'view')
+def update_interaction(db, user_id, movie_id, interaction_type):
+    query = """
+    UPDATE interactions
+    SET interaction_type = %s, date = %s
+    WHERE user_id = %s AND movie_id = %s AND interaction_type = 'shown'
+    """
+    db.execute(query, (interaction_type, datetime.datetime.now(), user_id, movie_id))
+
+# Function to add a favorite. Returns False if it was already a favorite.
+def add_favorite(db, user_id, movie_id):
+    def op(cursor):
+        cursor.execute("SELECT 1 FROM favorites WHERE user_id = %s AND movie_id = %s", (user_id, movie_id))
+        if cursor.fetchone():
+            return False
+        query = "INSERT INTO favorites (user_id, movie_id, date_added) VALUES (%s, %s, %s)"
+        cursor.execute(query, (user_id, movie_id, datetime.datetime.now()))
+        return True
+    return db.run(op)
+
+# Function to remove a favorite together with its rating (one transaction)
+def remove_favorite(db, user_id, movie_id):
+    def op(cursor):
+        cursor.execute("DELETE FROM ratings WHERE user_id = %s AND movie_id = %s", (user_id, movie_id))
+        cursor.execute("DELETE FROM favorites WHERE user_id = %s AND movie_id = %s", (user_id, movie_id))
+    db.run(op)
+
+# Function to delete a rating
+def delete_rating(db, user_id, movie_id):
+    db.execute("DELETE FROM ratings WHERE user_id = %s AND movie_id = %s", (user_id, movie_id))
+
+# Upsert of a rating on the unique (user_id, movie_id) key of the ratings table
+# (created by migration 2 of lib/schema.py)
+def _upsert_rating_query(db):
+    if db.dialect == 'sqlite':
+        conflict = "ON CONFLICT (user_id, movie_id) DO UPDATE SET rating = excluded.rating, date = excluded.date"
+    else:
+        conflict = "ON DUPLICATE KEY UPDATE rating = VALUES(rating), date = VALUES(date)"
+    return f"INSERT INTO ratings (user_id, movie_id, rating, date) VALUES (%s, %s, %s, %s) {conflict}"
+
+# Delete and insert of every rating in one transaction, for a ratings table without the unique key
+def _replace_ratings(db, rows):
+    def op(cursor):
+        for user_id, movie_id, rating, date in rows:
+            cursor.execute("DELETE FROM ratings WHERE user_id = %s AND movie_id = %s", (user_id, movie_id))
+            cursor.execute("INSERT INTO ratings (user_id, movie_id, rating, date) VALUES (%s, %s, %s, %s)", (user_id, movie_id, rating, date))
+    db.run(op)
+
+# Function to save or update a movie rating (one statement; delete + insert with upsert=False)
+def save_rating(db, user_id, movie_id, rating, date=None, upsert=True):
+    save_ratings(db, [(user_id, movie_id, rating, date or datetime.datetime.now())], upsert=upsert)
+
+# Function to save or update many ratings with one multi-row upsert
+# (rows are (user_id, movie_id, rating, date) tuples; delete + insert with upsert=False)
+def save_ratings(db, rows, upsert=True):
+    if upsert:
+        db.executemany(_upsert_rating_query(db), rows)
+    else:
+        _replace_ratings(db, rows)
+
+# Function to get a user's rating of a movie (None if not rated).
+# The latest row wins if a pair was rated more than once (before the unique index existed).
+def get_rating(db, user_id, movie_id):
+    query = "SELECT rating FROM ratings WHERE user_id = %s AND movie_id = %s ORDER BY rating_id DESC LIMIT 1"
+    result = db.fetchone(query, (user_id, movie_id))
+    return result[0] if result else None
+
+# Function to get all the ratings of a user as {movie_id: rating} (the latest row of a pair wins)
+def get_ratings(db, user_id):
+    return dict(db.fetchall("SELECT movie_id, rating FROM ratings WHERE user_id = %s ORDER BY rating_id", (user_id,)))
+
+# Function to get the ratings saved since a date as (user_id, movie_id, rating) tuples, oldest first
+def get_ratings_since(db, since):
+    return db.fetchall("SELECT user_id, movie_id, rating FROM ratings WHERE date >= %s ORDER BY date", (since,))
+
+# Function to get the movie_ids of a user's favorites
+def get_favorite_ids(db, user_id):
+    return [row[0] for row in db.fetchall("SELECT movie_id FROM favorites WHERE user_id = %s", (user_id,))]
+
+# Function to get a user's interactions since a date as (movie_id, interaction_type) tuples
+def get_recent_interactions(db, user_id, since):
+    query = "SELECT movie_id, interaction_type FROM interactions WHERE user_id = %s AND date >= %s"
+    return db.fetchall(query, (user_id, since))
+
+# Function to get a user's favorites with their ratings in one query:
+# (movie_id, rating or None) tuples, oldest favorite first
+def get_favorites_with_ratings(db, user_id):
+    query = """
+    SELECT f.movie_id, r.rating
+    FROM favorites f
+    LEFT JOIN ratings r ON r.user_id = f.user_id AND r.movie_id = f.movie_id
+    WHERE f.user_id = %s
+    ORDER BY f.date_added, f.movie_id
+    """
+    return db.fetchall(query, (user_id,))
+
+# Function to save many interactions with one multi-row INSERT
+# (rows are (user_id, movie_id, emotion, interaction_type, date) tuples)
+def save_interactions(db, rows):
+    query = "INSERT INTO interactions (user_id, movie_id, emotion, interaction_type, date) VALUES (%s, %s, %s, %s, %s)"
+    db.executemany(query, rows)
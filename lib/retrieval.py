@@ -0,0 +1,110 @@
+import zlib
+import numpy as np
+
+# Candidate retrieval: instead of sorting every movie of an emotion by predicted
+# rating, keep only the top-K (partial selection with argpartition) plus a small
+# random exploration sample from the rest.
+
+# Function to get the positions of the k highest scores, best first
+def top_k(scores, k):
+    scores = np.asarray(scores)
+    if k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+# Function to select the top-K positions plus n_explore random positions outside the top-K.
+# exclude is an optional boolean mask of positions that must not be returned
+# (e.g. movies the user has already seen).
+def select_candidates(scores, k, n_explore=0, exclude=None, rng=None):
+    scores = np.asarray(scores, dtype=float)
+    if exclude is not None:
+        scores = np.where(exclude, -np.inf, scores)
+        available = int((~exclude).sum())
+    else:
+        available = len(scores)
+
+    top = top_k(scores, min(k, available))
+
+    explore = np.empty(0, dtype=np.intp)
+    if n_explore > 0:
+        rest = np.ones(len(scores), dtype=bool)
+        rest[top] = False
+        if exclude is not None:
+            rest &= ~exclude
+        rest = np.flatnonzero(rest)
+        rng = rng if rng is not None else np.random.default_rng()
+        explore = rng.choice(rest, size=min(n_explore, len(rest)), replace=False) if len(rest) else explore
+
+    return top, explore
+
+# Approximate maximum-inner-product index over the SVD item factors, for large catalogs.
+# Item vectors [qi, bi] are quantized to int8 (one scale per dimension), candidates are
+# ranked with the quantized dot product and the best ones are re-scored exactly.
+class QuantizedFactorIndex:
+    def __init__(self, scorer, movie_ids):
+        self.scorer = scorer
+        self.movie_ids = np.asarray(movie_ids)
+
+        # Item vectors for every catalog movie (zeros for movies the model has never seen)
+        inner = scorer.inner_movies(self.movie_ids)
+        known = inner >= 0
+        qi, bi = scorer.item_factors(inner[known])
+        vectors = np.zeros((len(self.movie_ids), scorer.qi.shape[1] + 1), dtype=np.float32)
+        vectors[known, :-1] = qi
+        if scorer.biased:
+            vectors[known, -1] = bi
+
+        self.scale = np.abs(vectors).max(axis=0) / 127
+        self.scale[self.scale == 0] = 1
+        self.codes = np.round(vectors / self.scale).astype(np.int8)
+
+    # Query vector of a user: [pu, 1] (the user bias and global mean don't change the ranking)
+    def _query(self, user_id):
+        query = np.zeros(self.codes.shape[1], dtype=np.float32)
+        user = self.scorer.user_factors(user_id)
+        if user is not None:
+            query[:-1] = user[0]
+        query[-1] = 1 if self.scorer.biased else 0
+        return query * self.scale
+
+    # Top-k catalog positions for a user, optionally restricted to a boolean mask over the catalog.
+    # Returns (positions, exact predicted ratings).
+    def search(self, user_id, k, mask=None, rerank_factor=4):
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(len(self.movie_ids))
+        approx = self.codes[rows].astype(np.float32) @ self._query(user_id)
+
+        shortlist = rows[top_k(approx, min(len(rows), k * rerank_factor))]
+        exact = self.scorer.predict(user_id, self.movie_ids[shortlist])
+        best = top_k(exact, k)
+        return shortlist[best], exact[best]
+
+# Function to get the recommendation candidates of a user for an emotion:
+# catalog row positions and predicted ratings, best first, then the exploration sample.
+# The exploration sample is seeded by (user, emotion), so it is stable across reruns.
+# exclude_ids are movie ids that must not be recommended (e.g. the user's favorites,
+# from InteractionStore.user_items()).
+def recommend_candidates(scorer, emotion_index, user_id, emotion, k=50, n_explore=20, factor_index=None, exclude_ids=None):
+    emotion_rows = emotion_index.rows(emotion)
+    rng = np.random.default_rng([int(user_id), zlib.crc32(emotion.encode())])
+    exclude = None
+    if exclude_ids is not None and len(exclude_ids):
+        exclude = np.isin(emotion_index.ids(emotion), np.asarray(exclude_ids))
+
+    if factor_index is not None:
+        # Large catalog: approximate top-K over the item factors, restricted to the emotion
+        mask = emotion_index.mask([emotion])
+        if exclude is not None:
+            mask[emotion_rows[exclude]] = False
+            emotion_rows = emotion_rows[~exclude]
+        candidate_rows, predicted = factor_index.search(user_id, k, mask=mask)
+        explore_rows = rng.choice(emotion_rows, size=min(n_explore, len(emotion_rows)), replace=False)
+        explore_rows = explore_rows[~np.isin(explore_rows, candidate_rows)]
+        explore_predicted = scorer.predict(user_id, emotion_index.movie_ids[explore_rows])
+        return np.concatenate([candidate_rows, explore_rows]), np.concatenate([predicted, explore_predicted])
+
+    # Score the emotion's movies in one batch and keep the top-K plus an exploration sample
+    scores = scorer.predict(user_id, emotion_index.ids(emotion))
+    top, explore = select_candidates(scores, k, n_explore, exclude=exclude, rng=rng)
+    positions = np.concatenate([top, explore])
+    return emotion_rows[positions], scores[positions]
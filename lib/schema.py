@@ -0,0 +1,299 @@
+import argparse
+import datetime
+import os
+import re
+
+# Schema of the app tables (users, interactions, favorites, ratings) as versioned migrations,
+# for MySQL (RDS) and the SQLite stand-in (db.Database.dialect).
+#
+# Applied migrations are recorded in schema_migrations, so migrate() only runs the new ones.
+# The indexes follow the access paths of lib/repository.py:
+#   - interactions (user_id, movie_id, interaction_type): update_interaction
+#   - interactions (user_id, date): a user's recent interactions
+#   - favorites UNIQUE (user_id, movie_id): add_favorite, the favorites page
+#   - ratings UNIQUE (user_id, movie_id): the rating upsert, get_rating/get_ratings
+# Duplicated pairs left by the old SELECT-then-INSERT writes are removed before the unique
+# indexes are created (the first favorite and the last rating are kept). This needs the
+# favorite_id / rating_id keys: migration 2 stops without deleting anything if they are missing.
+#
+# Migrations are an operator step, run once before deploying a new version of the app.
+# The app only reads the schema version (and warns when it is behind).
+#
+# python lib/schema.py migrate --sqlite data/feelms.db
+# python lib/schema.py check --sqlite data/feelms.db
+# python lib/schema.py partition --start 2024-01 --months 24   (MySQL, credentials from DB_* variables)
+
+MIGRATIONS_TABLE = 'schema_migrations'
+
+TABLES = {
+    'mysql': [
+        """CREATE TABLE IF NOT EXISTS users (
+            user_id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(255) NOT NULL UNIQUE,
+            password VARCHAR(255) NOT NULL
+        ) ENGINE=InnoDB""",
+        """CREATE TABLE IF NOT EXISTS interactions (
+            interaction_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            movie_id INT NOT NULL,
+            emotion VARCHAR(20),
+            interaction_type VARCHAR(20) NOT NULL,
+            date DATETIME(6) NOT NULL
+        ) ENGINE=InnoDB""",
+        """CREATE TABLE IF NOT EXISTS favorites (
+            favorite_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            movie_id INT NOT NULL,
+            date_added DATETIME(6) NOT NULL
+        ) ENGINE=InnoDB""",
+        """CREATE TABLE IF NOT EXISTS ratings (
+            rating_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            movie_id INT NOT NULL,
+            rating TINYINT NOT NULL,
+            date DATETIME(6) NOT NULL
+        ) ENGINE=InnoDB""",
+    ],
+    'sqlite': [
+        "CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL UNIQUE, password TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS interactions (interaction_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, movie_id INTEGER NOT NULL, emotion TEXT, interaction_type TEXT NOT NULL, date TIMESTAMP NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS favorites (favorite_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, movie_id INTEGER NOT NULL, date_added TIMESTAMP NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS ratings (rating_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, movie_id INTEGER NOT NULL, rating INTEGER NOT NULL, date TIMESTAMP NOT NULL)",
+    ],
+}
+
+# (table, index name, columns, unique)
+INDEXES = [
+    ('interactions', 'interactions_user_movie_type', ('user_id', 'movie_id', 'interaction_type'), False),
+    ('interactions', 'interactions_user_date', ('user_id', 'date'), False),
+    ('favorites', 'favorites_user_movie', ('user_id', 'movie_id'), True),
+    ('ratings', 'ratings_user_movie', ('user_id', 'movie_id'), True),
+]
+
+# Statements removing duplicated (user_id, movie_id) pairs: keep the first favorite, the last rating
+DEDUPLICATE = {
+    'mysql': [
+        "DELETE f1 FROM favorites f1 JOIN favorites f2 ON f1.user_id = f2.user_id AND f1.movie_id = f2.movie_id AND f1.favorite_id > f2.favorite_id",
+        "DELETE r1 FROM ratings r1 JOIN ratings r2 ON r1.user_id = r2.user_id AND r1.movie_id = r2.movie_id AND r1.rating_id < r2.rating_id",
+    ],
+    'sqlite': [
+        "DELETE FROM favorites WHERE favorite_id NOT IN (SELECT MIN(favorite_id) FROM favorites GROUP BY user_id, movie_id)",
+        "DELETE FROM ratings WHERE rating_id NOT IN (SELECT MAX(rating_id) FROM ratings GROUP BY user_id, movie_id)",
+    ],
+}
+
+# Function to check whether an index exists (MySQL has no CREATE INDEX IF NOT EXISTS)
+def _index_exists(cursor, dialect, table, name):
+    if dialect == 'sqlite':
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s", (table, name))
+    else:
+        cursor.execute("SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s", (table, name))
+    return cursor.fetchone() is not None
+
+# Function to check whether a table exists
+def _table_exists(cursor, dialect, table):
+    if dialect == 'sqlite':
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", (table,))
+    else:
+        cursor.execute("SELECT 1 FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s", (table,))
+    return cursor.fetchone() is not None
+
+# Function to check whether a table has a column
+def _column_exists(cursor, dialect, table, column):
+    if dialect == 'sqlite':
+        cursor.execute("SELECT 1 FROM pragma_table_info(%s) WHERE name = %s", (table, column))
+    else:
+        cursor.execute("SELECT 1 FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s", (table, column))
+    return cursor.fetchone() is not None
+
+# Function to check whether an index exists (e.g. the unique key the rating upsert relies on)
+def has_index(db, table, name):
+    return db.run(lambda cursor: _index_exists(cursor, db.dialect, table, name))
+
+def _create_tables(cursor, dialect):
+    for statement in TABLES[dialect]:
+        cursor.execute(statement)
+
+def _create_indexes(cursor, dialect):
+    # The de-duplication keeps rows by their id: don't delete anything on a schema without it
+    for table, column in (('favorites', 'favorite_id'), ('ratings', 'rating_id')):
+        if not _column_exists(cursor, dialect, table, column):
+            raise RuntimeError(f"{table}.{column} is missing: remove the duplicated (user_id, movie_id) pairs of {table} by hand, then migrate again")
+    for statement in DEDUPLICATE[dialect]:
+        cursor.execute(statement)
+    for table, name, columns, unique in INDEXES:
+        if not _index_exists(cursor, dialect, table, name):
+            cursor.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})")
+
+# (version, description, apply(cursor, dialect)), in order
+MIGRATIONS = [
+    (1, 'create the app tables', _create_tables),
+    (2, 'indexes for the app access paths', _create_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Function to get the schema version of a database (0 if no migration was applied).
+# Read-only: the app calls it at startup.
+def current_version(db):
+    def op(cursor):
+        if not _table_exists(cursor, db.dialect, MIGRATIONS_TABLE):
+            return 0
+        cursor.execute(f"SELECT MAX(version) FROM {MIGRATIONS_TABLE}")
+        return cursor.fetchone()[0] or 0
+    return db.run(op)
+
+# Function to apply the pending migrations (up to target). Returns the versions applied.
+# Run it from the command line before deploying (python lib/schema.py migrate), not from the app.
+def migrate(db, target=None):
+    db.execute(f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (version INTEGER PRIMARY KEY, description VARCHAR(255), applied_at TIMESTAMP)")
+    version = current_version(db)
+    applied = []
+    for migration_version, description, apply in MIGRATIONS:
+        if migration_version <= version or (target is not None and migration_version > target):
+            continue
+
+        # One transaction per migration (MySQL commits DDL implicitly, so a failed
+        # migration may be partly applied; every step can be run again)
+        def op(cursor):
+            apply(cursor, db.dialect)
+            cursor.execute(f"INSERT INTO {MIGRATIONS_TABLE} (version, description, applied_at) VALUES (%s, %s, %s)",
+                           (migration_version, description, datetime.datetime.now()))
+        db.run(op)
+        applied.append(migration_version)
+    return applied
+
+# Function to get the first day of each month from start (YYYY-MM) on
+def _month_starts(start, months):
+    year, month = map(int, start.split('-'))
+    starts = []
+    for _ in range(months + 1):
+        starts.append(datetime.date(year, month, 1))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return starts
+
+def _partition_definitions(starts):
+    partitions = [
+        f"PARTITION p{begin:%Y%m} VALUES LESS THAN (TO_DAYS('{end:%Y-%m-%d}'))"
+        for begin, end in zip(starts[:-1], starts[1:])
+    ]
+    return partitions + ["PARTITION pmax VALUES LESS THAN MAXVALUE"]
+
+# Function to partition interactions by month of date (MySQL only), from start (YYYY-MM)
+# for the given number of months plus a catch-all pmax partition. If the table is already
+# partitioned, pmax is split to add the months after the last partition instead.
+# The partition key must be part of every unique key, so the primary key becomes
+# (interaction_id, date).
+def partition_interactions(db, start, months=12):
+    if db.dialect != 'mysql':
+        raise ValueError("Partitioning is only supported on MySQL")
+
+    def op(cursor):
+        cursor.execute("""
+            SELECT partition_name FROM information_schema.partitions
+            WHERE table_schema = DATABASE() AND table_name = 'interactions' AND partition_name IS NOT NULL
+            ORDER BY partition_ordinal_position
+        """)
+        existing = [row[0] for row in cursor.fetchall()]
+        if not existing:
+            cursor.execute("ALTER TABLE interactions DROP PRIMARY KEY, ADD PRIMARY KEY (interaction_id, date)")
+            cursor.execute(f"ALTER TABLE interactions PARTITION BY RANGE (TO_DAYS(date)) ({', '.join(_partition_definitions(_month_starts(start, months)))})")
+            return months
+
+        # Months after the last monthly partition (named pYYYYMM)
+        monthly = sorted(name for name in existing if re.fullmatch(r'p\d{6}', name))
+        last = datetime.datetime.strptime(monthly[-1][1:], '%Y%m').date() if monthly else None
+        starts = [day for day in _month_starts(start, months) if last is None or day > last]
+        if len(starts) < 2:
+            return 0
+        cursor.execute(f"ALTER TABLE interactions REORGANIZE PARTITION pmax INTO ({', '.join(_partition_definitions(starts))})")
+        return len(starts) - 1
+    return db.run(op)
+
+# Access paths of lib/repository.py, with sample parameters, for the query plan check
+ACCESS_PATHS = {
+    'authenticate_user': ("SELECT user_id FROM users WHERE username = %s AND password = %s", ('user_1', 'pass_1')),
+    'update_interaction': ("UPDATE interactions SET interaction_type = %s, date = %s WHERE user_id = %s AND movie_id = %s AND interaction_type = 'shown'", ('view', '2024-01-01', 1, 1)),
+    'recent_interactions': ("SELECT movie_id, interaction_type FROM interactions WHERE user_id = %s AND date >= %s", (1, '2024-01-01')),
+    'add_favorite': ("SELECT 1 FROM favorites WHERE user_id = %s AND movie_id = %s", (1, 1)),
+    'favorites_with_ratings': ("""
+        SELECT f.movie_id, r.rating
+        FROM favorites f
+        LEFT JOIN ratings r ON r.user_id = f.user_id AND r.movie_id = f.movie_id
+        WHERE f.user_id = %s
+        ORDER BY f.date_added, f.movie_id
+    """, (1,)),
+    'remove_favorite': ("DELETE FROM favorites WHERE user_id = %s AND movie_id = %s", (1, 1)),
+    'get_rating': ("SELECT rating FROM ratings WHERE user_id = %s AND movie_id = %s", (1, 1)),
+    'get_ratings': ("SELECT movie_id, rating FROM ratings WHERE user_id = %s", (1,)),
+    'delete_rating': ("DELETE FROM ratings WHERE user_id = %s AND movie_id = %s", (1, 1)),
+}
+
+# Function to get the plan of a query: SQLite plan details, or MySQL EXPLAIN rows as dicts
+def explain(db, query, params=()):
+    def op(cursor):
+        if db.dialect == 'sqlite':
+            cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute(f"EXPLAIN {query}", params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return db.run(op)
+
+# Tables a plan reads with a full scan (no index)
+def full_scans(plan, dialect):
+    if dialect == 'sqlite':
+        scans = []
+        for step in plan:
+            match = re.match(r'SCAN (\w+)', step)
+            if match and 'INDEX' not in step:
+                scans.append(match.group(1))
+        return scans
+    return [row.get('table') for row in plan if row.get('type') == 'ALL']
+
+# Function to check the plans of the access paths: {name: {'ok', 'full_scans', 'plan'}}
+def check_plans(db, access_paths=None):
+    results = {}
+    for name, (query, params) in (access_paths or ACCESS_PATHS).items():
+        plan = explain(db, query, params)
+        scans = full_scans(plan, db.dialect)
+        results[name] = {'ok': not scans, 'full_scans': scans, 'plan': plan}
+    return results
+
+# Function to connect to the database given on the command line (SQLite file or MySQL)
+def _connect(args):
+    from db import connect_mysql, connect_sqlite
+    if args.sqlite:
+        return connect_sqlite(args.sqlite, pool_size=1)
+    return connect_mysql(args.host, args.user, args.password, args.database, port=args.port, pool_size=1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Create or migrate the app tables and check their query plans")
+    parser.add_argument('command', choices=['migrate', 'version', 'check', 'partition'])
+    parser.add_argument('--sqlite', help="SQLite database file (instead of MySQL)")
+    parser.add_argument('--host', default=os.environ.get('DB_HOST'))
+    parser.add_argument('--user', default=os.environ.get('DB_USER'))
+    parser.add_argument('--password', default=os.environ.get('DB_PASSWORD'))
+    parser.add_argument('--database', default=os.environ.get('DB_NAME'))
+    parser.add_argument('--port', default=os.environ.get('DB_PORT', 3306))
+    parser.add_argument('--target', type=int, default=None, help="migrate up to this version")
+    parser.add_argument('--start', default=f'{datetime.date.today():%Y-%m}', help="first month to partition (YYYY-MM)")
+    parser.add_argument('--months', type=int, default=12)
+    args = parser.parse_args()
+
+    db = _connect(args)
+    if args.command == 'migrate':
+        applied = migrate(db, args.target)
+        print(f"Applied migrations {applied}" if applied else "Schema is up to date")
+        print(f"Schema version {current_version(db)}")
+    elif args.command == 'version':
+        print(f"Schema version {current_version(db)} (latest {LATEST_VERSION})")
+    elif args.command == 'check':
+        results = check_plans(db)
+        for name, result in results.items():
+            print(f"{'OK  ' if result['ok'] else 'SCAN'} {name}: {result['plan']}")
+        if not all(result['ok'] for result in results.values()):
+            raise SystemExit(1)
+    elif args.command == 'partition':
+        print(f"Added {partition_interactions(db, args.start, args.months)} monthly partitions")
+    db.close()
@@ -0,0 +1,86 @@
+import pickle
+import numpy as np
+import pandas as pd
+
+# Batch scorer for a trained Surprise SVD model.
+# The factors, biases and id mappings are pulled out of the model once, so a user
+# can be scored against a whole list of movies with a single matrix-vector product
+# instead of calling svd_model.predict() once per movie.
+class SVDScorer:
+    def __init__(self, pu, qi, bu, bi, global_mean, user_ids, movie_ids, rating_scale=(1, 10), biased=True):
+        self.pu = pu
+        self.qi = qi
+        self.bu = bu
+        self.bi = bi
+        self.global_mean = float(global_mean)
+        self.rating_scale = rating_scale
+        self.biased = biased
+
+        # Raw id -> inner id lookups (position in the factor/bias arrays)
+        self.user_index = pd.Index(user_ids)
+        self.movie_index = pd.Index(movie_ids)
+
+    # Build the scorer from a fitted surprise.SVD
+    @classmethod
+    def from_model(cls, svd_model):
+        trainset = svd_model.trainset
+
+        # Order raw ids by their inner id so positions match the factor rows
+        user_ids = sorted(trainset._raw2inner_id_users, key=trainset._raw2inner_id_users.get)
+        movie_ids = sorted(trainset._raw2inner_id_items, key=trainset._raw2inner_id_items.get)
+
+        return cls(
+            pu=np.asarray(svd_model.pu),
+            qi=np.asarray(svd_model.qi),
+            bu=np.asarray(svd_model.bu),
+            bi=np.asarray(svd_model.bi),
+            global_mean=trainset.global_mean,
+            user_ids=user_ids,
+            movie_ids=movie_ids,
+            rating_scale=trainset.rating_scale,
+            biased=svd_model.biased,
+        )
+
+    # Inner user id, or -1 if the user was not in the training set
+    def inner_user(self, user_id):
+        return self.user_index.get_indexer([user_id])[0]
+
+    # Inner movie ids for an array of raw movie ids (-1 for unknown movies)
+    def inner_movies(self, movie_ids):
+        return self.movie_index.get_indexer(np.asarray(movie_ids))
+
+    # (pu, bu) of a user, or None if the user was not in the training set
+    def user_factors(self, user_id):
+        inner_u = self.inner_user(user_id)
+        return (self.pu[inner_u], self.bu[inner_u]) if inner_u >= 0 else None
+
+    # (qi, bi) of an array of known inner movie ids
+    def item_factors(self, inner_i):
+        return self.qi[inner_i], self.bi[inner_i]
+
+    # Predict the rating of one user for every movie in movie_ids.
+    # Mirrors SVD.predict(): unknown users/items fall back to the biases or the
+    # global mean, and estimates are clipped to the rating scale.
+    def predict(self, user_id, movie_ids):
+        user = self.user_factors(user_id)
+        inner_i = self.inner_movies(movie_ids)
+        known_i = inner_i >= 0
+        qi, bi = self.item_factors(inner_i[known_i])
+
+        est = np.full(len(inner_i), self.global_mean)
+        if self.biased:
+            est[known_i] += bi
+            if user is not None:
+                est += user[1]
+                est[known_i] += qi @ user[0]
+        elif user is not None:
+            # Unbiased SVD cannot predict unknown users/items: Surprise falls back to the global mean
+            est[known_i] = qi @ user[0]
+
+        lower, higher = self.rating_scale
+        return np.clip(est, lower, higher)
+
+# Function to load a pickled SVD model and wrap it in a batch scorer
+def load_svd_scorer(path):
+    with open(path, 'rb') as file:
+        return SVDScorer.from_model(pickle.load(file))
@@ -0,0 +1,119 @@
+import argparse
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Cold-start helpers for the Streamlit app.
+# Set FEELMS_PROFILE_STARTUP=1 to get the time spent in every import and
+# initialization step of a script run (printed to stderr and shown in the sidebar).
+
+PROFILE_ENV_VAR = 'FEELMS_PROFILE_STARTUP'
+
+# Modules the app needs after login, heaviest third-party dependencies first so each
+# timing is the cost of that module alone (imports are cached once done)
+APP_MODULES = [
+    'numpy',
+    'pandas',
+    'mysql.connector',
+    'db',
+    'repository',
+    'event_queue',
+    'catalog_index',
+    'catalog_store',
+    'scoring',
+    'online_svd',
+    'model_bundle',
+    'retrieval',
+    'rec_cache',
+    'favorite_scoring',
+]
+
+# Function to check whether startup profiling is enabled
+def profiling_enabled():
+    return os.environ.get(PROFILE_ENV_VAR, '').lower() in ('1', 'true', 'yes')
+
+# Collects (kind, name, seconds, thread) timings of imports and initialization steps
+class StartupProfiler:
+    def __init__(self, enabled=None):
+        self.enabled = profiling_enabled() if enabled is None else enabled
+        self.started_at = time.perf_counter()
+        self.timings = []
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, seconds):
+        with self._lock:
+            self.timings.append((kind, name, seconds, threading.current_thread().name))
+
+    # Time a block of code: with profiler.timed('database'): ...
+    @contextmanager
+    def timed(self, name, kind='init'):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(kind, name, time.perf_counter() - start)
+
+    # Import a module and record how long it took (0 if it was already imported)
+    def import_module(self, name):
+        with self.timed(name, 'import'):
+            return importlib.import_module(name)
+
+    # Seconds since the profiler was created
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    # Timings as a text table, slowest first
+    def report(self):
+        with self._lock:
+            timings = sorted(self.timings, key=lambda timing: timing[2], reverse=True)
+        lines = [f"{'kind':<7} {'name':<24} {'ms':>9}  thread"]
+        for kind, name, seconds, thread in timings:
+            lines.append(f"{kind:<7} {name:<24} {seconds * 1000:>9.1f}  {thread}")
+        lines.append(f"total elapsed: {self.elapsed() * 1000:.1f} ms")
+        return '\n'.join(lines)
+
+    # Print the report to stderr when profiling is enabled
+    def print_report(self, title='startup profile'):
+        if self.enabled:
+            print(f"--- {title} ---\n{self.report()}", file=sys.stderr, flush=True)
+
+# Function to run warm-up tasks in a background thread.
+# tasks is a list of (name, callable); each one is timed, and a failing task is
+# recorded and skipped (the error shows up again when the resource is really used).
+def warm_up(tasks, profiler=None, name='warm-up'):
+    profiler = profiler if profiler is not None else StartupProfiler()
+    errors = {}
+
+    def run():
+        for task_name, task in tasks:
+            try:
+                with profiler.timed(task_name, 'warm'):
+                    task()
+            except Exception as error:
+                errors[task_name] = repr(error)
+        profiler.print_report(f'{name} finished')
+
+    thread = threading.Thread(target=run, daemon=True, name=name)
+    thread.errors = errors
+    thread.profiler = profiler
+    thread.start()
+    return thread
+
+# Import profile of the app modules in a fresh process:
+# python lib/startup.py (run from the repository root)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the imports of the app modules")
+    parser.add_argument('modules', nargs='*', default=['streamlit'] + APP_MODULES)
+    args = parser.parse_args()
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    profiler = StartupProfiler(enabled=True)
+    for module in args.modules:
+        try:
+            profiler.import_module(module)
+        except ImportError as error:
+            print(f"{module}: {error}", file=sys.stderr)
+    profiler.print_report('import profile')
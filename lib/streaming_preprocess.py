@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Chunked version of ml.preprocess_data for interaction logs that don't fit in memory.
+#
+# The interactions are read in chunks and joined against small lookup tables keyed by
+# (user_id, movie_id) for ratings and favorites and by movie_id for movies, keeping only
+# the columns the models need. Each chunk is written as a CSV shard, and the scaling
+# statistics (mean/std, as StandardScaler) are accumulated in the same pass and stored
+# in the manifest. Scaling is applied when the shards are read back, so the log is only
+# read once.
+
+MANIFEST_NAME = 'manifest.json'
+
+# Function to encode (user_id, movie_id) pairs as one int64 key
+def pair_keys(user_ids, movie_ids):
+    return (np.asarray(user_ids, dtype=np.int64) << 32) | np.asarray(movie_ids, dtype=np.int64)
+
+# Lookup table of values per (user_id, movie_id).
+# Duplicated pairs keep their last row, so a join never multiplies interaction rows.
+class PairLookup:
+    def __init__(self, df, columns=()):
+        df = df.assign(_key=pair_keys(df['user_id'], df['movie_id'])).drop_duplicates('_key', keep='last')
+        self.index = pd.Index(df['_key'].to_numpy())
+        self.values = {column: df[column].to_numpy() for column in columns}
+
+    def __len__(self):
+        return len(self.index)
+
+    # Position of every pair in the table (-1 for missing pairs)
+    def positions(self, user_ids, movie_ids):
+        return self.index.get_indexer(pair_keys(user_ids, movie_ids))
+
+    # Boolean mask of the pairs present in the table
+    def contains(self, user_ids, movie_ids):
+        return self.positions(user_ids, movie_ids) >= 0
+
+    # Values of a column for every pair (NaN for missing pairs)
+    def lookup(self, column, user_ids, movie_ids):
+        positions = self.positions(user_ids, movie_ids)
+        found = positions >= 0
+        # Only the found positions index the column (-1 would read the last row, and an empty table has none)
+        values = np.full(len(positions), np.nan)
+        values[found] = self.values[column][positions[found]]
+        return values
+
+# Running mean/variance of columns, updated chunk by chunk (Chan et al. parallel update).
+# std is the population standard deviation, as used by StandardScaler.
+class RunningStats:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.count = {column: 0 for column in self.columns}
+        self.mean = {column: 0.0 for column in self.columns}
+        self.m2 = {column: 0.0 for column in self.columns}
+
+    def update(self, df):
+        for column in self.columns:
+            values = df[column].to_numpy(dtype=float)
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                continue
+            n_a, n_b = self.count[column], len(values)
+            mean_b = values.mean()
+            delta = mean_b - self.mean[column]
+            total = n_a + n_b
+            self.mean[column] += delta * n_b / total
+            self.m2[column] += ((values - mean_b) ** 2).sum() + delta ** 2 * n_a * n_b / total
+            self.count[column] = total
+
+    def std(self, column):
+        if self.count[column] == 0:
+            return 1.0
+        std = float(np.sqrt(self.m2[column] / self.count[column]))
+        return std if std > 0 else 1.0
+
+    def to_dict(self):
+        return {column: {'mean': self.mean[column], 'std': self.std(column), 'count': self.count[column]} for column in self.columns}
+
+# Function to read the interactions in chunks (a CSV path or an iterable of DataFrames)
+def iter_chunks(source, chunk_size=1_000_000, usecols=None):
+    if isinstance(source, (str, os.PathLike)):
+        yield from pd.read_csv(source, chunksize=chunk_size, usecols=usecols)
+    elif isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunk_size):
+            chunk = source.iloc[start:start + chunk_size]
+            yield chunk[usecols] if usecols is not None else chunk
+    else:
+        for chunk in source:
+            yield chunk[usecols] if usecols is not None else chunk
+
+# Function to join one chunk of interactions with the lookup tables
+def process_chunk(chunk, movie_index, movie_values, ratings, favorites, interaction_columns):
+    positions = movie_index.get_indexer(chunk['movie_id'].to_numpy())
+    # Inner join with the movies: interactions with unknown movies are dropped
+    keep = positions >= 0
+    chunk, positions = chunk.loc[keep, list(interaction_columns)], positions[keep]
+
+    out = chunk.reset_index(drop=True)
+    for column, values in movie_values.items():
+        out[column] = values[positions]
+    user_ids, movie_ids = out['user_id'].to_numpy(), out['movie_id'].to_numpy()
+    out['rating'] = ratings.lookup('rating', user_ids, movie_ids)
+    out['is_favorite'] = favorites.contains(user_ids, movie_ids)
+    return out
+
+# Function to preprocess an interaction log into training-ready shards.
+# df_movies is indexed by movie_id (as in ml.preprocess_data); only movie_columns are kept.
+def preprocess_stream(interactions, df_ratings, df_favorites, df_movies, out_dir, chunk_size=1_000_000,
+                      interaction_columns=('user_id', 'movie_id'), movie_columns=('duration',),
+                      scale_columns=('duration',), verbose=True):
+    os.makedirs(out_dir, exist_ok=True)
+
+    movie_index = pd.Index(df_movies.index.to_numpy())
+    movie_values = {column: df_movies[column].to_numpy() for column in movie_columns}
+    ratings = PairLookup(df_ratings, ['rating'])
+    favorites = PairLookup(df_favorites)
+    stats = RunningStats(scale_columns)
+
+    shards, rows_in, rows_out = [], 0, 0
+    for i, chunk in enumerate(iter_chunks(interactions, chunk_size, usecols=list(interaction_columns))):
+        out = process_chunk(chunk, movie_index, movie_values, ratings, favorites, interaction_columns)
+        stats.update(out)
+
+        name = f'part-{i:05d}.csv'
+        tmp_path = os.path.join(out_dir, f'{name}.tmp')
+        out.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, os.path.join(out_dir, name))
+        shards.append({'name': name, 'rows': len(out)})
+        rows_in += len(chunk)
+        rows_out += len(out)
+        if verbose:
+            print(f"Shard {name}: {len(out)} rows ({rows_in} interactions read)")
+
+    manifest = {
+        'shards': shards,
+        'rows_in': rows_in,
+        'rows_out': rows_out,
+        'columns': list(interaction_columns) + list(movie_columns) + ['rating', 'is_favorite'],
+        'scaling': stats.to_dict(),
+    }
+    # The manifest is written last: a directory without one is an incomplete run
+    tmp_path = os.path.join(out_dir, f'{MANIFEST_NAME}.tmp')
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST_NAME))
+    return manifest
+
+# Function to read the manifest of a preprocessed directory
+def read_manifest(out_dir):
+    with open(os.path.join(out_dir, MANIFEST_NAME)) as file:
+        return json.load(file)
+
+# Function to iterate over the shards as DataFrames, with the scaled columns standardized
+def iter_shards(out_dir, columns=None, scale=True):
+    manifest = read_manifest(out_dir)
+    for shard in manifest['shards']:
+        df = pd.read_csv(os.path.join(out_dir, shard['name']), usecols=columns)
+        if scale:
+            for column, params in manifest['scaling'].items():
+                if column in df.columns:
+                    df[column] = (df[column] - params['mean']) / params['std']
+        yield df
+
+# Function to load every shard into one DataFrame (same columns as ml.preprocess_data
+# for the models: user_id, movie_id, duration, rating, is_favorite)
+def load_shards(out_dir, columns=None, scale=True):
+    frames = list(iter_shards(out_dir, columns, scale))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns or read_manifest(out_dir)['columns'])
+
+# python lib/streaming_preprocess.py --interactions data/interactions.csv --out data/preprocessed
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Preprocess the interaction log into training shards")
+    parser.add_argument('--interactions', default='data/interactions.csv')
+    parser.add_argument('--ratings', default='data/ratings.csv')
+    parser.add_argument('--favorites', default='data/favorites.csv')
+    parser.add_argument('--movies', default='data/imdb_clean.csv')
+    parser.add_argument('--out', default='data/preprocessed')
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    # Only the movie columns that are used; movie_id is the row position in imdb_clean.csv
+    df_movies = pd.read_csv(args.movies, usecols=['duration'])
+    manifest = preprocess_stream(
+        args.interactions,
+        pd.read_csv(args.ratings, usecols=['user_id', 'movie_id', 'rating']),
+        pd.read_csv(args.favorites, usecols=['user_id', 'movie_id']),
+        df_movies,
+        args.out,
+        chunk_size=args.chunk_size,
+    )
+    print(f"{manifest['rows_out']} training rows in {len(manifest['shards'])} shards")
@@ -0,0 +1,259 @@
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from surprise import SVD, Dataset, Reader
+
+# Hyperparameter search for the SVD model.
+#
+# - The fold assignment is computed once (seeded) and the Surprise trainsets of every
+#   fold are built once per worker process, then reused by all the configurations it runs.
+# - Configurations run in parallel in a process pool (n_jobs).
+# - The result of every configuration is cached on disk under
+#   cache_dir/<data hash>/<config key>.json, so a rerun only evaluates new configurations.
+#   The key includes the early stopping settings: a run without early stopping never
+#   reuses results pruned by one with it.
+# - Early stopping: after min_folds folds, a configuration whose mean RMSE is more than
+#   tolerance above the best finished configuration is stopped ("pruned").
+
+RESULT_COLUMNS = ['rank', 'rmse', 'mae', 'rmse_std', 'folds', 'status', 'fit_seconds', 'cached']
+
+# State of a worker process: the data, the fold assignment and the materialized folds
+_worker = {}
+
+# Function to hash the ratings used for tuning (cache key of the results)
+def data_hash(df_ratings, rating_scale=(1, 10)):
+    digest = hashlib.sha256(json.dumps(list(rating_scale)).encode())
+    ratings = df_ratings[['user_id', 'movie_id', 'rating']].dropna().reset_index(drop=True)
+    digest.update(pd.util.hash_pandas_object(ratings, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+# Function to assign every rating to one of n_folds folds (same split for every configuration)
+def make_folds(n_ratings, n_folds=5, seed=42):
+    fold_ids = np.empty(n_ratings, dtype=np.int8)
+    fold_ids[np.random.default_rng(seed).permutation(n_ratings)] = np.arange(n_ratings) % n_folds
+    return fold_ids
+
+# Function to list every configuration of a grid: {'n_factors': [50, 100], 'lr_all': [0.005, 0.01]}
+def grid_configurations(param_grid):
+    names = sorted(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+
+# Function to draw n_iter random configurations.
+# Each value is a list (one of its items), a (low, high) tuple of ints (uniform integer)
+# or a (low, high) tuple of floats (log-uniform, for learning rates and regularization).
+def random_configurations(param_distributions, n_iter=20, seed=42):
+    rng = np.random.default_rng(seed)
+    configurations = []
+    for _ in range(n_iter):
+        params = {}
+        for name in sorted(param_distributions):
+            values = param_distributions[name]
+            if isinstance(values, tuple) and all(isinstance(value, int) for value in values):
+                params[name] = int(rng.integers(values[0], values[1] + 1))
+            elif isinstance(values, tuple):
+                params[name] = float(math.exp(rng.uniform(math.log(values[0]), math.log(values[1]))))
+            else:
+                params[name] = values[rng.integers(len(values))]
+                params[name] = params[name].item() if hasattr(params[name], 'item') else params[name]
+        if params not in configurations:
+            configurations.append(params)
+    return configurations
+
+# Cache key of one configuration (parameters, folds, seed and early stopping settings)
+def configuration_key(params, n_folds, seed, early_stopping, min_folds, tolerance):
+    stopping = {'min_folds': min_folds, 'tolerance': tolerance} if early_stopping else None
+    key = json.dumps({'params': params, 'n_folds': n_folds, 'seed': seed, 'early_stopping': stopping}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+def _read_result(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _write_result(path, result):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(result, file, indent=2)
+    os.replace(tmp_path, path)
+
+def _init_worker(users, movies, ratings, fold_ids, rating_scale, best_rmse):
+    _worker.update(
+        users=users,
+        movies=movies,
+        ratings=ratings,
+        fold_ids=fold_ids,
+        rating_scale=rating_scale,
+        best_rmse=best_rmse,
+        folds={},
+    )
+
+# (trainset, testset) of fold k, built on first use and kept for the next configurations
+def _fold(k):
+    if k not in _worker['folds']:
+        users, movies, ratings = _worker['users'], _worker['movies'], _worker['ratings']
+        train = _worker['fold_ids'] != k
+        df_train = pd.DataFrame({'user_id': users[train], 'movie_id': movies[train], 'rating': ratings[train]})
+        trainset = Dataset.load_from_df(df_train, Reader(rating_scale=_worker['rating_scale'])).build_full_trainset()
+        test = ~train
+        testset = list(zip(users[test].tolist(), movies[test].tolist(), ratings[test].tolist()))
+        _worker['folds'][k] = (trainset, testset)
+    return _worker['folds'][k]
+
+# Evaluate one configuration fold by fold, stopping early if it can't beat the best one
+def _evaluate(params, n_folds, seed, early_stopping, min_folds, tolerance):
+    start = time.perf_counter()
+    rmses, maes = [], []
+    status = 'done'
+    for k in range(n_folds):
+        trainset, testset = _fold(k)
+        algo = SVD(random_state=seed, **params)
+        algo.fit(trainset)
+        errors = np.array([prediction.r_ui - prediction.est for prediction in algo.test(testset)])
+        rmses.append(float(np.sqrt(np.mean(errors ** 2))))
+        maes.append(float(np.mean(np.abs(errors))))
+
+        if early_stopping and min_folds <= len(rmses) < n_folds:
+            if np.mean(rmses) > _worker['best_rmse'].value * (1 + tolerance):
+                status = 'pruned'
+                break
+
+    rmse = float(np.mean(rmses))
+    if status == 'done':
+        with _worker['best_rmse'].get_lock():
+            _worker['best_rmse'].value = min(_worker['best_rmse'].value, rmse)
+
+    return {
+        'params': params,
+        'rmse': rmse,
+        'mae': float(np.mean(maes)),
+        'rmse_std': float(np.std(rmses)),
+        'folds': len(rmses),
+        'status': status,
+        'fit_seconds': time.perf_counter() - start,
+    }
+
+# Function to rank the results: finished configurations by RMSE, then the pruned ones
+def ranked_report(results):
+    rows = [dict({column: result.get(column) for column in RESULT_COLUMNS[1:]}, **result['params']) for result in results]
+    report = pd.DataFrame(rows)
+    if report.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    report['pruned'] = report['status'] == 'pruned'
+    report = report.sort_values(['pruned', 'rmse']).drop(columns='pruned').reset_index(drop=True)
+    report.insert(0, 'rank', np.arange(1, len(report) + 1))
+    return report
+
+# Function to tune the SVD hyperparameters with cross-validation.
+# Pass a param_grid (every combination) or param_distributions + n_iter (random search).
+# n_jobs=-1 uses every CPU. Returns the ranked report as a DataFrame.
+def tune_svd(df_ratings, param_grid=None, param_distributions=None, n_iter=20, n_folds=5, n_jobs=1,
+             cache_dir='model/svd_tuning', seed=42, early_stopping=True, min_folds=2, tolerance=0.05,
+             rating_scale=(1, 10), verbose=True):
+    if (param_grid is None) == (param_distributions is None):
+        raise ValueError("Pass either param_grid or param_distributions")
+    configurations = grid_configurations(param_grid) if param_grid is not None else random_configurations(param_distributions, n_iter, seed)
+
+    df_ratings = df_ratings[['user_id', 'movie_id', 'rating']].dropna().reset_index(drop=True)
+    run_dir = os.path.join(cache_dir, data_hash(df_ratings, rating_scale)[:16])
+    os.makedirs(run_dir, exist_ok=True)
+
+    # Results of configurations evaluated by a previous run on the same data
+    results, pending = [], []
+    for params in configurations:
+        path = os.path.join(run_dir, f'{configuration_key(params, n_folds, seed, early_stopping, min_folds, tolerance)}.json')
+        cached = _read_result(path)
+        if cached is not None and (early_stopping or cached['status'] == 'done'):
+            results.append(dict(cached, cached=True))
+        else:
+            pending.append((params, path))
+
+    finished = [result['rmse'] for result in results if result['status'] == 'done']
+    best_rmse = multiprocessing.Value('d', min(finished) if finished else math.inf)
+    if verbose:
+        print(f"{len(configurations)} configurations: {len(results)} cached, {len(pending)} to evaluate ({n_folds} folds)")
+
+    init_args = (
+        df_ratings['user_id'].to_numpy(),
+        df_ratings['movie_id'].to_numpy(),
+        df_ratings['rating'].to_numpy(dtype=float),
+        make_folds(len(df_ratings), n_folds, seed),
+        tuple(rating_scale),
+        best_rmse,
+    )
+    eval_args = (n_folds, seed, early_stopping, min_folds, tolerance)
+
+    def collect(result, path):
+        _write_result(path, result)
+        results.append(dict(result, cached=False))
+        if verbose:
+            print(f"[{len(results)}/{len(configurations)}] rmse={result['rmse']:.4f} {result['status']} "
+                  f"({result['folds']} folds, {result['fit_seconds']:.1f}s) {result['params']}")
+
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    if n_jobs == 1 or len(pending) <= 1:
+        _init_worker(*init_args)
+        for params, path in pending:
+            collect(_evaluate(params, *eval_args), path)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(pending)), initializer=_init_worker, initargs=init_args) as executor:
+            futures = {executor.submit(_evaluate, params, *eval_args): path for params, path in pending}
+            for future in as_completed(futures):
+                collect(future.result(), futures[future])
+
+    report = ranked_report(results)
+    report.to_csv(os.path.join(run_dir, 'report.csv'), index=False)
+    return report
+
+# Function to get the parameters of the best configuration of a report
+def best_params(report):
+    params = report.iloc[0].drop(RESULT_COLUMNS, errors='ignore').dropna().to_dict()
+    return {name: value.item() if hasattr(value, 'item') else value for name, value in params.items()}
+
+# Sweep from the command line: python lib/svd_tuning.py --ratings data/ratings.csv --n-jobs -1
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tune the SVD hyperparameters with cross-validation")
+    parser.add_argument('--ratings', default='data/ratings.csv')
+    parser.add_argument('--search', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--n-iter', type=int, default=20)
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--n-jobs', type=int, default=1)
+    parser.add_argument('--cache-dir', default='model/svd_tuning')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-early-stopping', action='store_true')
+    args = parser.parse_args()
+
+    if args.search == 'grid':
+        search = {'param_grid': {
+            'n_factors': [50, 100, 150],
+            'lr_all': [0.002, 0.005, 0.01],
+            'reg_all': [0.02, 0.1],
+        }}
+    else:
+        search = {'param_distributions': {
+            'n_factors': (20, 200),
+            'n_epochs': (10, 40),
+            'lr_all': (0.001, 0.02),
+            'reg_all': (0.005, 0.2),
+        }, 'n_iter': args.n_iter}
+
+    report = tune_svd(
+        pd.read_csv(args.ratings),
+        n_folds=args.folds,
+        n_jobs=args.n_jobs,
+        cache_dir=args.cache_dir,
+        seed=args.seed,
+        early_stopping=not args.no_early_stopping,
+        **search,
+    )
+    print(report.head(20).to_string(index=False))
+    print(f"Best parameters: {best_params(report)}")
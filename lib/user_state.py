@@ -0,0 +1,93 @@
+import datetime
+import numpy as np
+import repository
+
+# What the app knows about the logged-in user, fetched once at login and kept in the
+# Streamlit session: favorites, ratings and the movies shown or viewed recently.
+# The app updates it on every write, so reruns don't query the database for it again.
+# The id arrays handed to the recommender are cached until the state changes.
+class UserState:
+    def __init__(self, user_id, favorites=(), ratings=None, shown=(), viewed=()):
+        self.user_id = user_id
+        self.favorites = set(favorites)
+        self.ratings = ratings if ratings is not None else {}
+        self.shown = set(shown)
+        self.viewed = set(viewed)
+        self._arrays = {}
+
+    # Bulk-load the state of a user: favorites, ratings and the interactions of the last `days` days.
+    # ratings can be passed in when they are already loaded (pass a copy: the state changes its own dict).
+    @classmethod
+    def load(cls, db, user_id, days=180, ratings=None):
+        since = datetime.datetime.now() - datetime.timedelta(days=days)
+        shown, viewed = set(), set()
+        for movie_id, interaction_type in repository.get_recent_interactions(db, user_id, since):
+            # A viewed movie was shown first (its "shown" row was updated to "view")
+            shown.add(movie_id)
+            if interaction_type == 'view':
+                viewed.add(movie_id)
+        return cls(
+            user_id,
+            favorites=repository.get_favorite_ids(db, user_id),
+            ratings=ratings if ratings is not None else repository.get_ratings(db, user_id),
+            shown=shown,
+            viewed=viewed,
+        )
+
+    def _changed(self):
+        self._arrays.clear()
+
+    # Register a movie as shown. Returns False if it had already been shown.
+    def mark_shown(self, movie_id):
+        if movie_id in self.shown:
+            return False
+        self.shown.add(movie_id)
+        self._changed()
+        return True
+
+    def mark_viewed(self, movie_id):
+        self.shown.add(movie_id)
+        self.viewed.add(movie_id)
+        self._changed()
+
+    def add_favorite(self, movie_id):
+        self.favorites.add(movie_id)
+        self._changed()
+
+    # Removing a favorite also removes its rating (as repository.remove_favorite)
+    def remove_favorite(self, movie_id):
+        self.favorites.discard(movie_id)
+        self.ratings.pop(movie_id, None)
+        self._changed()
+
+    def set_rating(self, movie_id, rating):
+        self.ratings[movie_id] = rating
+
+    def is_favorite(self, movie_id):
+        return movie_id in self.favorites
+
+    # Movie ids to leave out of the recommendations: favorites and viewed movies
+    def excluded_ids(self):
+        if 'excluded' not in self._arrays:
+            self._arrays['excluded'] = np.fromiter(self.favorites | self.viewed, dtype=np.int64)
+        return self._arrays['excluded']
+
+    # Boolean mask of the movie ids to leave out of the recommendations
+    def excluded_mask(self, movie_ids):
+        return np.isin(np.asarray(movie_ids), self.excluded_ids())
+
+    # Boolean mask of the movie ids that were already shown to the user
+    def shown_mask(self, movie_ids):
+        if 'shown' not in self._arrays:
+            self._arrays['shown'] = np.fromiter(self.shown, dtype=np.int64)
+        return np.isin(np.asarray(movie_ids), self._arrays['shown'])
+
+    # Sampling weights of movie ids: movies already shown get shown_weight, the others 1
+    # (None without movies, as DataFrame.sample rejects empty weights)
+    def sample_weights(self, movie_ids, shown_weight=0.25):
+        if len(movie_ids) == 0:
+            return None
+        return np.where(self.shown_mask(movie_ids), shown_weight, 1.0)
+
+    def summary(self):
+        return {'favorites': len(self.favorites), 'ratings': len(self.ratings), 'shown': len(self.shown), 'viewed': len(self.viewed)}